@@ -69,15 +69,33 @@ DATABASES = {
     }
 }
 
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [('127.0.0.1', 6379)],
+            'hosts': [f'{REDIS_URL}/0'],
         },
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+        'KEY_PREFIX': 'field_ops',
+    },
+}
+
+# Live agent positions and statuses (operations.state); Postgres is written behind
+AGENT_STATE_REDIS_URL = f'{REDIS_URL}/2'
+
+DASHBOARD_CACHE_TTL = 15
+TRACK_CACHE_TTL = 300
+# Open-ended track windows are snapped to and cached for this many seconds
+TRACK_OPEN_BUCKET_SECONDS = 15
+
 AUTH_USER_MODEL = 'operations.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,12 +134,154 @@ LEAFLET_CONFIG = {
     'MAX_ZOOM': 18,
 }
 
+# Client matching: cost = distance_km / weight[priority]
+ASSIGNMENT_PRIORITY_WEIGHTS = {1: 1.0, 2: 1.5, 3: 2.5, 4: 4.0}
+ASSIGNMENT_KNN_CANDIDATES = 5
+BATCH_ASSIGN_CANDIDATES = 20
+
+# Multi-stop route planning (plan_routes). Agents are clustered into regions
+# of about REGION_AGENTS that are solved in parallel worker processes.
+VRP = {
+    'MAX_STOPS': 15,
+    'SHIFT_HOURS': 8,
+    'DEFAULT_SERVICE_MINUTES': 30,
+    'LATENESS_WEIGHT': 0.1,
+    'TIME_BUDGET_SECONDS': 3.0,
+    'REGION_AGENTS': 25,
+    'WORKERS': 4,
+    'METRIC': 'haversine',
+}
+
+# Incremental re-planning after a visit is completed or cancelled: the agent's
+# remaining stops may move between it and up to NEIGHBOURS planned agents
+# within RADIUS_KM
+REPLANNING = {
+    'NEIGHBOURS': 3,
+    'RADIUS_KM': 10.0,
+    'TIME_BUDGET_SECONDS': 0.5,
+}
+
+# Client import
+CLIENT_IMPORT_CHUNK_SIZE = 2000
+CLIENT_IMPORT_MAX_UPLOAD_MB = 100
+# On startup, running imports with no progress report for this long are
+# failed and pending ones older than the grace period are queued again
+CLIENT_IMPORT_STALE_MINUTES = 15
+CLIENT_IMPORT_PENDING_GRACE_MINUTES = 5
+
+# Location pings are buffered and written in batches; pings that moved less
+# than max(MIN_DISTANCE_M, reported accuracy) are dropped unless
+# MAX_INTERVAL_SECONDS have passed since the last stored one.
+LOCATION_INGESTION = {
+    'MAX_BATCH': 500,
+    'MAX_DELAY_SECONDS': 2.0,
+    'MIN_DISTANCE_M': 10.0,
+    'MAX_INTERVAL_SECONDS': 60.0,
+    'MAX_PENDING': 5000,
+}
+
+# Geofencing on ingested pings: entering ENTER_RADIUS_M of a client starts
+# the assignment, leaving EXIT_RADIUS_M flags the departure. Pings less
+# accurate than MAX_ACCURACY_M are ignored.
+GEOFENCE = {
+    'ENTER_RADIUS_M': 75.0,
+    'EXIT_RADIUS_M': 150.0,
+    'MAX_ACCURACY_M': 100.0,
+    'REFRESH_SECONDS': 60.0,
+}
+
+# Agent presence: an agent with no heartbeat (socket message or location ping)
+# for TIMEOUT_SECONDS is marked offline and skipped by dispatch. Expiry runs
+# on a timing wheel of WHEEL_SLOTS x TICK_SECONDS; every SWEEP_SECONDS the
+# whole fleet is checked against last_seen_at.
+PRESENCE = {
+    'TIMEOUT_SECONDS': 90.0,
+    'TICK_SECONDS': 5.0,
+    'WHEEL_SLOTS': 64,
+    'SWEEP_SECONDS': 300.0,
+}
+
+# Notifications are buffered for MAX_DELAY_SECONDS and written in bulk; a
+# recipient with more than DIGEST_THRESHOLD in one flush gets a single
+# digest message carrying the last DIGEST_PREVIEW of them.
+NOTIFICATIONS = {
+    'MAX_BATCH': 500,
+    'MAX_DELAY_SECONDS': 1.0,
+    'DIGEST_THRESHOLD': 3,
+    'DIGEST_PREVIEW': 5,
+    'UNREAD_CACHE_TTL': 3600,
+}
+
+# AssignmentEvent projections (AgentDailyStats, ClientVisitStats) advance
+# BATCH_SIZE events at a time and leave events recorded in the last
+# LAG_SECONDS for the next run, in case an older transaction holding a lower
+# event id is still committing. Keep it above the longest event-writing
+# transaction.
+PROJECTIONS = {
+    'BATCH_SIZE': 5000,
+    'LAG_SECONDS': 30,
+}
+
+# Manager live map: positions are batched to managers and deltas sent to
+# browsers every tick, with coordinates quantised to 10^-precision degrees
+# (5 ~= 1 m)
+FLEET_FEED_TICK_SECONDS = 1.0
+FLEET_FEED_PRECISION = 5
+
+# Thread pool for background work (imports, re-planning)
+BACKGROUND_JOB_WORKERS = int(os.environ.get('BACKGROUND_JOB_WORKERS', '2'))
+
 OPENROUTESERVICE_API_KEY = os.environ.get('OPENROUTESERVICE_API_KEY', 'your_api_key_here')
 
+# Routing backend behind get_route. OfflineGraphBackend answers from a road
+# graph compiled with `manage.py build_road_graph`; without the graph it
+# falls back to haversine distance x DETOUR_FACTOR.
+ROUTING = {
+    'BACKEND': os.environ.get('ROUTING_BACKEND', 'operations.directions.OfflineGraphBackend'),
+    'GRAPH_PATH': os.environ.get('ROAD_GRAPH_PATH', str(BASE_DIR / 'data' / 'road_graph')),
+    'MAX_SNAP_KM': 2.0,
+    'DETOUR_FACTOR': 1.3,
+    'API_KEY': OPENROUTESERVICE_API_KEY,
+}
+
+# Distance matrices are computed and streamed in blocks of CHUNK_CELLS; road
+# network matrices are only used up to ROAD_MAX_CELLS pairs. Requests over
+# MAX_CELLS pairs are rejected; 500 x 20,000 fits.
+DISTANCE_MATRIX = {
+    'CHUNK_CELLS': 2_000_000,
+    'ROAD_MAX_CELLS': 250_000,
+    'MAX_CELLS': 25_000_000,
+}
+
+# Route results are cached per (mode, snapped start cell, snapped end cell)
+# in-process and in the shared Redis cache
+ROUTING_CACHE = {
+    'ENABLED': True,
+    'CELL_DEGREES': 0.001,
+    'LOCAL_SIZE': 10000,
+    'LOCAL_TTL': 600,
+    'SHARED_TTL': 3600,
+}
+
 FCM_DJANGO_SETTINGS = {
     "FCM_SERVER_KEY": os.environ.get('FCM_SERVER_KEY', 'your_firebase_key_here'),
     "ONE_DEVICE_PER_USER": True,
 }
 
+# Outbound push notifications are queued and sent by WORKERS threads in
+# multicast batches of up to BATCH_SIZE users. Transient failures retry with
+# exponential backoff from BACKOFF_SECONDS; after MAX_ATTEMPTS they are kept
+# in an in-memory dead-letter list. Set PUSH_TRANSPORT to
+# operations.push.FakePushTransport to run without Firebase.
+PUSH = {
+    'TRANSPORT': os.environ.get('PUSH_TRANSPORT', 'operations.push.FCMTransport'),
+    'WORKERS': 2,
+    'BATCH_SIZE': 500,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 2.0,
+    'MAX_BACKOFF_SECONDS': 300.0,
+    'DEAD_LETTER_SIZE': 1000,
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 LOGIN_URL = '/admin/login/'
@@ -1,11 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.gis.admin import OSMGeoAdmin
-from .models import User, Client, Assignment, LocationHistory, NotificationLog, SystemSettings
+from .models import (
+    User, Client, Assignment, LocationHistory, NotificationLog, SystemSettings, ImportJob, LocationTrail,
+    AssignmentEvent, AgentDailyStats, ClientVisitStats,
+)
 
 class UserAdmin(BaseUserAdmin):
-    list_display = ('username', 'email', 'role', 'is_active_agent', 'last_login')
-    list_filter = ('role', 'is_active', 'is_active_agent')
+    list_display = ('username', 'email', 'role', 'is_active_agent', 'is_online', 'last_seen_at')
+    list_filter = ('role', 'is_active', 'is_active_agent', 'is_online')
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Field Operations', {
@@ -23,6 +26,11 @@ class AssignmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'assigned_at')
     search_fields = ('agent__username', 'client__name')
 
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('original_name', 'status', 'total_rows', 'created_count', 'error_count', 'created_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('errors',)
+
 # Register models
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -31,6 +39,11 @@ admin.site.register(Assignment, AssignmentAdmin)
 admin.site.register(LocationHistory)
 admin.site.register(NotificationLog)
 admin.site.register(SystemSettings)
+admin.site.register(ImportJob, ImportJobAdmin)
+admin.site.register(LocationTrail)
+admin.site.register(AssignmentEvent)
+admin.site.register(AgentDailyStats)
+admin.site.register(ClientVisitStats)
 
 admin.site.site_header = "Field Operations Management"
 admin.site.site_title = "Field Operations"
@@ -0,0 +1,242 @@
+import hashlib
+import math
+import uuid
+from datetime import datetime, time
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from django.http import HttpResponse
+from django.utils import timezone
+from django.db.models import Exists, OuterRef
+from django.utils.dateparse import parse_datetime
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response
+from .matching import available_clients
+from .models import User, Client, Assignment, NotificationLog
+from .notifications import mark_read, mark_unread, unread_count
+from .serializers import AgentSerializer, ClientSerializer, AssignmentSerializer, NotificationSerializer
+from .tracks import agent_track, encode_binary, encode_polyline, zoom_tolerance
+
+class IsManager(BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role == 'manager'
+
+class KeysetPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-created_at'
+
+def parse_floats(value, count, name):
+    try:
+        numbers = [float(v) for v in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Expected comma separated numbers'})
+    if len(numbers) != count:
+        raise ValidationError({name: f'Expected {count} numbers'})
+    return numbers
+
+def parse_choices(value, choices, name, cast=str):
+    allowed = [key for key, _ in choices]
+    try:
+        values = [cast(v) for v in value.split(',')]
+    except ValueError:
+        values = None
+    if not values or any(v not in allowed for v in values):
+        raise ValidationError({name: f'Expected comma separated values from {allowed}'})
+    return values
+
+def parse_uuid(value, name):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({name: 'Expected a UUID'})
+
+def parse_time(value, default, name):
+    if not value:
+        return default
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError({name: 'Expected an ISO 8601 datetime'})
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+class SpatialListMixin:
+    # bbox=minLng,minLat,maxLng,maxLat / near=lat,lng&radius_km=5 filtering,
+    # ?geojson=1 output and ETag / If-None-Match support for GET requests.
+    spatial_field = 'location'
+
+    def filter_spatial(self, queryset):
+        params = self.request.query_params
+        if params.get('bbox'):
+            min_lng, min_lat, max_lng, max_lat = parse_floats(params['bbox'], 4, 'bbox')
+            bbox = Polygon.from_bbox((min_lng, min_lat, max_lng, max_lat))
+            bbox.srid = 4326
+            queryset = queryset.filter(**{f'{self.spatial_field}__within': bbox})
+        if params.get('near'):
+            lat, lng = parse_floats(params['near'], 2, 'near')
+            radius_km = parse_floats(params.get('radius_km', '5'), 1, 'radius_km')[0]
+            point = Point(lng, lat, srid=4326)
+            # Index-assisted degree prefilter, then the exact spheroid distance
+            degrees = radius_km / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+            queryset = queryset.filter(**{
+                f'{self.spatial_field}__dwithin': (point, degrees),
+                f'{self.spatial_field}__distance_lte': (point, D(km=radius_km)),
+            })
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = self.get_serializer(page, many=True).data
+
+        if request.query_params.get('geojson') in ('1', 'true'):
+            return Response({
+                'type': 'FeatureCollection',
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+                'features': [self.as_feature(item) for item in data],
+            })
+        return self.get_paginated_response(data)
+
+    def as_feature(self, item):
+        properties = dict(item)
+        lat, lng = properties.pop('lat', None), properties.pop('lng', None)
+        geometry = {'type': 'Point', 'coordinates': [lng, lat]} if lat is not None else None
+        return {'type': 'Feature', 'id': properties.get('id'), 'geometry': geometry, 'properties': properties}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200 and not response.streaming:
+            if hasattr(response, 'render'):
+                response.render()
+            etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+            response['ETag'] = etag
+            if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+                response.status_code = 304
+                response.content = b''
+        return response
+
+class AgentViewSet(SpatialListMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = AgentSerializer
+    permission_classes = [IsManager]
+    pagination_class = KeysetPagination
+    spatial_field = 'current_location'
+
+    def get_queryset(self):
+        queryset = User.objects.filter(role='agent').order_by('-created_at')
+        for flag in ('is_active_agent', 'is_online'):
+            if flag in self.request.query_params:
+                queryset = queryset.filter(**{flag: self.request.query_params[flag] in ('1', 'true')})
+        return self.filter_spatial(queryset)
+
+    @action(detail=True, methods=['get'])
+    def track(self, request, pk=None):
+        # ?start=&end= (ISO 8601, default today) and either ?tolerance= in
+        # degrees or ?zoom= for a one-pixel tolerance at that map zoom.
+        # ?encoding=binary returns the delta-encoded binary layout.
+        agent = self.get_object()
+        params = request.query_params
+        today = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        start = parse_time(params.get('start'), today, 'start')
+        end = parse_time(params.get('end'), timezone.now(), 'end')
+        if params.get('tolerance'):
+            tolerance = parse_floats(params['tolerance'], 1, 'tolerance')[0]
+        else:
+            tolerance = zoom_tolerance(parse_floats(params.get('zoom', '15'), 1, 'zoom')[0])
+
+        track = agent_track(agent.pk, start, end, tolerance)
+
+        if params.get('encoding') == 'binary':
+            return HttpResponse(
+                encode_binary(track['lats'], track['lngs'], track['seconds']),
+                content_type='application/octet-stream',
+            )
+        seconds = track['seconds']
+        return Response({
+            'agent_id': str(agent.pk),
+            'start': start,
+            'end': end,
+            'tolerance': tolerance,
+            'original_points': track['original_points'],
+            'points': len(seconds),
+            'polyline': encode_polyline(track['lats'], track['lngs']),
+            't0': int(seconds[0]) if len(seconds) else None,
+            'dt': (seconds[1:] - seconds[:-1]).tolist(),
+        })
+
+class ClientViewSet(SpatialListMixin, viewsets.ReadOnlyModelViewSet):
+    # Managers see every client; agents only those they have been assigned
+    serializer_class = ClientSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        params = self.request.query_params
+        if params.get('available') in ('1', 'true'):
+            queryset = available_clients()
+        else:
+            queryset = Client.objects.all()
+        if self.request.user.role != 'manager':
+            queryset = queryset.filter(Exists(
+                Assignment.objects.filter(client=OuterRef('pk'), agent=self.request.user)
+            ))
+        if 'is_active' in params:
+            queryset = queryset.filter(is_active=params['is_active'] in ('1', 'true'))
+        if params.get('priority'):
+            queryset = queryset.filter(priority__in=parse_choices(params['priority'], Client.PRIORITY_CHOICES, 'priority', int))
+        return self.filter_spatial(queryset.order_by('-created_at'))
+
+class AssignmentKeysetPagination(KeysetPagination):
+    ordering = '-assigned_at'
+
+class AssignmentViewSet(SpatialListMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = AssignmentSerializer
+    pagination_class = AssignmentKeysetPagination
+    spatial_field = 'client__location'
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Assignment.objects.select_related('client')
+        if self.request.user.role != 'manager':
+            queryset = queryset.filter(agent=self.request.user)
+        elif params.get('agent'):
+            queryset = queryset.filter(agent_id=parse_uuid(params['agent'], 'agent'))
+        if params.get('status'):
+            queryset = queryset.filter(status__in=parse_choices(params['status'], Assignment.STATUS_CHOICES, 'status'))
+        return self.filter_spatial(queryset.order_by('-assigned_at'))
+
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    # The requesting user's inbox, newest first; ?unread=1 limits to unread
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = NotificationLog.objects.filter(recipient=self.request.user)
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            queryset = queryset.filter(is_read=False)
+        return queryset.order_by('-created_at')
+
+    def selection(self, request):
+        # Body: {"ids": [...]} and/or {"before": "<ISO 8601>"}; neither means all
+        ids = request.data.get('ids')
+        if ids is not None and not isinstance(ids, list):
+            raise ValidationError({'ids': 'Expected a list of notification ids'})
+        return {'ids': ids, 'before': parse_time(request.data.get('before'), None, 'before')}
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        updated = mark_read(request.user.pk, **self.selection(request))
+        return Response({'updated': updated, 'unread': unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['post'], url_path='mark-unread')
+    def mark_unread(self, request):
+        updated = mark_unread(request.user.pk, **self.selection(request))
+        return Response({'updated': updated, 'unread': unread_count(request.user.pk)})
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        return Response({'unread': unread_count(request.user.pk)})
@@ -6,5 +6,4 @@ class OperationsConfig(AppConfig):
     verbose_name = 'Field Operations'
 
     def ready(self):
-        # Import signals if needed
-        pass
+        from . import signals  # noqa: F401
@@ -1,7 +1,11 @@
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from .fleet import FleetView, feed_tick, load_fleet
+from .ingestion import get_ingestor
+from .presence import get_presence
 
 User = get_user_model()
 
@@ -15,6 +19,7 @@ class AgentConsumer(AsyncWebsocketConsumer):
         self.group_name = f'agent_{self.user.id}'
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        get_presence().heartbeat(self.user.pk)
 
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
@@ -24,6 +29,8 @@ class AgentConsumer(AsyncWebsocketConsumer):
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
+            # Any message from the app counts as a heartbeat
+            get_presence().heartbeat(self.user.pk)
 
             if message_type == 'location_update':
                 await self.handle_location_update(data)
@@ -37,9 +44,17 @@ class AgentConsumer(AsyncWebsocketConsumer):
         try:
             latitude = float(data.get('latitude'))
             longitude = float(data.get('longitude'))
+            accuracy = data.get('accuracy')
+            accuracy = float(accuracy) if accuracy is not None else None
+
+            # Buffered in memory; the ingestor writes batches from its own thread
+            # and feeds the managers' live map
+            accepted = get_ingestor().record(self.user.pk, latitude, longitude, accuracy=accuracy)
+
             await self.send(text_data=json.dumps({
                 'type': 'location_updated',
-                'message': 'Location updated successfully'
+                'message': 'Location updated successfully',
+                'accepted': accepted,
             }))
         except Exception as e:
             await self.send(text_data=json.dumps({'type': 'error', 'message': str(e)}))
@@ -55,15 +70,30 @@ class ManagerConsumer(AsyncWebsocketConsumer):
             return
 
         self.group_name = f'manager_{self.user.id}'
+        self.fleet = None
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.channel_layer.group_add('managers', self.channel_name)
         await self.accept()
 
+        self.fleet = FleetView(await database_sync_to_async(load_fleet)())
+        await self.send(text_data=json.dumps(self.fleet.snapshot(), separators=(',', ':')))
+        self.feed_task = asyncio.ensure_future(self.feed_loop())
+
     async def disconnect(self, close_code):
+        if hasattr(self, 'feed_task'):
+            self.feed_task.cancel()
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
         await self.channel_layer.group_discard('managers', self.channel_name)
 
+    async def feed_loop(self):
+        tick = feed_tick()
+        while True:
+            await asyncio.sleep(tick)
+            delta = self.fleet.delta()
+            if delta:
+                await self.send(text_data=json.dumps(delta, separators=(',', ':')))
+
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
@@ -71,9 +101,28 @@ class ManagerConsumer(AsyncWebsocketConsumer):
 
             if message_type == 'ping':
                 await self.send(text_data=json.dumps({'type': 'pong'}))
+            elif message_type == 'subscribe' and self.fleet is not None:
+                self.fleet.set_bbox(data.get('bbox'))
+                await self.send(text_data=json.dumps(self.fleet.snapshot(), separators=(',', ':')))
 
         except Exception as e:
             await self.send(text_data=json.dumps({'type': 'error', 'message': str(e)}))
 
     async def send_notification(self, event):
         await self.send(text_data=json.dumps(event['data']))
+
+    async def import_progress(self, event):
+        await self.send(text_data=json.dumps(event['data']))
+
+    async def agent_locations(self, event):
+        if self.fleet is not None:
+            for agent_id, lat, lng in event['data']['agents']:
+                self.fleet.update(agent_id, lat=lat, lng=lng)
+
+    async def agent_presence(self, event):
+        await self.send(text_data=json.dumps(event['data']))
+
+    async def agent_status(self, event):
+        if self.fleet is not None:
+            for agent_id, status in event['data']['agents']:
+                self.fleet.update(agent_id, status=status)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db.models import Count, Prefetch, Q
+from django.utils import timezone
+from .models import CURRENT_ASSIGNMENT_ORDERING, User, Client, Assignment
+from .projections import agent_day_stats, schedule_projections
+from .state import read_agents
+
+CACHE_KEY = 'operations:manager_dashboard'
+
+def build_manager_context():
+    agent_stats = User.objects.filter(role='agent').aggregate(
+        total_agents=Count('pk'),
+        active_agents=Count('pk', filter=Q(is_active_agent=True)),
+    )
+    active_assignments = Assignment.objects.filter(status__in=Assignment.ACTIVE_STATUSES).count()
+    # Today's figures come from the event projections instead of scanning
+    # Assignment; the projector itself runs from cron or the job pool
+    schedule_projections()
+    daily_stats = agent_day_stats(timezone.localdate())
+    agents = User.objects.filter(role='agent').prefetch_related(Prefetch(
+        'assignments',
+        queryset=Assignment.objects.filter(
+            status__in=Assignment.ACTIVE_STATUSES,
+        ).select_related('client').order_by(*CURRENT_ASSIGNMENT_ORDERING),
+        to_attr='active_assignments',
+    ))
+
+    return {
+        **agent_stats,
+        'total_clients': Client.objects.filter(is_active=True).count(),
+        'active_assignments': active_assignments,
+        'completed_today': sum(s['completed'] for s in daily_stats.values()),
+        'recent_assignments': list(Assignment.objects.select_related('agent', 'client').all()[:10]),
+        'agents_data': [{
+            'agent': agent,
+            'current_assignment': agent.active_assignments[0] if agent.active_assignments else None,
+            'location': agent.current_location,
+            'today': daily_stats.get(agent.pk),
+        } for agent in agents],
+    }
+
+def with_live_state(context):
+    # Positions move faster than the cache TTL; overlay them from the state store
+    states = read_agents([row['agent'].pk for row in context['agents_data']])
+    if states is None:
+        return context
+    agents_data = []
+    for row in context['agents_data']:
+        state = states.get(str(row['agent'].pk))
+        if state is not None:
+            row = {**row, 'status': state['status'], 'last_seen': state['last_seen']}
+            if state['latitude'] is not None:
+                row['location'] = Point(state['longitude'], state['latitude'], srid=4326)
+        agents_data.append(row)
+    return {**context, 'agents_data': agents_data}
+
+def manager_context():
+    context = cache.get(CACHE_KEY)
+    if context is None:
+        context = build_manager_context()
+        cache.set(CACHE_KEY, context, getattr(settings, 'DASHBOARD_CACHE_TTL', 15))
+    return with_live_state(context)
+
+def invalidate_dashboard():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,26 @@
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .backends import Route, BaseRoutingBackend, HaversineBackend, OfflineGraphBackend, OpenRouteServiceBackend
+from .cache import CachedRoutingBackend, LRUCache
+from .graph import RoadGraph
+
+__all__ = [
+    'Route', 'BaseRoutingBackend', 'HaversineBackend', 'OfflineGraphBackend',
+    'OpenRouteServiceBackend', 'CachedRoutingBackend', 'LRUCache', 'RoadGraph', 'get_router',
+]
+
+_router = None
+_lock = threading.Lock()
+
+def get_router():
+    global _router
+    with _lock:
+        if _router is None:
+            config = dict(getattr(settings, 'ROUTING', {}))
+            backend = import_string(config.pop('BACKEND', 'operations.directions.HaversineBackend'))
+            _router = backend(**config)
+            cache_config = getattr(settings, 'ROUTING_CACHE', {})
+            if cache_config.get('ENABLED', True):
+                _router = CachedRoutingBackend(_router, **cache_config)
+    return _router
@@ -0,0 +1,121 @@
+import os
+import threading
+from ..geo import haversine_km
+from .graph import RoadGraph
+
+MODE_SPEEDS_KMH = {'driving': 25.0, 'cycling': 14.0, 'walking': 5.0}
+
+class Route:
+    def __init__(self, coordinates, distance_km, duration_s, source):
+        self.coordinates = coordinates
+        self.distance_km = distance_km
+        self.duration_s = duration_s
+        self.source = source
+
+    def as_dict(self):
+        return {
+            'coordinates': self.coordinates,
+            'distance': round(self.distance_km, 3),
+            'duration': round(self.duration_s),
+            'source': self.source,
+        }
+
+class BaseRoutingBackend:
+    def __init__(self, **options):
+        self.options = options
+
+    def route(self, start, end, mode='driving'):
+        raise NotImplementedError
+
+class HaversineBackend(BaseRoutingBackend):
+    # Straight line scaled by a detour factor; always available
+    def route(self, start, end, mode='driving'):
+        distance = haversine_km(start[0], start[1], end[0], end[1]) * self.options.get('DETOUR_FACTOR', 1.3)
+        speed = self.options.get('SPEEDS_KMH', MODE_SPEEDS_KMH).get(mode, MODE_SPEEDS_KMH['driving'])
+        return Route(
+            [[start[1], start[0]], [end[1], end[0]]],
+            distance,
+            distance / speed * 3600.0,
+            'haversine',
+        )
+
+class OfflineGraphBackend(BaseRoutingBackend):
+    # A* over a compiled road graph (see the build_road_graph command). The
+    # graph is memory-mapped once per process; requests that cannot be snapped
+    # onto it, or have no path, fall back to the haversine estimate.
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.fallback = HaversineBackend(**options)
+        self._graph = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def graph(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    path = self.options.get('GRAPH_PATH')
+                    if path and os.path.exists(path):
+                        self._graph = RoadGraph.load(path)
+                    self._loaded = True
+        return self._graph
+
+    def route(self, start, end, mode='driving'):
+        graph = self.graph
+        if graph is None or mode != 'driving':
+            return self.fallback.route(start, end, mode)
+
+        max_snap_km = self.options.get('MAX_SNAP_KM', 2.0)
+        source, source_km = graph.nearest_node(start[0], start[1], max_snap_km)
+        target, target_km = graph.nearest_node(end[0], end[1], max_snap_km)
+        if source is None or target is None:
+            return self.fallback.route(start, end, mode)
+
+        result = graph.astar(source, target)
+        if result is None:
+            return self.fallback.route(start, end, mode)
+        path, length_km, duration_s = result
+
+        # Off-network legs to and from the snapped nodes at walking-ish pace
+        access_km = source_km + target_km
+        return Route(
+            [[start[1], start[0]]] + graph.coordinates(path) + [[end[1], end[0]]],
+            length_km + access_km,
+            duration_s + access_km / MODE_SPEEDS_KMH['cycling'] * 3600.0,
+            'road_graph',
+        )
+
+class OpenRouteServiceBackend(BaseRoutingBackend):
+    PROFILES = {'driving': 'driving-car', 'cycling': 'cycling-regular', 'walking': 'foot-walking'}
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.fallback = HaversineBackend(**options)
+
+    def route(self, start, end, mode='driving'):
+        import requests
+
+        profile = self.PROFILES.get(mode, 'driving-car')
+        try:
+            response = requests.get(
+                f'https://api.openrouteservice.org/v2/directions/{profile}',
+                params={
+                    'api_key': self.options['API_KEY'],
+                    'start': f'{start[1]},{start[0]}',
+                    'end': f'{end[1]},{end[0]}',
+                },
+                timeout=self.options.get('TIMEOUT', 5),
+            )
+            response.raise_for_status()
+            feature = response.json()['features'][0]
+        except (requests.RequestException, KeyError, IndexError, ValueError):
+            return self.fallback.route(start, end, mode)
+
+        summary = feature['properties']['summary']
+        return Route(
+            feature['geometry']['coordinates'],
+            summary.get('distance', 0) / 1000.0,
+            summary.get('duration', 0),
+            'openrouteservice',
+        )
@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from redis.exceptions import RedisError
+from .backends import BaseRoutingBackend
+
+class LRUCache:
+    # In-process LRU with a per-entry TTL
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+class CachedRoutingBackend(BaseRoutingBackend):
+    # Wraps another backend. Endpoints are snapped to a CELL_DEGREES grid so
+    # nearby requests share one entry; lookups go in-process LRU -> shared
+    # Redis cache -> wrapped backend.
+    def __init__(self, backend, **options):
+        super().__init__(**options)
+        self.backend = backend
+        self.cell = options.get('CELL_DEGREES', 0.001)
+        self.local = LRUCache(options.get('LOCAL_SIZE', 10000), options.get('LOCAL_TTL', 600))
+        self.shared = caches[options.get('SHARED_CACHE', 'default')]
+        self.shared_ttl = options.get('SHARED_TTL', 3600)
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'shared_errors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def key(self, start, end, mode):
+        cells = (math.floor(v / self.cell) for v in (start[0], start[1], end[0], end[1]))
+        return f'route:{mode}:{self.cell}:' + ':'.join(str(c) for c in cells)
+
+    def route(self, start, end, mode='driving'):
+        key = self.key(start, end, mode)
+        route = self.local.get(key)
+        if route is not None:
+            self._count('local_hits')
+            return route
+
+        try:
+            route = self.shared.get(key)
+        except RedisError:
+            self._count('shared_errors')
+            route = None
+        if route is not None:
+            self._count('shared_hits')
+            self.local.set(key, route)
+            return route
+
+        self._count('misses')
+        route = self.backend.route(start, end, mode)
+        self.local.set(key, route)
+        try:
+            self.shared.set(key, route, self.shared_ttl)
+        except RedisError:
+            self._count('shared_errors')
+        return route
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 4) if lookups else None
+        stats['local_entries'] = len(self.local)
+        return stats
@@ -0,0 +1,154 @@
+import heapq
+import math
+import os
+import numpy as np
+from ..geo import haversine_km, haversine_pairs
+
+GRID_CELL_DEGREES = 0.005
+ARRAYS = ('lat', 'lng', 'indptr', 'indices', 'lengths', 'durations')
+
+class RoadGraph:
+    # Directed road network in CSR form: the edges leaving node u are
+    # indices[indptr[u]:indptr[u + 1]] with matching lengths (km) and
+    # durations (seconds).
+
+    def __init__(self, lat, lng, indptr, indices, lengths, durations):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lng = np.asarray(lng, dtype=float)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=float)
+        self.durations = np.asarray(durations, dtype=float)
+        self.max_speed_kmh = float(np.max(self.lengths / np.maximum(self.durations, 1e-9) * 3600)) if len(self.lengths) else 1.0
+        self._build_grid()
+
+    @classmethod
+    def load(cls, path):
+        # One .npy per array in the directory at path. np.load can only
+        # memory-map plain .npy files, and the arrays are saved with the
+        # dtypes __init__ asks for, so they stay mapped rather than copied.
+        return cls(*(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def from_edges(cls, lat, lng, sources, targets, lengths, durations):
+        order = np.lexsort((targets, sources))
+        sources, targets = np.asarray(sources)[order], np.asarray(targets)[order]
+        indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.add.at(indptr, sources + 1, 1)
+        return cls(lat, lng, np.cumsum(indptr), targets,
+                   np.asarray(lengths)[order], np.asarray(durations)[order])
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cell(self, lat, lng):
+        return np.floor(lat / GRID_CELL_DEGREES).astype(np.int64), np.floor(lng / GRID_CELL_DEGREES).astype(np.int64)
+
+    def _build_grid(self):
+        rows, cols = self._cell(self.lat, self.lng)
+        self._keys = rows * 1_000_003 + cols
+        self._order = np.argsort(self._keys, kind='stable')
+        self._sorted_keys = self._keys[self._order]
+
+    def _nodes_in(self, row, col):
+        key = row * 1_000_003 + col
+        lo, hi = np.searchsorted(self._sorted_keys, [key, key + 1])
+        return self._order[lo:hi]
+
+    def nearest_node(self, lat, lng, max_km):
+        row, col = (int(v) for v in self._cell(np.float64(lat), np.float64(lng)))
+        max_ring = int(max_km / (GRID_CELL_DEGREES * 111.0)) + 1
+        best = None
+        for ring in range(max_ring + 1):
+            candidates = [
+                self._nodes_in(row + dr, col + dc)
+                for dr in range(-ring, ring + 1)
+                for dc in range(-ring, ring + 1)
+                if max(abs(dr), abs(dc)) == ring
+            ]
+            candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+            if len(candidates):
+                distances = haversine_pairs(self.lat[candidates], self.lng[candidates], lat, lng)
+                i = int(np.argmin(distances))
+                if best is None or distances[i] < best[1]:
+                    best = (int(candidates[i]), float(distances[i]))
+            # Anything in a further ring is at least `ring` cells away
+            if best is not None and best[1] <= ring * GRID_CELL_DEGREES * 111.0 * math.cos(math.radians(lat)):
+                break
+        if best is None or best[1] > max_km:
+            return None, None
+        return best
+
+    def neighbours(self, node):
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return zip(self.indices[start:end].tolist(), self.lengths[start:end].tolist(),
+                   self.durations[start:end].tolist())
+
+    def astar(self, source, target, weight='duration'):
+        # Returns (path, length_km, duration_s) or None when unreachable
+        target_lat, target_lng = float(self.lat[target]), float(self.lng[target])
+        if weight == 'duration':
+            scale = 3600.0 / self.max_speed_kmh
+        else:
+            scale = 1.0
+
+        def heuristic(node):
+            return haversine_km(float(self.lat[node]), float(self.lng[node]), target_lat, target_lng) * scale
+
+        best = {source: 0.0}
+        totals = {source: (0.0, 0.0)}
+        previous = {}
+        heap = [(heuristic(source), 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                path = [node]
+                while path[-1] in previous:
+                    path.append(previous[path[-1]])
+                length, duration = totals[node]
+                return path[::-1], length, duration
+            if node in closed:
+                continue
+            closed.add(node)
+            length, duration = totals[node]
+            for neighbour, edge_length, edge_duration in self.neighbours(node):
+                new_cost = cost + (edge_duration if weight == 'duration' else edge_length)
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    totals[neighbour] = (length + edge_length, duration + edge_duration)
+                    previous[neighbour] = node
+                    heapq.heappush(heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None
+
+    def one_to_many(self, source, targets, weight='duration'):
+        # Dijkstra from one node, stopping once every target is settled.
+        # Returns {target: (length_km, duration_s)} for the reachable ones.
+        remaining = set(targets)
+        found = {}
+        best = {source: 0.0}
+        totals = {source: (0.0, 0.0)}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            cost, node = heapq.heappop(heap)
+            if cost > best.get(node, math.inf):
+                continue
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = totals[node]
+            length, duration = totals[node]
+            for neighbour, edge_length, edge_duration in self.neighbours(node):
+                new_cost = cost + (edge_duration if weight == 'duration' else edge_length)
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    totals[neighbour] = (length + edge_length, duration + edge_duration)
+                    heapq.heappush(heap, (new_cost, neighbour))
+        return found
+
+    def coordinates(self, path):
+        return [[float(self.lng[n]), float(self.lat[n])] for n in path]
@@ -0,0 +1,96 @@
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
+import numpy as np
+from ..geo import haversine_pairs
+from .graph import RoadGraph
+
+# Lowest speed (km/h) taken from a maxspeed tag, so '0' or walking-pace
+# tags cannot make an edge effectively impassable
+MIN_SPEED_KMH = 5.0
+
+# Free-flow driving speeds (km/h) for highway classes without a maxspeed tag
+HIGHWAY_SPEEDS = {
+    'motorway': 90, 'motorway_link': 50,
+    'trunk': 70, 'trunk_link': 40,
+    'primary': 50, 'primary_link': 35,
+    'secondary': 40, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 25,
+    'unclassified': 25, 'residential': 20,
+    'living_street': 10, 'service': 15, 'road': 25,
+}
+
+def _open(path):
+    if str(path).endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def _speed(tags):
+    maxspeed = tags.get('maxspeed', '').split(' ')[0]
+    if maxspeed.isdigit():
+        speed = float(maxspeed)
+        speed = speed * 1.609 if 'mph' in tags['maxspeed'] else speed
+        return max(speed, MIN_SPEED_KMH)
+    return HIGHWAY_SPEEDS[tags['highway']]
+
+def _iter_ways(path):
+    with _open(path) as f:
+        for _, element in ET.iterparse(f, events=('end',)):
+            if element.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in element.iter('tag')}
+                if tags.get('highway') in HIGHWAY_SPEEDS and tags.get('access') not in ('no', 'private'):
+                    yield [int(nd.get('ref')) for nd in element.iter('nd')], tags
+                element.clear()
+            elif element.tag in ('node', 'relation'):
+                element.clear()
+
+def build_graph(path):
+    # Two streaming passes over an .osm XML extract (optionally .bz2/.gz):
+    # drivable ways first, then only the nodes those ways reference.
+    sources, targets, speeds = [], [], []
+    node_index = {}
+
+    def index(ref):
+        if ref not in node_index:
+            node_index[ref] = len(node_index)
+        return node_index[ref]
+
+    for refs, tags in _iter_ways(path):
+        speed = _speed(tags)
+        oneway = tags.get('oneway')
+        if tags.get('junction') == 'roundabout' or tags['highway'].startswith('motorway'):
+            oneway = oneway or 'yes'
+        for a, b in zip(refs, refs[1:]):
+            a, b = index(a), index(b)
+            if oneway == '-1':
+                a, b = b, a
+            sources.append(a)
+            targets.append(b)
+            speeds.append(speed)
+            if oneway not in ('yes', 'true', '1', '-1'):
+                sources.append(b)
+                targets.append(a)
+                speeds.append(speed)
+
+    lat = np.full(len(node_index), np.nan)
+    lng = np.full(len(node_index), np.nan)
+    with _open(path) as f:
+        for _, element in ET.iterparse(f, events=('end',)):
+            if element.tag == 'node':
+                i = node_index.get(int(element.get('id')))
+                if i is not None:
+                    lat[i] = float(element.get('lat'))
+                    lng[i] = float(element.get('lon'))
+            element.clear()
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    speeds = np.asarray(speeds, dtype=float)
+    valid = ~(np.isnan(lat[sources]) | np.isnan(lat[targets]))
+    sources, targets, speeds = sources[valid], targets[valid], speeds[valid]
+
+    lengths = haversine_pairs(lat[sources], lng[sources], lat[targets], lng[targets])
+    durations = lengths / speeds * 3600.0
+    return RoadGraph.from_edges(np.nan_to_num(lat), np.nan_to_num(lng), sources, targets, lengths, durations)
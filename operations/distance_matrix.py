@@ -0,0 +1,98 @@
+import json
+import numpy as np
+from django.conf import settings
+from .directions import get_router
+from .directions.backends import MODE_SPEEDS_KMH
+from .geo import haversine_matrix
+
+def config():
+    return {
+        'CHUNK_CELLS': 2_000_000,
+        'ROAD_MAX_CELLS': 250_000,
+        'MAX_CELLS': 25_000_000,
+        **getattr(settings, 'DISTANCE_MATRIX', {}),
+    }
+
+def road_graph():
+    router = get_router()
+    backend = getattr(router, 'backend', router)
+    return getattr(backend, 'graph', None), getattr(backend, 'options', {})
+
+def haversine_blocks(origins, destinations, mode='driving'):
+    # Yields (first_row, distances_km, durations_s) blocks of roughly
+    # CHUNK_CELLS cells so N x M never has to be materialised at once.
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    options = road_graph()[1]
+    detour = options.get('DETOUR_FACTOR', 1.3)
+    speed = MODE_SPEEDS_KMH.get(mode, MODE_SPEEDS_KMH['driving'])
+    rows = max(1, config()['CHUNK_CELLS'] // max(len(destinations), 1))
+    for start in range(0, len(origins), rows):
+        block = origins[start:start + rows]
+        distances = haversine_matrix(block[:, 0], block[:, 1], destinations[:, 0], destinations[:, 1]) * detour
+        yield start, distances, distances / speed * 3600.0
+
+def road_blocks(origins, destinations, graph, options):
+    # One Dijkstra per origin over the road graph; unsnappable or unreachable
+    # pairs keep their haversine estimate.
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 2)
+    max_snap_km = options.get('MAX_SNAP_KM', 2.0)
+    snapped = [graph.nearest_node(lat, lng, max_snap_km) for lat, lng in destinations]
+    by_node = {}
+    for j, (node, _) in enumerate(snapped):
+        if node is not None:
+            by_node.setdefault(node, []).append(j)
+    access = np.array([km or 0.0 for _, km in snapped])
+
+    for start, distances, durations in haversine_blocks(origins, destinations):
+        for i in range(len(distances)):
+            lat, lng = origins[start + i]
+            source, source_km = graph.nearest_node(lat, lng, max_snap_km)
+            if source is None:
+                continue
+            for node, (length, duration) in graph.one_to_many(source, by_node).items():
+                columns = by_node[node]
+                extra = source_km + access[columns]
+                distances[i, columns] = length + extra
+                durations[i, columns] = duration + extra / MODE_SPEEDS_KMH['cycling'] * 3600.0
+        yield start, distances, durations
+
+def matrix_blocks(origins, destinations, metric='haversine', mode='driving'):
+    if metric == 'road' and mode == 'driving':
+        graph, options = road_graph()
+        if graph is not None and len(origins) * len(destinations) <= config()['ROAD_MAX_CELLS']:
+            return road_blocks(origins, destinations, graph, options), 'road'
+    return haversine_blocks(origins, destinations, mode), 'haversine'
+
+def distance_matrix(origins, destinations, metric='haversine', mode='driving'):
+    blocks, used = matrix_blocks(origins, destinations, metric, mode)
+    distances = np.empty((len(origins), len(destinations)))
+    durations = np.empty((len(origins), len(destinations)))
+    for start, block_distances, block_durations in blocks:
+        distances[start:start + len(block_distances)] = block_distances
+        durations[start:start + len(block_durations)] = block_durations
+    return distances, durations, used
+
+def stream_json(origins, destinations, metric='haversine', mode='driving', fields=('distances', 'durations'), ids=None):
+    blocks, used = matrix_blocks(origins, destinations, metric, mode)
+    header = {
+        'metric': used,
+        'mode': mode,
+        'units': {'distances': 'm', 'durations': 's'},
+        'shape': [len(origins), len(destinations)],
+        **(ids or {}),
+    }
+    yield json.dumps(header)[:-1] + ', "rows": ['
+    first = True
+    for _, distances, durations in blocks:
+        # Whole metres and seconds keep the payload small and format quickly
+        values = {
+            'distances': np.rint(distances * 1000).astype(np.int64).tolist(),
+            'durations': np.rint(durations).astype(np.int64).tolist(),
+        }
+        for i in range(len(distances)):
+            row = ', '.join(f'"{name}": [' + ','.join(map(str, values[name][i])) + ']' for name in fields)
+            yield ('' if first else ',') + '{' + row + '}'
+            first = False
+    yield ']}'
@@ -0,0 +1,29 @@
+from django.utils import timezone
+from .models import AssignmentEvent
+
+STATUS_EVENTS = {
+    'assigned': 'created',
+    'in_progress': 'started',
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+}
+
+def event(kind, assignment_id, agent_id, client_id, at=None, value=None):
+    return AssignmentEvent(
+        assignment_id=assignment_id,
+        agent_id=agent_id,
+        client_id=client_id,
+        event=kind,
+        at=at or timezone.now(),
+        value=value,
+    )
+
+def assignment_event(assignment, kind, at=None, value=None):
+    return event(kind, assignment.pk, assignment.agent_id, assignment.client_id, at, value)
+
+def created_events(assignments):
+    return [assignment_event(a, 'created', a.assigned_at, a.distance_to_client) for a in assignments]
+
+def record(events):
+    # Call inside the transaction that made the change so history and state commit together
+    return AssignmentEvent.objects.bulk_create(events)
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from .matching import X, Y
+from .models import CURRENT_ASSIGNMENT_ORDERING, User, Assignment
+from .realtime import send_to_managers
+
+logger = logging.getLogger(__name__)
+
+def feed_precision():
+    return getattr(settings, 'FLEET_FEED_PRECISION', 5)
+
+def agent_status(is_active_agent, assignment_status):
+    if not is_active_agent:
+        return 'off_duty'
+    return assignment_status or 'idle'
+
+def feed_tick():
+    return getattr(settings, 'FLEET_FEED_TICK_SECONDS', 1.0)
+
+class PositionFeed:
+    # Latest accepted position per agent in this process, sent to the
+    # managers group as one 'agent_locations' batch per tick instead of a
+    # group_send per ping
+
+    def __init__(self, tick_seconds):
+        self.tick_seconds = tick_seconds
+        self._positions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, agent_id, latitude, longitude):
+        with self._lock:
+            self._positions[str(agent_id)] = (round(latitude, 6), round(longitude, 6))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='position-feed', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        with self._lock:
+            positions, self._positions = self._positions, {}
+        if positions:
+            send_to_managers('agent_locations', {
+                'agents': [[agent_id, lat, lng] for agent_id, (lat, lng) in positions.items()],
+            })
+        return len(positions)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Position feed flush failed')
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def get_position_feed():
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = PositionFeed(feed_tick())
+    return _feed
+
+def with_assignment_status(agents):
+    current = Assignment.objects.filter(
+        agent=OuterRef('pk'),
+        status__in=Assignment.ACTIVE_STATUSES,
+    ).order_by(*CURRENT_ASSIGNMENT_ORDERING).values('status')[:1]
+    return agents.annotate(assignment_status=Subquery(current))
+
+def publish_agent_statuses(agent_ids):
+    # Read back after the change so every caller reports what load_fleet would
+    agent_ids = set(agent_ids)
+    if not agent_ids:
+        return
+    rows = with_assignment_status(User.objects.filter(pk__in=agent_ids)).values_list(
+        'pk', 'is_active_agent', 'assignment_status',
+    )
+    agents = [[str(pk), agent_status(is_active_agent, status)] for pk, is_active_agent, status in rows]
+    if agents:
+        send_to_managers('agent_status', {'agents': agents})
+
+def load_fleet():
+    rows = with_assignment_status(User.objects.filter(role='agent')).annotate(
+        lng=X('current_location'),
+        lat=Y('current_location'),
+    ).values_list('pk', 'lat', 'lng', 'is_active_agent', 'assignment_status')
+    return {
+        str(pk): (lat, lng, agent_status(is_active_agent, assignment_status))
+        for pk, lat, lng, is_active_agent, assignment_status in rows
+    }
+
+class FleetView:
+    # Per-socket view of the fleet: the last state sent to the browser plus
+    # the changes waiting for the next tick, with coordinates quantised to
+    # integers of 10^-precision degrees.
+
+    def __init__(self, agents, precision=None):
+        self.scale = 10 ** (feed_precision() if precision is None else precision)
+        self.agents = {}
+        self.pending = {}
+        self.bbox = None
+        for agent_id, (lat, lng, status) in agents.items():
+            self.agents[agent_id] = (self.quantise(lat), self.quantise(lng), status)
+
+    def quantise(self, value):
+        return None if value is None else int(round(value * self.scale))
+
+    def set_bbox(self, bbox):
+        if bbox is None:
+            self.bbox = None
+        else:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox)
+            self.bbox = tuple(self.quantise(v) for v in (min_lng, min_lat, max_lng, max_lat))
+
+    def visible(self, lat, lng):
+        if self.bbox is None:
+            return True
+        if lat is None or lng is None:
+            return False
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+    def update(self, agent_id, lat=None, lng=None, status=None):
+        current = self.pending.get(agent_id) or self.agents.get(agent_id) or (None, None, 'idle')
+        self.pending[agent_id] = (
+            self.quantise(lat) if lat is not None else current[0],
+            self.quantise(lng) if lng is not None else current[1],
+            status or current[2],
+        )
+
+    def snapshot(self):
+        self.agents.update(self.pending)
+        self.pending = {}
+        return {
+            'type': 'fleet_snapshot',
+            'scale': self.scale,
+            'agents': [
+                [agent_id, lat, lng, status]
+                for agent_id, (lat, lng, status) in self.agents.items()
+                if self.visible(lat, lng)
+            ],
+        }
+
+    def delta(self):
+        changed = []
+        for agent_id, state in self.pending.items():
+            previous = self.agents.get(agent_id)
+            if state == previous:
+                continue
+            self.agents[agent_id] = state
+            lat, lng, status = state
+            # Agents leaving the viewport are sent once so the client can drop them
+            if self.visible(lat, lng) or (previous and self.visible(previous[0], previous[1])):
+                changed.append([agent_id, lat, lng, status])
+        self.pending = {}
+        if not changed:
+            return None
+        return {'type': 'fleet_delta', 'scale': self.scale, 'agents': changed}
@@ -1,24 +1,27 @@
 from django import forms
+from django.conf import settings
 from django.contrib.gis.geos import Point
+from .importer import SUPPORTED_EXTENSIONS
 from .models import Client, Assignment, User
 
 class ClientUploadForm(forms.Form):
     file = forms.FileField(
-        label="Excel File",
-        help_text="Upload Excel file with columns: name, phone, email, address, latitude, longitude, priority",
+        label="Excel or CSV File",
+        help_text="Upload Excel or CSV file with columns: name, phone, email, address, latitude, longitude, priority",
         widget=forms.FileInput(attrs={
             'class': 'form-control',
-            'accept': '.xlsx,.xls'
+            'accept': '.xlsx,.xls,.csv'
         })
     )
 
     def clean_file(self):
         file = self.cleaned_data.get('file')
         if file:
-            if not file.name.endswith(('.xlsx', '.xls')):
-                raise forms.ValidationError("Please upload a valid Excel file (.xlsx or .xls)")
-            if file.size > 5 * 1024 * 1024:
-                raise forms.ValidationError("File size must be less than 5MB")
+            if not file.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                raise forms.ValidationError("Please upload a valid Excel or CSV file (.xlsx, .xls or .csv)")
+            max_size_mb = getattr(settings, 'CLIENT_IMPORT_MAX_UPLOAD_MB', 100)
+            if file.size > max_size_mb * 1024 * 1024:
+                raise forms.ValidationError(f"File size must be less than {max_size_mb}MB")
         return file
 
 class ClientForm(forms.ModelForm):
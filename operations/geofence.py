@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.db import transaction
+from .dashboard import invalidate_dashboard
+from .events import event, record
+from .fleet import publish_agent_statuses
+from .geo import haversine_km
+from .matching import X, Y
+from .models import Assignment
+from .notifications import notify_status_change
+from .transitions import TransitionConflict, transition
+
+DEFAULTS = {
+    'ENTER_RADIUS_M': 75.0,
+    'EXIT_RADIUS_M': 150.0,
+    'MAX_ACCURACY_M': 100.0,
+    'REFRESH_SECONDS': 60.0,
+}
+
+METRES_PER_DEGREE = 111320.0
+
+Target = namedtuple('Target', ['assignment_id', 'agent_id', 'client_id', 'status', 'latitude', 'longitude'])
+
+class GeofenceIndex:
+    # Active assignment targets bucketed in a lat/lng grid whose cells are as
+    # large as the exit radius, so a ping only looks at neighbouring cells.
+    # Separate enter/exit radii keep GPS jitter at the edge from flapping.
+
+    def __init__(self, enter_radius_m, exit_radius_m, max_accuracy_m, refresh_seconds):
+        self.enter_radius_m = enter_radius_m
+        self.exit_radius_m = exit_radius_m
+        self.max_accuracy_m = max_accuracy_m
+        self.refresh_seconds = refresh_seconds
+        self.cell = exit_radius_m / METRES_PER_DEGREE
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._in_progress = set()
+        self._loaded_at = None
+        self._inside = defaultdict(dict)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def key(self, latitude, longitude):
+        return math.floor(latitude / self.cell), math.floor(longitude / self.cell)
+
+    def load(self):
+        rows = Assignment.objects.filter(
+            status__in=Assignment.ACTIVE_STATUSES,
+            departed_at__isnull=True,
+        ).annotate(
+            lng=X('client__location'),
+            lat=Y('client__location'),
+        ).values_list('pk', 'agent_id', 'client_id', 'status', 'lat', 'lng')
+
+        cells = defaultdict(list)
+        in_progress = set()
+        for row in rows:
+            target = Target(*row)
+            cells[self.key(target.latitude, target.longitude)].append(target)
+            if target.status == 'in_progress':
+                in_progress.add(target.agent_id)
+        with self._lock:
+            self._cells = dict(cells)
+            self._in_progress = in_progress
+            self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        with self._lock:
+            loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_seconds:
+            self.load()
+
+    def nearby(self, agent_id, latitude, longitude):
+        row, col = self.key(latitude, longitude)
+        # Longitude degrees shrink towards the poles, so widen the column span
+        span = math.ceil(1 / max(math.cos(math.radians(latitude)), 0.01))
+        for r in range(row - 1, row + 2):
+            for c in range(col - span, col + span + 1):
+                for target in self._cells.get((r, c), ()):
+                    if target.agent_id == agent_id:
+                        yield target
+
+    def check(self, pings):
+        # Runs on the ingestion writer thread; only transitions touch the database
+        self.refresh()
+        changed = False
+        for ping in pings:
+            if ping.accuracy is not None and ping.accuracy > self.max_accuracy_m:
+                continue
+            inside = self._inside[ping.agent_id]
+
+            for target in list(inside.values()):
+                distance_m = haversine_km(ping.latitude, ping.longitude, target.latitude, target.longitude) * 1000
+                if distance_m > self.exit_radius_m:
+                    del inside[target.assignment_id]
+                    if target.status == 'in_progress':
+                        changed |= self.depart(target, ping.timestamp)
+
+            for target in self.nearby(ping.agent_id, ping.latitude, ping.longitude):
+                if target.assignment_id in inside:
+                    continue
+                distance_m = haversine_km(ping.latitude, ping.longitude, target.latitude, target.longitude) * 1000
+                if distance_m <= self.enter_radius_m:
+                    inside[target.assignment_id] = target
+                    if target.status == 'assigned' and target.agent_id not in self._in_progress:
+                        if self.arrive(target, ping.timestamp):
+                            inside[target.assignment_id] = target._replace(status='in_progress')
+                            self._in_progress.add(target.agent_id)
+                            changed = True
+
+        if changed:
+            # Conditional updates skip post_save, so refresh caches by hand
+            invalidate_dashboard()
+            self.invalidate()
+        return changed
+
+    def arrive(self, target, timestamp):
+        try:
+            transition(target.assignment_id, 'in_progress', at=timestamp, expected='assigned')
+        except (TransitionConflict, Assignment.DoesNotExist):
+            return False
+        publish_agent_statuses([target.agent_id])
+        notify_status_change(target.assignment_id, target.agent_id, 'in_progress', client_id=str(target.client_id))
+        return True
+
+    def depart(self, target, timestamp):
+        with transaction.atomic():
+            flagged = Assignment.objects.filter(
+                pk=target.assignment_id, status='in_progress', departed_at__isnull=True,
+            ).update(departed_at=timestamp)
+            if flagged:
+                record([event('departed', target.assignment_id, target.agent_id, target.client_id, timestamp)])
+        if flagged:
+            notify_status_change(
+                target.assignment_id, target.agent_id, 'departed',
+                client_id=str(target.client_id), departed_at=timestamp.isoformat(),
+            )
+        return bool(flagged)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_geofence():
+    global _index
+    with _index_lock:
+        if _index is None:
+            config = {**DEFAULTS, **getattr(settings, 'GEOFENCE', {})}
+            _index = GeofenceIndex(
+                enter_radius_m=config['ENTER_RADIUS_M'],
+                exit_radius_m=config['EXIT_RADIUS_M'],
+                max_accuracy_m=config['MAX_ACCURACY_M'],
+                refresh_seconds=config['REFRESH_SECONDS'],
+            )
+    return _index
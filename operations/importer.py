@@ -0,0 +1,285 @@
+import os
+from dataclasses import dataclass, field
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .jobs import submit
+from .models import Client, ImportJob
+from .realtime import send_to_managers
+
+REQUIRED_COLUMNS = ['name', 'phone', 'address', 'latitude', 'longitude']
+OPTIONAL_COLUMNS = ['email', 'priority', 'notes']
+UPDATE_FIELDS = ['name', 'address', 'location', 'email', 'priority', 'notes']
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+MAX_STORED_ERRORS = 500
+
+class ImportFileError(Exception):
+    pass
+
+@dataclass
+class ImportResult:
+    total_rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+def default_chunk_size():
+    return getattr(settings, 'CLIENT_IMPORT_CHUNK_SIZE', 2000)
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+def _frame(header, rows, row_numbers):
+    df = pd.DataFrame(rows, columns=header, dtype=object)
+    df = df.loc[:, [c for c in df.columns if c]]
+    df = df.apply(lambda column: column.map(_cell_text))
+    df['row_number'] = row_numbers
+    return df
+
+def _normalise_header(header):
+    return [_cell_text(h).lower() for h in header]
+
+def _iter_xlsx(file, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalise_header(next(rows, ()))
+        yield header
+        batch, row_numbers = [], []
+        for row_number, row in enumerate(rows, start=2):
+            if not any(cell is not None and cell != '' for cell in row):
+                continue
+            row = tuple(row[:len(header)])
+            batch.append(row + (None,) * (len(header) - len(row)))
+            row_numbers.append(row_number)
+            if len(batch) >= chunk_size:
+                yield _frame(header, batch, row_numbers)
+                batch, row_numbers = [], []
+        if batch:
+            yield _frame(header, batch, row_numbers)
+    finally:
+        workbook.close()
+
+def _iter_csv(file, chunk_size):
+    reader = pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False,
+                         skip_blank_lines=True)
+    first_row_number, header = 2, None
+    for df in reader:
+        if header is None:
+            header = _normalise_header(df.columns)
+            yield header
+        row_numbers = np.arange(first_row_number, first_row_number + len(df))
+        yield _frame(header, df.values.tolist(), row_numbers)
+        first_row_number += len(df)
+    if header is None:
+        yield []
+
+def _iter_xls(file, chunk_size):
+    # Legacy .xls cannot be streamed; it is read once and then chunked
+    df = pd.read_excel(file, dtype=object)
+    header = _normalise_header(df.columns)
+    yield header
+    rows = df.values.tolist()
+    for start in range(0, len(rows), chunk_size):
+        batch = rows[start:start + chunk_size]
+        yield _frame(header, batch, np.arange(start + 2, start + 2 + len(batch)))
+
+def iter_chunks(file, filename, chunk_size=None):
+    chunk_size = chunk_size or default_chunk_size()
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        chunks = _iter_csv(file, chunk_size)
+    elif extension == '.xlsx':
+        chunks = _iter_xlsx(file, chunk_size)
+    elif extension == '.xls':
+        chunks = _iter_xls(file, chunk_size)
+    else:
+        raise ImportFileError(f"Unsupported file type: {extension or filename}")
+
+    header = next(chunks)
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing_columns:
+        raise ImportFileError(f"Missing columns: {', '.join(missing_columns)}")
+    yield from chunks
+
+def validate_chunk(df):
+    for column in OPTIONAL_COLUMNS:
+        if column not in df.columns:
+            df[column] = ''
+
+    latitude = pd.to_numeric(df['latitude'], errors='coerce')
+    longitude = pd.to_numeric(df['longitude'], errors='coerce')
+    priority = pd.to_numeric(df['priority'].replace('', '2'), errors='coerce')
+
+    checks = [
+        (df['name'] == '', 'Name is required'),
+        (df['phone'] == '', 'Phone is required'),
+        (df['address'] == '', 'Address is required'),
+        (df['name'].str.len() > 200, 'Name must be at most 200 characters'),
+        (df['phone'].str.len() > 15, 'Phone must be at most 15 characters'),
+        (latitude.isna() | ~latitude.between(-90, 90), 'Latitude must be a number between -90 and 90'),
+        (longitude.isna() | ~longitude.between(-180, 180), 'Longitude must be a number between -180 and 180'),
+        (~priority.isin([1, 2, 3, 4]), 'Priority must be one of 1, 2, 3, 4'),
+    ]
+
+    invalid = np.zeros(len(df), dtype=bool)
+    errors = []
+    for mask, message in checks:
+        mask = mask.to_numpy(dtype=bool)
+        errors.extend((int(n), message) for n in df['row_number'].to_numpy()[mask & ~invalid])
+        invalid |= mask
+
+    valid = df.loc[~invalid].copy()
+    valid['latitude'] = latitude[~invalid]
+    valid['longitude'] = longitude[~invalid]
+    valid['priority'] = priority[~invalid].astype(int)
+    return valid, errors
+
+def _apply(client, row):
+    client.name = row.name
+    client.address = row.address
+    client.location = Point(row.longitude, row.latitude, srid=4326)
+    client.email = row.email or None
+    client.priority = row.priority
+    client.notes = row.notes or None
+    return client
+
+def import_chunk(df, result, seen_phones, update_existing=False):
+    result.total_rows += len(df)
+    valid, errors = validate_chunk(df)
+    for row_number, message in errors:
+        result.add_error(row_number, message)
+
+    duplicated = valid['phone'].isin(seen_phones) | valid['phone'].duplicated()
+    for row_number in valid.loc[duplicated, 'row_number']:
+        result.add_error(int(row_number), 'Duplicate phone in file')
+    valid = valid.loc[~duplicated]
+    seen_phones.update(valid['phone'])
+    if valid.empty:
+        return result
+
+    existing = {}
+    for client in Client.objects.filter(phone__in=valid['phone'].tolist()):
+        existing.setdefault(client.phone, client)
+
+    to_create, to_update = [], []
+    for row in valid.itertuples(index=False):
+        client = existing.get(row.phone)
+        if client is None:
+            to_create.append(_apply(Client(phone=row.phone), row))
+        elif update_existing:
+            to_update.append(_apply(client, row))
+        else:
+            result.unchanged += 1
+
+    with transaction.atomic():
+        Client.objects.bulk_create(to_create)
+        if to_update:
+            Client.objects.bulk_update(to_update, UPDATE_FIELDS)
+    result.created += len(to_create)
+    result.updated += len(to_update)
+    return result
+
+def import_clients(file, filename, update_existing=False, chunk_size=None, progress=None):
+    result = ImportResult()
+    seen_phones = set()
+    for df in iter_chunks(file, filename, chunk_size):
+        import_chunk(df, result, seen_phones, update_existing=update_existing)
+        if progress:
+            progress(result)
+    return result
+
+def _report(job, result=None, **fields):
+    if result is not None:
+        job.total_rows = result.total_rows
+        job.created_count = result.created
+        job.updated_count = result.updated
+        job.error_count = len(result.errors)
+        fields.setdefault('errors', [list(e) for e in result.errors[:MAX_STORED_ERRORS]])
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'total_rows', 'created_count', 'updated_count', 'error_count',
+        'errors', 'message', 'started_at', 'heartbeat_at', 'finished_at',
+    ])
+    send_to_managers('import_progress', job.as_progress())
+
+def run_import_job(job_id):
+    # Claim the job so a re-queued copy cannot run it a second time
+    now = timezone.now()
+    claimed = ImportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=now, heartbeat_at=now,
+    )
+    if not claimed:
+        return
+    job = ImportJob.objects.get(pk=job_id)
+    send_to_managers('import_progress', job.as_progress())
+    try:
+        with job.file.open('rb') as f:
+            result = import_clients(
+                f, job.original_name,
+                update_existing=job.update_existing,
+                progress=lambda result: _report(job, result),
+            )
+    except Exception as e:
+        _report(job, status='failed', message=str(e), finished_at=timezone.now())
+        return
+    finally:
+        job.file.delete(save=False)
+
+    _report(
+        job, result,
+        status='completed',
+        message=f"Created {result.created} new clients.",
+        finished_at=timezone.now(),
+    )
+
+def recover_import_jobs():
+    # Jobs live in an in-process thread pool, so a restart orphans them: runs
+    # that stopped reporting progress are failed, and pending jobs nobody
+    # picked up are queued again
+    now = timezone.now()
+    stale = now - timedelta(minutes=getattr(settings, 'CLIENT_IMPORT_STALE_MINUTES', 15))
+    silent = Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True, started_at__lt=stale)
+    for job in ImportJob.objects.filter(silent, status='running'):
+        # Re-checked in the update so a heartbeat that lands meanwhile wins
+        failed = ImportJob.objects.filter(silent, pk=job.pk, status='running').update(
+            status='failed', message='Import was interrupted, please upload the file again', finished_at=now,
+        )
+        if failed:
+            job.file.delete(save=False)
+            job.refresh_from_db()
+            send_to_managers('import_progress', job.as_progress())
+
+    waiting = now - timedelta(minutes=getattr(settings, 'CLIENT_IMPORT_PENDING_GRACE_MINUTES', 5))
+    for job_id in ImportJob.objects.filter(status='pending', created_at__lt=waiting).values_list('pk', flat=True):
+        submit(run_import_job, job_id)
+
+def start_import_job(upload, created_by=None, update_existing=False):
+    job = ImportJob.objects.create(
+        file=upload,
+        original_name=upload.name,
+        update_existing=update_existing,
+        created_by=created_by,
+    )
+    transaction.on_commit(lambda: submit(run_import_job, job.pk))
+    return job
@@ -0,0 +1,170 @@
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .fleet import get_position_feed
+from .geo import haversine_km
+from .geofence import get_geofence
+from .models import User, Assignment, LocationHistory
+from .state import write_safely
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_BATCH': 500,
+    'MAX_DELAY_SECONDS': 2.0,
+    'MIN_DISTANCE_M': 10.0,
+    'MAX_INTERVAL_SECONDS': 60.0,
+    # Pings kept in memory while the database is failing; the oldest go first
+    'MAX_PENDING': 5000,
+}
+
+Ping = namedtuple('Ping', ['agent_id', 'latitude', 'longitude', 'accuracy', 'timestamp'])
+
+class LocationIngestor:
+    def __init__(self, max_batch, max_delay, min_distance_m, max_interval, max_pending):
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.min_distance_m = min_distance_m
+        self.max_interval = max_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._latest = {}
+        self._last_accepted = {}
+        self._timer = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='location-flush')
+
+    def should_keep(self, ping):
+        last = self._last_accepted.get(ping.agent_id)
+        if last is None:
+            return True
+        elapsed = (ping.timestamp - last.timestamp).total_seconds()
+        if elapsed >= self.max_interval:
+            return True
+        # A move smaller than the reported GPS error is indistinguishable from jitter
+        moved_m = haversine_km(last.latitude, last.longitude, ping.latitude, ping.longitude) * 1000
+        return moved_m >= max(self.min_distance_m, ping.accuracy or 0.0, last.accuracy or 0.0)
+
+    def record(self, agent_id, latitude, longitude, accuracy=None, timestamp=None):
+        if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
+            raise ValueError('Coordinates out of range')
+        ping = Ping(agent_id, latitude, longitude, accuracy, timestamp or timezone.now())
+
+        with self._lock:
+            if not self.should_keep(ping):
+                return False
+            self._last_accepted[agent_id] = ping
+            self._latest[agent_id] = ping
+            self._pending.append(ping)
+
+            if len(self._pending) >= self.max_batch:
+                self._schedule(0)
+            elif self._timer is None:
+                self._schedule(self.max_delay)
+        # Live map positions go out once per tick, for socket and HTTP pings alike
+        get_position_feed().record(agent_id, latitude, longitude)
+        return True
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, lambda: self._writer.submit(self._flush_in_thread))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _take(self):
+        with self._lock:
+            pending, latest = self._pending, self._latest
+            self._pending, self._latest = [], {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return pending, latest
+
+    def _requeue(self, pending, latest):
+        # Put a failed batch back ahead of anything that arrived meanwhile
+        with self._lock:
+            pending = pending + self._pending
+            dropped = len(pending) - self.max_pending
+            if dropped > 0:
+                logger.warning('Dropping %d location pings after repeated flush failures', dropped)
+                pending = pending[dropped:]
+            self._pending = pending
+            for agent_id, ping in latest.items():
+                self._latest.setdefault(agent_id, ping)
+            if self._timer is None:
+                self._schedule(self.max_delay)
+
+    def _flush_in_thread(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        pending, latest = self._take()
+        if not pending:
+            return 0
+        # Hot state first so readers see the newest position before Postgres does
+        write_safely('write_positions', list(latest.values()))
+
+        try:
+            self._write(pending, latest)
+        except Exception:
+            logger.exception('Failed to write %d location pings, will retry', len(pending))
+            self._requeue(pending, latest)
+            return 0
+        try:
+            get_geofence().check(pending)
+        except Exception:
+            logger.exception('Geofence check failed for %d location pings', len(pending))
+        return len(pending)
+
+    def _write(self, pending, latest):
+        active_assignments = dict(
+            Assignment.objects.filter(
+                agent_id__in=list(latest),
+                status__in=Assignment.ACTIVE_STATUSES,
+            ).order_by('assigned_at').values_list('agent_id', 'pk')
+        )
+
+        with transaction.atomic():
+            LocationHistory.objects.bulk_create([
+                LocationHistory(
+                    agent_id=ping.agent_id,
+                    location=Point(ping.longitude, ping.latitude, srid=4326),
+                    accuracy=ping.accuracy,
+                    timestamp=ping.timestamp,
+                    assignment_id=active_assignments.get(ping.agent_id),
+                )
+                for ping in pending
+            ], batch_size=self.max_batch)
+            User.objects.bulk_update([
+                User(pk=agent_id, current_location=Point(ping.longitude, ping.latitude, srid=4326))
+                for agent_id, ping in latest.items()
+            ], ['current_location'], batch_size=self.max_batch)
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+def get_ingestor():
+    global _ingestor
+    with _ingestor_lock:
+        if _ingestor is None:
+            config = {**DEFAULTS, **getattr(settings, 'LOCATION_INGESTION', {})}
+            _ingestor = LocationIngestor(
+                max_batch=config['MAX_BATCH'],
+                max_delay=config['MAX_DELAY_SECONDS'],
+                min_distance_m=config['MIN_DISTANCE_M'],
+                max_interval=config['MAX_INTERVAL_SECONDS'],
+                max_pending=config['MAX_PENDING'],
+            )
+            atexit.register(_ingestor.flush)
+    return _ingestor
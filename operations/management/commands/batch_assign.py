@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from operations.dashboard import invalidate_dashboard
+from operations.fleet import publish_agent_statuses
+from operations.matching import batch_assign
+
+class Command(BaseCommand):
+    help = 'Assign every idle agent to an unassigned client in one optimal batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=None,
+                            help='Cheapest clients considered per agent')
+
+    def handle(self, *args, **options):
+        assignments = batch_assign(candidates_per_agent=options['candidates'])
+        invalidate_dashboard()
+        publish_agent_statuses(a.agent_id for a in assignments)
+        self.stdout.write(self.style.SUCCESS(f'Created {len(assignments)} assignments'))
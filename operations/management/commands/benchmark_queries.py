@@ -0,0 +1,150 @@
+import re
+import uuid
+from datetime import timedelta
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from operations.matching import available_clients
+from operations.models import User, Client, Assignment, LocationHistory, NotificationLog
+
+EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large dataset (optional) and print EXPLAIN ANALYZE plans for the hot '
+        'queries with and without the operations indexes. Indexes are dropped inside '
+        'a rolled-back transaction, so run it against a development database only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert benchmark rows before measuring')
+        parser.add_argument('--clients', type=int, default=100000)
+        parser.add_argument('--agents', type=int, default=2000)
+        parser.add_argument('--assignments', type=int, default=200000)
+        parser.add_argument('--history', type=int, default=1000000)
+        parser.add_argument('--notifications', type=int, default=200000)
+        parser.add_argument('--plans', action='store_true', help='Print full query plans')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark needs PostgreSQL')
+        if options['seed']:
+            self.seed(options)
+
+        agent = User.objects.filter(role='agent').first()
+        recipient = NotificationLog.objects.values_list('recipient_id', flat=True).first()
+        if agent is None:
+            raise CommandError('No agents found, run with --seed')
+
+        queries = [
+            ('active assignments', lambda: Assignment.objects.filter(status__in=Assignment.ACTIVE_STATUSES).values('client_id')),
+            ('agent active assignment', lambda: Assignment.objects.filter(agent=agent, status__in=Assignment.ACTIVE_STATUSES).order_by('-assigned_at')[:1]),
+            ('agent assignments by status', lambda: Assignment.objects.filter(agent=agent, status='completed')),
+            ('completed today', lambda: Assignment.objects.filter(status='completed', completed_at__date=timezone.now().date()).values('pk')),
+            ('agent location history', lambda: LocationHistory.objects.filter(agent=agent).order_by('-timestamp')[:100]),
+            ('unread notifications', lambda: NotificationLog.objects.filter(recipient_id=recipient, is_read=False)[:50]),
+            ('active clients page', lambda: Client.objects.filter(is_active=True).order_by('-priority', 'name')[:50]),
+            ('available clients', lambda: available_clients().order_by('-priority', 'name')[:50]),
+        ]
+
+        with transaction.atomic():
+            without_indexes = transaction.savepoint()
+            self.drop_indexes()
+            before = [self.explain(build()) for _, build in queries]
+            transaction.savepoint_rollback(without_indexes)
+            after = [self.explain(build()) for _, build in queries]
+
+        for (label, _), (before_ms, before_plan), (after_ms, after_plan) in zip(queries, before, after):
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f'  before: {before_ms:10.3f} ms   after: {after_ms:10.3f} ms')
+            if options['plans']:
+                self.stdout.write('  -- before --\n' + before_plan)
+                self.stdout.write('  -- after --\n' + after_plan)
+
+    def explain(self, queryset):
+        plan = queryset.explain(analyze=True, buffers=True)
+        match = EXECUTION_TIME.search(plan)
+        return (float(match.group(1)) if match else float('nan')), plan
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Client, Assignment, LocationHistory, NotificationLog):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+                for constraint in model._meta.constraints:
+                    editor.remove_constraint(model, constraint)
+
+    def seed(self, options):
+        rng = np.random.default_rng(42)
+        now = timezone.now()
+        center_lng, center_lat = 77.5946, 12.9716
+
+        def points(n):
+            return zip(center_lng + rng.uniform(-0.3, 0.3, n), center_lat + rng.uniform(-0.3, 0.3, n))
+
+        self.stdout.write('Seeding clients...')
+        clients = Client.objects.bulk_create([
+            Client(
+                name=f'Bench client {i}',
+                phone=f'9{i:09d}',
+                address='Benchmark address',
+                location=Point(lng, lat, srid=4326),
+                priority=int(rng.integers(1, 5)),
+                is_active=bool(rng.random() < 0.9),
+            )
+            for i, (lng, lat) in enumerate(points(options['clients']))
+        ], batch_size=5000)
+
+        self.stdout.write('Seeding agents and managers...')
+        tag = uuid.uuid4().hex[:6]
+        agents = User.objects.bulk_create([
+            User(username=f'bench_{tag}_{i}', password='!', role='agent',
+                 current_location=Point(lng, lat, srid=4326))
+            for i, (lng, lat) in enumerate(points(options['agents']))
+        ], batch_size=5000)
+        managers = User.objects.bulk_create([
+            User(username=f'bench_{tag}_manager_{i}', password='!', role='manager') for i in range(10)
+        ])
+
+        self.stdout.write('Seeding assignments...')
+        # Only one active assignment per client is allowed, so active rows use distinct clients
+        active_clients = rng.permutation(len(clients))[:min(len(clients), len(agents) * 2)]
+        assignments = [
+            Assignment(agent=agents[i % len(agents)], client=clients[c], status=['assigned', 'in_progress'][i % 2])
+            for i, c in enumerate(active_clients)
+        ]
+        for i in range(max(options['assignments'] - len(assignments), 0)):
+            finished = now - timedelta(minutes=int(rng.integers(0, 60 * 24 * 90)))
+            assignments.append(Assignment(
+                agent=agents[int(rng.integers(len(agents)))],
+                client=clients[int(rng.integers(len(clients)))],
+                status='completed' if rng.random() < 0.85 else 'cancelled',
+                started_at=finished - timedelta(minutes=30),
+                completed_at=finished,
+            ))
+        Assignment.objects.bulk_create(assignments, batch_size=5000)
+
+        self.stdout.write('Seeding location history...')
+        batch = 20000
+        for start in range(0, options['history'], batch):
+            n = min(batch, options['history'] - start)
+            owners = rng.integers(len(agents), size=n)
+            offsets = rng.integers(0, 60 * 60 * 24 * 30, size=n)
+            LocationHistory.objects.bulk_create([
+                LocationHistory(agent=agents[o], location=Point(lng, lat, srid=4326),
+                                timestamp=now - timedelta(seconds=int(s)), accuracy=10.0)
+                for o, s, (lng, lat) in zip(owners, offsets, points(n))
+            ], batch_size=batch)
+
+        self.stdout.write('Seeding notifications...')
+        NotificationLog.objects.bulk_create([
+            NotificationLog(recipient=managers[i % len(managers)], notification_type='update',
+                            title='Benchmark', message='Benchmark', is_read=bool(rng.random() < 0.8))
+            for i in range(options['notifications'])
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS('Seed complete'))
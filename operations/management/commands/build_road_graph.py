@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from operations.directions.osm import build_graph
+
+class Command(BaseCommand):
+    help = 'Compile an OSM XML extract (.osm, .osm.bz2, .osm.gz) into the CSR road graph used by get_route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='OSM XML extract')
+        parser.add_argument('output', help='Destination directory for the graph arrays (ROUTING GRAPH_PATH)')
+
+    def handle(self, *args, **options):
+        try:
+            graph = build_graph(options['input'])
+        except (OSError, KeyError) as e:
+            raise CommandError(f'Could not read {options["input"]}: {e}')
+        graph.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(graph)} nodes and {len(graph.indices)} edges to {options["output"]}'
+        ))
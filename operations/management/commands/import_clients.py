@@ -0,0 +1,52 @@
+import csv
+import os
+from django.core.management.base import BaseCommand, CommandError
+from operations.importer import ImportFileError, import_clients
+
+class Command(BaseCommand):
+    help = 'Import clients from an Excel or CSV file in streaming, bulk-insert chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .xlsx, .xls or .csv file')
+        parser.add_argument('--update-existing', action='store_true',
+                            help='Update clients whose phone already exists instead of skipping them')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--errors', dest='errors_path', default=None,
+                            help='Write the per-row error report to this CSV file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        def progress(result):
+            self.stdout.write(f'Processed {result.total_rows} rows...')
+
+        try:
+            with open(path, 'rb') as f:
+                result = import_clients(
+                    f, path,
+                    update_existing=options['update_existing'],
+                    chunk_size=options['chunk_size'],
+                    progress=progress,
+                )
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        if result.errors:
+            if options['errors_path']:
+                with open(options['errors_path'], 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['row', 'error'])
+                    writer.writerows(result.errors)
+                self.stdout.write(self.style.WARNING(
+                    f"{len(result.errors)} rows skipped, see {options['errors_path']}"
+                ))
+            else:
+                for row, message in result.errors:
+                    self.stderr.write(f'Row {row}: {message}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created}, updated {result.updated}, '
+            f'unchanged {result.unchanged}, skipped {len(result.errors)} of {result.total_rows} rows'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from operations.partitions import drop_expired, ensure_partitions, list_partitions, retention_days
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming LocationHistory partitions, roll expired ones up into '
+        'hourly LocationTrail rows and drop them. Run it daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=7, help='Days of partitions to create in advance')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Override the location_history_retention_days system setting')
+        parser.add_argument('--list', action='store_true', help='Only list existing partitions')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name, start, end in list_partitions():
+                self.stdout.write(f'{name}: {start} -> {end}')
+            return
+
+        for name in ensure_partitions(ahead=options['ahead']):
+            self.stdout.write(self.style.SUCCESS(f'Created {name}'))
+
+        retention = options['retention_days'] if options['retention_days'] is not None else retention_days()
+        for name in drop_expired(retention):
+            self.stdout.write(self.style.WARNING(f'Rolled up and dropped {name}'))
+        self.stdout.write(self.style.SUCCESS(f'Partitions up to date (retention {retention} days)'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from operations.dashboard import invalidate_dashboard
+from operations.fleet import publish_agent_statuses
+from operations.planning import plan_routes
+
+class Command(BaseCommand):
+    help = 'Plan an ordered multi-stop route for every idle agent'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--time-budget', type=float, default=None,
+                            help='Seconds of local search per region')
+
+    def handle(self, *args, **options):
+        assignments, unassigned = plan_routes(time_budget=options['time_budget'])
+        invalidate_dashboard()
+        publish_agent_statuses(a.agent_id for a in assignments)
+        agents = len({a.agent_id for a in assignments})
+        self.stdout.write(self.style.SUCCESS(
+            f'Planned {len(assignments)} visits for {agents} agents '
+            f'({unassigned} shortlisted clients did not fit)'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from operations.projections import backfill_events, rebuild_projections, update_projections
+
+class Command(BaseCommand):
+    help = (
+        'Apply new AssignmentEvent rows to the AgentDailyStats and ClientVisitStats '
+        'projections. Safe to run from cron as often as needed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help='First write events for assignments that predate the event log')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the projections from the first event')
+        parser.add_argument('--batch-size', type=int, default=None, help='Events applied per transaction')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f'Backfilled {backfill_events()} events')
+        if options['rebuild']:
+            applied = rebuild_projections()
+        else:
+            applied = update_projections(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} events'))
@@ -0,0 +1,144 @@
+from collections import namedtuple
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.db import transaction
+from django.db.models import Exists, FloatField, Func, OuterRef, Value
+from .events import created_events, record
+from .geo import haversine_km, haversine_matrix
+from .models import User, Assignment, Client
+from .notifications import notify_assigned
+from .optimize import linear_sum_assignment
+from .state import sync_agents_on_commit
+
+DEFAULT_PRIORITY_WEIGHTS = {1: 1.0, 2: 1.5, 3: 2.5, 4: 4.0}
+
+Match = namedtuple('Match', ['client', 'distance_km', 'cost'])
+
+class KNNDistance(Func):
+    # PostGIS index-assisted nearest-neighbour operator (ORDER BY location <-> point)
+    arg_joiner = ' <-> '
+    template = '%(expressions)s'
+    output_field = FloatField()
+
+class X(Func):
+    function = 'ST_X'
+    output_field = FloatField()
+
+class Y(Func):
+    function = 'ST_Y'
+    output_field = FloatField()
+
+def priority_weights():
+    return getattr(settings, 'ASSIGNMENT_PRIORITY_WEIGHTS', DEFAULT_PRIORITY_WEIGHTS)
+
+def assignment_cost(distance_km, priority):
+    return distance_km / priority_weights().get(priority, 1.0)
+
+def available_clients():
+    active_assignments = Assignment.objects.filter(
+        client=OuterRef('pk'),
+        status__in=Assignment.ACTIVE_STATUSES,
+    )
+    return Client.objects.filter(is_active=True).filter(~Exists(active_assignments))
+
+def idle_agents():
+    active_assignments = Assignment.objects.filter(
+        agent=OuterRef('pk'),
+        status__in=Assignment.ACTIVE_STATUSES,
+    )
+    return User.objects.filter(
+        role='agent',
+        is_active_agent=True,
+        is_online=True,
+        current_location__isnull=False,
+    ).filter(~Exists(active_assignments))
+
+def find_best_client(location, candidates_per_priority=None, for_update=False):
+    if candidates_per_priority is None:
+        candidates_per_priority = getattr(settings, 'ASSIGNMENT_KNN_CANDIDATES', 5)
+
+    point = Value(location, output_field=PointField(srid=location.srid or 4326))
+    best = None
+
+    # Within one priority level the cost only grows with distance, so the few
+    # nearest clients of each level are enough to find the global optimum.
+    for priority, _ in Client.PRIORITY_CHOICES:
+        nearest = available_clients().filter(priority=priority).order_by(
+            KNNDistance('location', point)
+        )
+        if for_update:
+            # Clients another dispatcher is claiming are skipped, not waited on
+            nearest = nearest.select_for_update(skip_locked=True, of=('self',))
+        nearest = nearest[:candidates_per_priority]
+        for client in nearest:
+            distance = haversine_km(location.y, location.x, client.location.y, client.location.x)
+            cost = assignment_cost(distance, client.priority)
+            if best is None or cost < best.cost:
+                best = Match(client, distance, cost)
+
+    return best
+
+def build_cost_matrix(agent_coords, client_coords, client_priorities):
+    distances = haversine_matrix(agent_coords[:, 1], agent_coords[:, 0],
+                                 client_coords[:, 1], client_coords[:, 0])
+    weights = priority_weights()
+    client_weights = np.array([weights.get(p, 1.0) for p in client_priorities], dtype=float)
+    return distances, distances / client_weights[None, :]
+
+def shortlist_clients(agent_coords, client_coords, client_priorities, per_agent, chunk_size=256):
+    # Union of each agent's cheapest clients, computed in chunks so the full
+    # agents x clients matrix never has to be held in memory at once
+    k = min(per_agent, len(client_coords))
+    shortlist = set()
+    for start in range(0, len(agent_coords), chunk_size):
+        _, cost = build_cost_matrix(agent_coords[start:start + chunk_size], client_coords, client_priorities)
+        nearest = np.argpartition(cost, k - 1, axis=1)[:, :k]
+        shortlist.update(nearest.ravel().tolist())
+    return np.array(sorted(shortlist))
+
+def batch_assign(created_by=None, candidates_per_agent=None, chunk_size=256):
+    if candidates_per_agent is None:
+        candidates_per_agent = getattr(settings, 'BATCH_ASSIGN_CANDIDATES', 20)
+
+    with transaction.atomic():
+        # Rows locked by a concurrent dispatcher are left to it
+        agents = list(
+            idle_agents().select_for_update(skip_locked=True, of=('self',))
+            .annotate(lng=X('current_location'), lat=Y('current_location'))
+            .values_list('pk', 'lng', 'lat')
+        )
+        clients = list(
+            available_clients().select_for_update(skip_locked=True, of=('self',))
+            .annotate(lng=X('location'), lat=Y('location'))
+            .values_list('pk', 'lng', 'lat', 'priority')
+        )
+        if not agents or not clients:
+            return []
+
+        agent_coords = np.array([a[1:] for a in agents], dtype=float)
+        client_coords = np.array([c[1:3] for c in clients], dtype=float)
+        client_priorities = [c[3] for c in clients]
+
+        columns = shortlist_clients(agent_coords, client_coords, client_priorities,
+                                    candidates_per_agent, chunk_size)
+
+        distances, cost = build_cost_matrix(
+            agent_coords, client_coords[columns], [client_priorities[c] for c in columns]
+        )
+        rows, cols = linear_sum_assignment(cost)
+
+        assignments = [
+            Assignment(
+                agent_id=agents[row][0],
+                client_id=clients[columns[col]][0],
+                distance_to_client=round(float(distances[row, col]), 3),
+                created_by=created_by,
+            )
+            for row, col in zip(rows, cols)
+        ]
+        created = Assignment.objects.bulk_create(assignments)
+        record(created_events(created))
+        sync_agents_on_commit(a.agent_id for a in created)
+        transaction.on_commit(lambda: notify_assigned(created))
+        return created
@@ -0,0 +1,13 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0002_importjob')]
+
+    operations = [
+        migrations.AlterField(
+            model_name='locationhistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
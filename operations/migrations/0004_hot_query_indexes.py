@@ -0,0 +1,57 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+ACTIVE = ('assigned', 'in_progress')
+
+def cancel_duplicate_active_assignments(apps, schema_editor):
+    # The unique constraint below cannot be added while a client has more
+    # than one active assignment: keep the visit under way, else the newest
+    Assignment = apps.get_model('operations', 'Assignment')
+    active = Assignment.objects.filter(status__in=ACTIVE)
+    duplicated = (
+        active.values('client_id').annotate(count=Count('id')).filter(count__gt=1)
+        .values_list('client_id', flat=True)
+    )
+    for client_id in list(duplicated):
+        # 'in_progress' sorts after 'assigned'
+        keep = active.filter(client_id=client_id).order_by('-status', '-assigned_at').values_list('pk', flat=True)[0]
+        active.filter(client_id=client_id).exclude(pk=keep).update(status='cancelled')
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0003_locationhistory_timestamp_default')]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-priority', 'name'], name='client_active_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['phone'], name='client_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['agent', 'status'], name='assign_agent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(('status__in', ACTIVE)), fields=['agent', '-assigned_at'], name='assign_active_agent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(('status', 'completed')), fields=['completed_at'], name='assign_completed_at_idx'),
+        ),
+        migrations.RunPython(cancel_duplicate_active_assignments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='assignment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ACTIVE)), fields=('client',), name='unique_active_client_assignment'),
+        ),
+        migrations.AddIndex(
+            model_name='locationhistory',
+            index=models.Index(fields=['agent', '-timestamp'], name='lochist_agent_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_read_idx'),
+        ),
+    ]
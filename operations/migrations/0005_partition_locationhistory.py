@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+
+# LocationHistory becomes a range-partitioned table on "timestamp". Existing
+# rows are copied into the DEFAULT partition; manage_location_partitions moves
+# them into dated partitions as it creates them. Postgres requires the
+# partition key in the primary key, so the table key is (id, timestamp).
+# Index names follow Django's so later schema changes find them.
+PARTITION_SQL = """
+ALTER TABLE operations_locationhistory RENAME TO operations_locationhistory_legacy;
+ALTER INDEX operations_locationhistory_pkey RENAME TO operations_locationhistory_legacy_pkey;
+CREATE TABLE operations_locationhistory (
+    id uuid NOT NULL,
+    location geometry(POINT, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    accuracy double precision NULL,
+    agent_id uuid NOT NULL REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+    assignment_id uuid NULL REFERENCES operations_assignment (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE operations_locationhistory_default PARTITION OF operations_locationhistory DEFAULT;
+INSERT INTO operations_locationhistory (id, location, "timestamp", accuracy, agent_id, assignment_id)
+    SELECT id, location, "timestamp", accuracy, agent_id, assignment_id FROM operations_locationhistory_legacy;
+DROP TABLE operations_locationhistory_legacy;
+CREATE INDEX lochist_agent_ts_idx ON operations_locationhistory (agent_id, "timestamp" DESC);
+CREATE INDEX {agent_index} ON operations_locationhistory (agent_id);
+CREATE INDEX {assignment_index} ON operations_locationhistory (assignment_id);
+CREATE INDEX {location_index} ON operations_locationhistory USING GIST (location);
+"""
+
+UNPARTITION_SQL = """
+CREATE TABLE operations_locationhistory_flat (
+    id uuid NOT NULL PRIMARY KEY,
+    location geometry(POINT, 4326) NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    accuracy double precision NULL,
+    agent_id uuid NOT NULL REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+    assignment_id uuid NULL REFERENCES operations_assignment (id) DEFERRABLE INITIALLY DEFERRED
+);
+INSERT INTO operations_locationhistory_flat SELECT id, location, "timestamp", accuracy, agent_id, assignment_id FROM operations_locationhistory;
+DROP TABLE operations_locationhistory CASCADE;
+ALTER TABLE operations_locationhistory_flat RENAME TO operations_locationhistory;
+ALTER INDEX operations_locationhistory_flat_pkey RENAME TO operations_locationhistory_pkey;
+CREATE INDEX lochist_agent_ts_idx ON operations_locationhistory (agent_id, "timestamp" DESC);
+CREATE INDEX {agent_index} ON operations_locationhistory (agent_id);
+CREATE INDEX {assignment_index} ON operations_locationhistory (assignment_id);
+CREATE INDEX {location_index} ON operations_locationhistory USING GIST (location);
+"""
+
+def index_names(schema_editor):
+    table = 'operations_locationhistory'
+    return {
+        'agent_index': schema_editor.quote_name(schema_editor._create_index_name(table, ['agent_id'], suffix='')),
+        'assignment_index': schema_editor.quote_name(schema_editor._create_index_name(table, ['assignment_id'], suffix='')),
+        # PostGIS names spatial indexes <table>_<column>_id
+        'location_index': schema_editor.quote_name(f'{table}_location_id'),
+    }
+
+def partition(apps, schema_editor):
+    schema_editor.execute(PARTITION_SQL.format(**index_names(schema_editor)), params=None)
+
+def unpartition(apps, schema_editor):
+    schema_editor.execute(UNPARTITION_SQL.format(**index_names(schema_editor)), params=None)
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0004_hot_query_indexes')]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationTrail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour this trail covers')),
+                ('path', django.contrib.gis.db.models.fields.LineStringField(blank=True, help_text='Simplified path, empty for single-point hours', null=True, srid=4326)),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_trails', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={'ordering': ['-hour']},
+        ),
+        migrations.AddConstraint(
+            model_name='locationtrail',
+            constraint=models.UniqueConstraint(fields=('agent', 'hour'), name='unique_trail_agent_hour'),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,12 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0005_partition_locationhistory')]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='sequence',
+            field=models.PositiveIntegerField(blank=True, help_text="Visit order within the agent's planned route", null=True),
+        ),
+    ]
@@ -0,0 +1,12 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0006_assignment_sequence')]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='departed_at',
+            field=models.DateTimeField(blank=True, help_text='When the agent left the client geofence', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0007_assignment_departed_at')]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_online',
+            field=models.BooleanField(default=False, help_text="Agent's app has sent a heartbeat recently"),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
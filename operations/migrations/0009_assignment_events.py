@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.datetime
+import django.utils.timezone
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0008_user_presence')]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('created', 'Created'), ('started', 'Started'), ('departed', 'Departed'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('reassigned', 'Reassigned'), ('released', 'Released')], max_length=12)),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('value', models.FloatField(blank=True, help_text='Distance in km for created, reassigned and released, visit seconds for completed', null=True)),
+                ('recorded_at', models.DateTimeField(default=django.db.models.functions.datetime.Now, editable=False)),
+                ('agent', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('assignment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='operations.assignment')),
+                ('client', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='operations.client')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['assignment', 'id'], name='assign_event_assignment_idx')],
+            },
+        ),
+        # The ORM always sends NOW(); the column default covers raw inserts
+        migrations.RunSQL(
+            'ALTER TABLE operations_assignmentevent ALTER COLUMN recorded_at SET DEFAULT now();',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.CreateModel(
+            name='ProjectionCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AgentDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('assigned', models.PositiveIntegerField(default=0)),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('departed', models.PositiveIntegerField(default=0)),
+                ('visit_seconds', models.FloatField(default=0)),
+                ('assigned_km', models.FloatField(default=0)),
+                ('agent', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='agent_stats_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('agent', 'date'), name='unique_agent_daily_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClientVisitStats',
+            fields=[
+                ('client', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='visit_stats', serialize=False, to='operations.client')),
+                ('assignments', models.PositiveIntegerField(default=0)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('visit_seconds', models.FloatField(default=0)),
+                ('last_visit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
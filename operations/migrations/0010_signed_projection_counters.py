@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+AGENT_COUNTERS = ('assigned', 'started', 'completed', 'cancelled', 'departed')
+CLIENT_COUNTERS = ('assignments', 'visits', 'cancellations')
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0009_assignment_events')]
+
+    operations = [
+        migrations.AlterField(model_name='agentdailystats', name=name, field=models.IntegerField(default=0))
+        for name in AGENT_COUNTERS
+    ] + [
+        migrations.AlterField(model_name='clientvisitstats', name=name, field=models.IntegerField(default=0))
+        for name in CLIENT_COUNTERS
+    ]
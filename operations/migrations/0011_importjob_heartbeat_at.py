@@ -0,0 +1,12 @@
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+    dependencies = [('operations', '0010_signed_projection_counters')]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, help_text='Last progress report from the running import'),
+        ),
+    ]
@@ -1,9 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point
+from django.db.models.functions import Now
 from django.utils import timezone
 import uuid
 
+ACTIVE_ASSIGNMENT_STATUSES = ('assigned', 'in_progress')
+# The visit under way first ('in_progress' sorts after 'assigned'), then planned route order
+CURRENT_ASSIGNMENT_ORDERING = ('-status', models.F('sequence').asc(nulls_last=True), '-assigned_at')
+
 class User(AbstractUser):
     USER_ROLES = (
         ('manager', 'Manager'),
@@ -15,6 +20,8 @@ class User(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True)
     current_location = models.PointField(null=True, blank=True, help_text="Current GPS location")
     is_active_agent = models.BooleanField(default=True, help_text="Is agent currently working")
+    is_online = models.BooleanField(default=False, help_text="Agent's app has sent a heartbeat recently")
+    last_seen_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -26,7 +33,9 @@ class User(AbstractUser):
 
     @property
     def current_assignment(self):
-        return self.assignments.filter(status='assigned').first()
+        return self.assignments.filter(
+            status__in=Assignment.ACTIVE_STATUSES
+        ).order_by(*CURRENT_ASSIGNMENT_ORDERING).first()
 
 class Client(models.Model):
     PRIORITY_CHOICES = (
@@ -50,6 +59,10 @@ class Client(models.Model):
 
     class Meta:
         ordering = ['-priority', 'name']
+        indexes = [
+            models.Index(fields=['-priority', 'name'], condition=models.Q(is_active=True), name='client_active_prio_idx'),
+            models.Index(fields=['phone'], name='client_phone_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} (Priority: {self.get_priority_display()})"
@@ -64,7 +77,7 @@ class Client(models.Model):
 
     @property
     def current_assignment(self):
-        return self.assignments.filter(status__in=['assigned', 'in_progress']).first()
+        return self.assignments.filter(status__in=Assignment.ACTIVE_STATUSES).first()
 
 class Assignment(models.Model):
     STATUS_CHOICES = (
@@ -73,6 +86,7 @@ class Assignment(models.Model):
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
     )
+    ACTIVE_STATUSES = ACTIVE_ASSIGNMENT_STATUSES
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assignments')
@@ -81,14 +95,24 @@ class Assignment(models.Model):
     assigned_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    departed_at = models.DateTimeField(null=True, blank=True, help_text="When the agent left the client geofence")
     notes = models.TextField(blank=True, null=True)
     estimated_duration = models.DurationField(null=True, blank=True)
     actual_duration = models.DurationField(null=True, blank=True)
     distance_to_client = models.FloatField(null=True, blank=True, help_text="Distance in kilometers")
+    sequence = models.PositiveIntegerField(null=True, blank=True, help_text="Visit order within the agent's planned route")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_assignments')
 
     class Meta:
         ordering = ['-assigned_at']
+        indexes = [
+            models.Index(fields=['agent', 'status'], name='assign_agent_status_idx'),
+            models.Index(fields=['agent', '-assigned_at'], condition=models.Q(status__in=ACTIVE_ASSIGNMENT_STATUSES), name='assign_active_agent_idx'),
+            models.Index(fields=['completed_at'], condition=models.Q(status='completed'), name='assign_completed_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['client'], condition=models.Q(status__in=ACTIVE_ASSIGNMENT_STATUSES), name='unique_active_client_assignment'),
+        ]
 
     def __str__(self):
         return f"{self.agent.username} -> {self.client.name} ({self.get_status_display()})"
@@ -102,7 +126,8 @@ class Assignment(models.Model):
         self.status = 'completed'
         self.completed_at = timezone.now()
         if self.started_at:
-            self.actual_duration = self.completed_at - self.started_at
+            # The visit ended when the agent walked away, not when they tapped complete
+            self.actual_duration = (self.departed_at or self.completed_at) - self.started_at
         if notes:
             self.notes = notes
         self.save()
@@ -111,16 +136,114 @@ class LocationHistory(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_history')
     location = models.PointField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     accuracy = models.FloatField(null=True, blank=True, help_text="GPS accuracy in meters")
     assignment = models.ForeignKey(Assignment, on_delete=models.SET_NULL, null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['agent', '-timestamp'], name='lochist_agent_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.agent.username} at {self.timestamp}"
 
+class LocationTrail(models.Model):
+    agent = models.ForeignKey(User, on_delete=models.CASCADE, related_name='location_trails')
+    hour = models.DateTimeField(help_text="Start of the hour this trail covers")
+    path = models.LineStringField(null=True, blank=True, help_text="Simplified path, empty for single-point hours")
+    point_count = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'hour'], name='unique_trail_agent_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.agent.username} trail at {self.hour}"
+
+class AssignmentEvent(models.Model):
+    # Append-only history of assignment changes. Rows are never updated and
+    # carry no foreign key constraints so they outlive deleted assignments.
+    EVENT_TYPES = (
+        ('created', 'Created'),
+        ('started', 'Started'),
+        ('departed', 'Departed'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+        ('reassigned', 'Reassigned'),
+        ('released', 'Released'),
+    )
+
+    assignment = models.ForeignKey(Assignment, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    agent = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    event = models.CharField(max_length=12, choices=EVENT_TYPES)
+    at = models.DateTimeField(default=timezone.now)
+    value = models.FloatField(null=True, blank=True, help_text="Distance in km for created, reassigned and released, visit seconds for completed")
+    # Database clock at insert; projections use it, not "at", to wait out in-flight transactions
+    recorded_at = models.DateTimeField(default=Now, editable=False)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['assignment', 'id'], name='assign_event_assignment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assignment_id} {self.event} at {self.at}"
+
+class ProjectionCheckpoint(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+# Projection rows are derived from AssignmentEvent and, like it, carry no FK
+# constraints: events for a deleted agent or client must still apply. The
+# counters are signed because a batch may fold to a negative delta (a stop
+# moved away from an agent) that is inserted before it is merged.
+class AgentDailyStats(models.Model):
+    agent = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='daily_stats')
+    date = models.DateField()
+    assigned = models.IntegerField(default=0)
+    started = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    departed = models.IntegerField(default=0)
+    visit_seconds = models.FloatField(default=0)
+    assigned_km = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'date'], name='unique_agent_daily_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='agent_stats_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} on {self.date}"
+
+class ClientVisitStats(models.Model):
+    client = models.OneToOneField(Client, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='visit_stats')
+    assignments = models.IntegerField(default=0)
+    visits = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    visit_seconds = models.FloatField(default=0)
+    last_visit_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.client_id}: {self.visits} visits"
+
 class NotificationLog(models.Model):
     NOTIFICATION_TYPES = (
         ('assignment', 'New Assignment'),
@@ -141,14 +264,19 @@ class NotificationLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_read_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} -> {self.recipient.username}"
 
     def mark_as_read(self):
+        if self.is_read:
+            return
         self.is_read = True
         self.read_at = timezone.now()
-        self.save()
+        self.save(update_fields=['is_read', 'read_at'])
 
 class SystemSettings(models.Model):
     key = models.CharField(max_length=100, unique=True)
@@ -163,3 +291,52 @@ class SystemSettings(models.Model):
 
     def __str__(self):
         return f"{self.key}: {self.value[:50]}"
+
+    @classmethod
+    def get_value(cls, key, default=None):
+        value = cls.objects.filter(key=key).values_list('value', flat=True).first()
+        return default if value is None else value
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to='imports/')
+    original_name = models.CharField(max_length=255)
+    update_existing = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True, help_text="First rows that failed validation")
+    message = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last progress report from the running import")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_name} ({self.get_status_display()})"
+
+    def as_progress(self):
+        return {
+            'type': 'import_progress',
+            'job_id': str(self.id),
+            'file': self.original_name,
+            'status': self.status,
+            'total_rows': self.total_rows,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'errors': self.error_count,
+            'message': self.message,
+        }
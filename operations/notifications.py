@@ -0,0 +1,223 @@
+import atexit
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import User, Client, NotificationLog
+from .push import get_push_queue
+from .realtime import send_to_group
+
+DEFAULTS = {
+    'MAX_BATCH': 500,
+    'MAX_DELAY_SECONDS': 1.0,
+    'DIGEST_THRESHOLD': 3,
+    'DIGEST_PREVIEW': 5,
+    'UNREAD_CACHE_TTL': 3600,
+}
+
+MANAGERS = 'managers'
+
+Notice = namedtuple('Notice', ['recipient', 'notification_type', 'title', 'message', 'assignment_id', 'data'])
+
+def notify_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+def unread_key(user_id):
+    return f'operations:unread:{user_id}'
+
+def unread_count(user_id):
+    # Counted once, then kept current by the dispatcher and the read paths
+    return cache.get_or_set(
+        unread_key(user_id),
+        lambda: NotificationLog.objects.filter(recipient_id=user_id, is_read=False).count(),
+        notify_config()['UNREAD_CACHE_TTL'],
+    )
+
+def adjust_unread(counts):
+    # counts: {user_id: delta}; a missing key is recounted on the next read
+    for user_id, delta in counts.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(unread_key(user_id), delta)
+        except ValueError:
+            pass
+
+def unread_changes(user_id, is_read, ids=None, before=None):
+    # Rows whose read state would flip, optionally limited to ids and/or
+    # notifications created at or before a timestamp
+    queryset = NotificationLog.objects.filter(recipient_id=user_id, is_read=not is_read)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    if before is not None:
+        queryset = queryset.filter(created_at__lte=before)
+    return queryset
+
+def mark_read(user_id, ids=None, before=None):
+    updated = unread_changes(user_id, True, ids, before).update(is_read=True, read_at=timezone.now())
+    adjust_unread({str(user_id): -updated})
+    return updated
+
+def mark_unread(user_id, ids=None, before=None):
+    updated = unread_changes(user_id, False, ids, before).update(is_read=False, read_at=None)
+    adjust_unread({str(user_id): updated})
+    return updated
+
+def as_message(log, data):
+    return {
+        'type': 'notification',
+        'id': str(log.pk),
+        'notification_type': log.notification_type,
+        'title': log.title,
+        'message': log.message,
+        'assignment_id': str(log.assignment_id) if log.assignment_id else None,
+        'created_at': log.created_at.isoformat(),
+        **(data or {}),
+    }
+
+class NotificationDispatcher:
+    # Notices are buffered for up to max_delay and then written with one
+    # bulk_create. Each recipient gets one group_send per flush: the single
+    # notification, or a digest when a burst exceeds digest_threshold.
+
+    def __init__(self, max_batch, max_delay, digest_threshold, digest_preview):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.digest_threshold = digest_threshold
+        self.digest_preview = digest_preview
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-flush')
+
+    def notify(self, recipients, notification_type, title, message, assignment_id=None, data=None):
+        # recipients: user ids, or MANAGERS for every manager
+        if recipients == MANAGERS:
+            recipients = [MANAGERS]
+        with self._lock:
+            for recipient in recipients:
+                self._pending.append(Notice(str(recipient), notification_type, title, message, assignment_id, data))
+            if len(self._pending) >= self.max_batch:
+                self._schedule(0)
+            elif self._timer is None:
+                self._schedule(self.max_delay)
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, lambda: self._writer.submit(self._flush_in_thread))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _take(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return pending
+
+    def _flush_in_thread(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        pending = self._take()
+        if not pending:
+            return 0
+
+        roles = {}
+        if any(n.recipient == MANAGERS for n in pending):
+            roles.update({str(pk): 'manager' for pk in User.objects.filter(role='manager').values_list('pk', flat=True)})
+        direct = {n.recipient for n in pending if n.recipient != MANAGERS}
+        roles.update({str(pk): role for pk, role in User.objects.filter(pk__in=direct).values_list('pk', 'role')})
+        managers = [pk for pk, role in roles.items() if role == 'manager']
+
+        logs, payloads = [], []
+        for notice in pending:
+            recipients = managers if notice.recipient == MANAGERS else [notice.recipient]
+            for recipient in recipients:
+                if recipient not in roles:
+                    continue
+                logs.append(NotificationLog(
+                    recipient_id=recipient,
+                    notification_type=notice.notification_type,
+                    title=notice.title,
+                    message=notice.message,
+                    assignment_id=notice.assignment_id,
+                ))
+                payloads.append(notice.data)
+        NotificationLog.objects.bulk_create(logs, batch_size=self.max_batch)
+
+        by_recipient = defaultdict(list)
+        for log, data in zip(logs, payloads):
+            by_recipient[str(log.recipient_id)].append(as_message(log, data))
+        adjust_unread({recipient: len(messages) for recipient, messages in by_recipient.items()})
+
+        for recipient, messages in by_recipient.items():
+            if len(messages) > self.digest_threshold:
+                message = {
+                    'type': 'notification_digest',
+                    'count': len(messages),
+                    'notifications': messages[-self.digest_preview:],
+                }
+                send_to_group(f'{roles[recipient]}_{recipient}', 'send_notification', message)
+            else:
+                for message in messages:
+                    send_to_group(f'{roles[recipient]}_{recipient}', 'send_notification', message)
+        return len(logs)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            config = notify_config()
+            _dispatcher = NotificationDispatcher(
+                max_batch=config['MAX_BATCH'],
+                max_delay=config['MAX_DELAY_SECONDS'],
+                digest_threshold=config['DIGEST_THRESHOLD'],
+                digest_preview=config['DIGEST_PREVIEW'],
+            )
+            atexit.register(_dispatcher.flush)
+    return _dispatcher
+
+def notify_assigned(assignments):
+    names = dict(Client.objects.filter(pk__in={a.client_id for a in assignments}).values_list('pk', 'name'))
+    dispatcher, pushes = get_dispatcher(), get_push_queue()
+    for assignment in assignments:
+        message = f'You have been assigned to {names.get(assignment.client_id, "a client")}.'
+        dispatcher.notify(
+            [assignment.agent_id], 'assignment', 'New assignment', message,
+            assignment_id=assignment.pk,
+            data={'client_id': str(assignment.client_id), 'sequence': assignment.sequence},
+        )
+        # Queued for the push workers; never waits on the provider
+        pushes.enqueue([assignment.agent_id], 'New assignment', message, {
+            'type': 'assignment',
+            'assignment_id': str(assignment.pk),
+            'client_id': str(assignment.client_id),
+        })
+
+STATUS_MESSAGES = {
+    'in_progress': ('Visit started', 'An agent has started a visit.'),
+    'completed': ('Visit completed', 'An agent has completed a visit.'),
+    'cancelled': ('Assignment cancelled', 'An assignment was cancelled.'),
+    'departed': ('Agent left client', 'An agent left the client before completing the visit.'),
+}
+
+def notify_status_change(assignment_id, agent_id, status, **data):
+    title, message = STATUS_MESSAGES.get(status, ('Assignment updated', f'An assignment is now {status}.'))
+    get_dispatcher().notify(
+        MANAGERS, 'completion' if status == 'completed' else 'update', title, message,
+        assignment_id=assignment_id,
+        data={'event': status, 'agent_id': str(agent_id), **data},
+    )
@@ -0,0 +1,171 @@
+import re
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import LocationHistory, LocationTrail, SystemSettings
+
+TABLE = LocationHistory._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+TRAIL_TABLE = LocationTrail._meta.db_table
+BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+RETENTION_KEY = 'location_history_retention_days'
+INTERVAL_KEY = 'location_history_partition_interval'
+TRAIL_TOLERANCE_KEY = 'location_trail_tolerance_degrees'
+
+def retention_days():
+    return int(SystemSettings.get_value(RETENTION_KEY, 90))
+
+def partition_interval():
+    interval = SystemSettings.get_value(INTERVAL_KEY, 'day')
+    if interval not in ('day', 'week'):
+        raise ValueError(f"{INTERVAL_KEY} must be 'day' or 'week', got {interval!r}")
+    return interval
+
+def period_start(day, interval):
+    if interval == 'week':
+        day = day - timedelta(days=day.weekday())
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def period_end(start, interval):
+    days = 7 if interval == 'week' else 1
+    return timezone.make_aware(datetime.combine(start.date() + timedelta(days=days), time.min))
+
+def partition_name(start):
+    return f'{TABLE}_p{start:%Y%m%d}'
+
+def parse_bound(value):
+    # Postgres prints offsets as +00; older Pythons need +00:00
+    if re.search(r'[+-]\d\d$', value):
+        value += ':00'
+    return datetime.fromisoformat(value)
+
+def list_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound or '')
+        if match:
+            start, end = (parse_bound(v) for v in match.groups())
+            partitions.append((name, start, end))
+    return sorted(partitions, key=lambda p: p[1])
+
+def create_partition(start, end):
+    name = partition_name(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        # Rows that landed in the DEFAULT partition for this range must move
+        # first, otherwise ATTACH fails its validation scan.
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{DEFAULT_PARTITION}"
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                RETURNING *
+            )
+            INSERT INTO "{name}" SELECT * FROM moved
+            """,
+            [start, end],
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+            [start.isoformat(), end.isoformat()],
+        )
+    return name
+
+def ensure_partitions(ahead=7, interval=None):
+    interval = interval or partition_interval()
+    existing = {name for name, _, _ in list_partitions()}
+    created = []
+    day = timezone.localdate()
+    last_day = day + timedelta(days=ahead)
+    while day <= last_day:
+        start = period_start(day, interval)
+        end = period_end(start, interval)
+        if partition_name(start) not in existing:
+            created.append(create_partition(start, end))
+            existing.add(partition_name(start))
+        day = end.date()
+    return created
+
+def rollup(start, end, tolerance=None):
+    # Hours that already have a trail (late pings stranded in the DEFAULT
+    # partition after their dated partition was rolled up) are merged into
+    # it. A segment that overlaps the stored span in time cannot be spliced
+    # in order, so only its counts and bounds are added.
+    if tolerance is None:
+        tolerance = float(SystemSettings.get_value(TRAIL_TOLERANCE_KEY, 0.00005))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO "{TRAIL_TABLE}" AS trail (agent_id, hour, path, point_count, distance_km, first_seen, last_seen)
+            SELECT agent_id, hour,
+                   CASE WHEN count > 1 THEN ST_Simplify(line, %(tolerance)s) END,
+                   count,
+                   CASE WHEN count > 1 THEN ST_Length(line::geography) / 1000.0 ELSE 0 END,
+                   first_seen, last_seen
+            FROM (
+                SELECT agent_id,
+                       date_trunc('hour', "timestamp") AS hour,
+                       ST_MakeLine(location ORDER BY "timestamp") AS line,
+                       count(*) AS count,
+                       min("timestamp") AS first_seen,
+                       max("timestamp") AS last_seen
+                FROM "{TABLE}"
+                WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s
+                GROUP BY agent_id, date_trunc('hour', "timestamp")
+            ) hourly
+            ON CONFLICT (agent_id, hour) DO UPDATE SET
+                path = CASE
+                    WHEN trail.path IS NULL THEN EXCLUDED.path
+                    WHEN EXCLUDED.path IS NULL THEN trail.path
+                    WHEN EXCLUDED.first_seen >= trail.last_seen
+                        THEN ST_Simplify(ST_MakeLine(trail.path, EXCLUDED.path), %(tolerance)s)
+                    WHEN EXCLUDED.last_seen <= trail.first_seen
+                        THEN ST_Simplify(ST_MakeLine(EXCLUDED.path, trail.path), %(tolerance)s)
+                    ELSE trail.path
+                END,
+                point_count = trail.point_count + EXCLUDED.point_count,
+                distance_km = trail.distance_km + EXCLUDED.distance_km,
+                first_seen = LEAST(trail.first_seen, EXCLUDED.first_seen),
+                last_seen = GREATEST(trail.last_seen, EXCLUDED.last_seen)
+            """,
+            {'tolerance': tolerance, 'start': start, 'end': end},
+        )
+        return cursor.rowcount
+
+def drop_expired(retention=None):
+    retention = retention_days() if retention is None else retention
+    cutoff = period_start(timezone.localdate() - timedelta(days=retention), 'day')
+    dropped = []
+    for name, start, end in list_partitions():
+        if end > cutoff:
+            continue
+        with transaction.atomic():
+            rollup(start, end)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE "{name}"')
+        dropped.append(name)
+
+    # Stray old rows in the DEFAULT partition are few; a plain DELETE is fine there
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT min("timestamp") FROM "{DEFAULT_PARTITION}" WHERE "timestamp" < %s', [cutoff])
+            oldest = cursor.fetchone()[0]
+        if oldest is not None:
+            rollup(oldest, cutoff)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" < %s', [cutoff])
+    return dropped
@@ -0,0 +1,148 @@
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg
+from .distance_matrix import distance_matrix
+from .events import created_events, record
+from .matching import X, Y, available_clients, idle_agents, priority_weights, shortlist_clients
+from .models import Assignment
+from .notifications import notify_assigned
+from .state import sync_agents_on_commit
+from .vrp import kmeans, solve_region
+
+DEFAULTS = {
+    'MAX_STOPS': 15,
+    'SHIFT_HOURS': 8,
+    'DEFAULT_SERVICE_MINUTES': 30,
+    'LATENESS_WEIGHT': 0.1,
+    'TIME_BUDGET_SECONDS': 3.0,
+    'REGION_AGENTS': 25,
+    'WORKERS': 4,
+    'METRIC': 'haversine',
+}
+
+def vrp_config():
+    return {**DEFAULTS, **getattr(settings, 'VRP', {})}
+
+def service_seconds(client_ids, default_minutes):
+    # A client's past estimated visit length wins over the default
+    history = dict(
+        Assignment.objects.filter(client_id__in=client_ids, estimated_duration__isnull=False)
+        .values('client_id').annotate(avg=Avg('estimated_duration')).values_list('client_id', 'avg')
+    )
+    default = default_minutes * 60.0
+    return np.array([
+        history[c].total_seconds() if c in history else default
+        for c in client_ids
+    ])
+
+def build_regions(agent_coords, client_coords, region_agents):
+    regions = max(1, math.ceil(len(agent_coords) / region_agents))
+    agent_labels, centroids = kmeans(agent_coords, regions)
+    client_labels = ((client_coords[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return [
+        (np.flatnonzero(agent_labels == r), np.flatnonzero(client_labels == r))
+        for r in range(len(centroids))
+    ]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_solver_pool(workers):
+    # Spawned once and reused: forking a request thread would copy its
+    # database connections and locks into the children
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+def plan_routes(created_by=None, time_budget=None):
+    config = vrp_config()
+    time_budget = config['TIME_BUDGET_SECONDS'] if time_budget is None else time_budget
+
+    # Read and solve without holding locks; rows are re-checked before writing
+    agents = list(
+        idle_agents().annotate(lng=X('current_location'), lat=Y('current_location'))
+        .values_list('pk', 'lng', 'lat')
+    )
+    clients = list(
+        available_clients().annotate(lng=X('location'), lat=Y('location'))
+        .values_list('pk', 'lng', 'lat', 'priority')
+    )
+    if not agents or not clients:
+        return [], 0
+
+    agent_coords = np.array([a[1:] for a in agents], dtype=float)
+    all_client_coords = np.array([c[1:3] for c in clients], dtype=float)
+    columns = shortlist_clients(agent_coords, all_client_coords, [c[3] for c in clients],
+                                config['MAX_STOPS'] * 2)
+    clients = [clients[c] for c in columns]
+    client_coords = all_client_coords[columns]
+    client_ids = [c[0] for c in clients]
+    service = service_seconds(client_ids, config['DEFAULT_SERVICE_MINUTES'])
+    weights = priority_weights()
+    stop_weights = np.array([weights.get(c[3], 1.0) for c in clients])
+
+    regions = [r for r in build_regions(agent_coords, client_coords, config['REGION_AGENTS']) if len(r[1])]
+    jobs, distances = [], []
+    for region_agents, region_clients in regions:
+        # (lat, lng) points: agents first, then stops, as the solver expects
+        points = np.vstack([agent_coords[region_agents], client_coords[region_clients]])[:, ::-1]
+        km, seconds, _ = distance_matrix(points, points, metric=config['METRIC'])
+        distances.append(km)
+        jobs.append((
+            seconds, service[region_clients], stop_weights[region_clients],
+            config['SHIFT_HOURS'] * 3600.0, config['MAX_STOPS'],
+            config['LATENESS_WEIGHT'], time_budget,
+        ))
+
+    if len(jobs) > 1 and config['WORKERS'] > 1:
+        results = list(get_solver_pool(config['WORKERS']).map(solve_region, jobs))
+    else:
+        results = [solve_region(job) for job in jobs]
+
+    with transaction.atomic():
+        # Lock what is still free; rows a concurrent dispatcher holds or has
+        # taken since the read are dropped from the plan
+        free_agents = set(
+            idle_agents().select_for_update(skip_locked=True, of=('self',))
+            .filter(pk__in=[a[0] for a in agents]).values_list('pk', flat=True)
+        )
+        free_clients = set(
+            available_clients().select_for_update(skip_locked=True, of=('self',))
+            .filter(pk__in=client_ids).values_list('pk', flat=True)
+        )
+
+        assignments, unassigned = [], 0
+        for (region_agents, region_clients), km, (routes, dropped) in zip(regions, distances, results):
+            unassigned += len(dropped)
+            offset = len(region_agents)
+            for local_agent, route in enumerate(routes):
+                agent_id = agents[region_agents[local_agent]][0]
+                previous, sequence = local_agent, 0
+                for stop in route:
+                    client = region_clients[stop]
+                    if agent_id not in free_agents or client_ids[client] not in free_clients:
+                        unassigned += 1
+                        continue
+                    sequence += 1
+                    assignments.append(Assignment(
+                        agent_id=agent_id,
+                        client_id=client_ids[client],
+                        sequence=sequence,
+                        estimated_duration=timedelta(seconds=float(service[client])),
+                        distance_to_client=round(float(km[previous, offset + stop]), 3),
+                        created_by=created_by,
+                    ))
+                    previous = offset + stop
+        created = Assignment.objects.bulk_create(assignments)
+        record(created_events(created))
+        sync_agents_on_commit(a.agent_id for a in created)
+        transaction.on_commit(lambda: notify_assigned(created))
+    return created, unassigned
@@ -0,0 +1,162 @@
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from .models import User
+from .realtime import send_to_managers
+from .state import write_safely
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TIMEOUT_SECONDS': 90.0,
+    'TICK_SECONDS': 5.0,
+    'WHEEL_SLOTS': 64,
+    'SWEEP_SECONDS': 300.0,
+}
+
+class TimerWheel:
+    # Hashed timing wheel: a deadline lands in slot (tick % slots) and is
+    # only inspected when the wheel reaches that slot, so rescheduling a key
+    # is O(1) and a tick costs the entries in one slot. Superseded entries
+    # stay in their slot and are dropped when reached.
+
+    def __init__(self, slots, tick_seconds):
+        self.slots = [[] for _ in range(slots)]
+        self.tick_seconds = tick_seconds
+        self.current = self.tick_at(time.monotonic())
+        self.deadlines = {}
+
+    def tick_at(self, monotonic):
+        return math.floor(monotonic / self.tick_seconds)
+
+    def schedule(self, key, delay):
+        tick = self.tick_at(time.monotonic() + delay) + 1
+        if self.deadlines.get(key) == tick:
+            return
+        self.deadlines[key] = tick
+        self.slots[tick % len(self.slots)].append((key, tick))
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def advance(self):
+        target = self.tick_at(time.monotonic())
+        expired = []
+        while self.current < target:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            keep = []
+            for key, tick in slot:
+                if self.deadlines.get(key) != tick:
+                    continue
+                if tick <= self.current:
+                    del self.deadlines[key]
+                    expired.append(key)
+                else:
+                    # More than one rotation away; wait for a later lap
+                    keep.append((key, tick))
+            slot[:] = keep
+        return expired
+
+class PresenceTracker:
+    # Heartbeats are recorded in memory; a background thread advances the
+    # wheel every tick, marks silent agents offline and persists the tick's
+    # changes in bulk plus one batched manager event. last_seen_at in
+    # Postgres is shared by all processes, so an expiry only sticks if no
+    # other worker has heard from the agent either.
+
+    def __init__(self, timeout, tick_seconds, slots, sweep_seconds):
+        self.timeout = timeout
+        self.tick_seconds = tick_seconds
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._wheel = TimerWheel(slots, tick_seconds)
+        self._online = set()
+        self._seen = {}
+        self._swept_at = 0.0
+        self._thread = None
+
+    def heartbeat(self, agent_id):
+        with self._lock:
+            self._wheel.schedule(agent_id, self.timeout)
+            self._seen[agent_id] = timezone.now()
+        self.start()
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='presence-wheel', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_seconds)
+            close_old_connections()
+            try:
+                self.tick()
+            except Exception:
+                logger.exception('Presence sweep failed')
+            finally:
+                close_old_connections()
+
+    def tick(self):
+        with self._lock:
+            expired = [a for a in self._wheel.advance() if a not in self._seen]
+            seen, self._seen = self._seen, {}
+            came_online = [a for a in seen if a not in self._online]
+            self._online.update(came_online)
+
+        if seen:
+            User.objects.bulk_update(
+                [User(pk=agent_id, is_online=True, last_seen_at=ts) for agent_id, ts in seen.items()],
+                ['is_online', 'last_seen_at'],
+            )
+
+        went_offline = []
+        sweep = time.monotonic() - self._swept_at >= self.sweep_seconds
+        if expired or sweep:
+            stale = User.objects.filter(is_online=True).filter(
+                Q(last_seen_at__lt=timezone.now() - timedelta(seconds=self.timeout)) | Q(last_seen_at__isnull=True)
+            )
+            if sweep:
+                # Also catch agents whose last worker went away before expiring them
+                self._swept_at = time.monotonic()
+            else:
+                stale = stale.filter(pk__in=expired)
+            went_offline = list(stale.values_list('pk', flat=True))
+        if went_offline:
+            User.objects.filter(pk__in=went_offline).update(is_online=False)
+            with self._lock:
+                self._online.difference_update(went_offline)
+
+        changes = [(a, True) for a in came_online] + [(a, False) for a in went_offline]
+        if changes:
+            write_safely('write_presence', changes)
+            send_to_managers('agent_presence', {
+                'type': 'agent_presence',
+                'agents': [[str(a), 'online' if online else 'offline'] for a, online in changes],
+            })
+        return changes
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_presence():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            config = {**DEFAULTS, **getattr(settings, 'PRESENCE', {})}
+            _tracker = PresenceTracker(
+                timeout=config['TIMEOUT_SECONDS'],
+                tick_seconds=config['TICK_SECONDS'],
+                slots=config['WHEEL_SLOTS'],
+                sweep_seconds=config['SWEEP_SECONDS'],
+            )
+    return _tracker
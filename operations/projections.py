@@ -0,0 +1,203 @@
+import logging
+import threading
+from datetime import datetime, time, timedelta
+from itertools import takewhile
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, Q, Sum, Value
+from django.db.models.functions import Now
+from django.utils import timezone
+from .events import assignment_event, record
+from .jobs import submit
+from .models import Assignment, AssignmentEvent, AgentDailyStats, ClientVisitStats, ProjectionCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'assignment_stats'
+AGENT_TABLE = AgentDailyStats._meta.db_table
+CLIENT_TABLE = ClientVisitStats._meta.db_table
+UPSERT_CHUNK = 1000
+
+AGENT_COUNTERS = {
+    'created': 'assigned',
+    'started': 'started',
+    'completed': 'completed',
+    'cancelled': 'cancelled',
+    'departed': 'departed',
+    'reassigned': 'assigned',
+}
+
+DEFAULTS = {
+    'BATCH_SIZE': 5000,
+    'LAG_SECONDS': 30,
+}
+
+def projection_config():
+    return {**DEFAULTS, **getattr(settings, 'PROJECTIONS', {})}
+
+def empty_agent_day():
+    return {
+        'assigned': 0, 'started': 0, 'completed': 0, 'cancelled': 0, 'departed': 0,
+        'visit_seconds': 0.0, 'assigned_km': 0.0,
+    }
+
+def add_agent_event(day, kind, count, total):
+    # count events of one kind whose values sum to total
+    if kind in AGENT_COUNTERS:
+        day[AGENT_COUNTERS[kind]] += count
+    if kind in ('created', 'reassigned'):
+        day['assigned_km'] += total or 0.0
+    elif kind == 'released':
+        day['assigned'] -= count
+        day['assigned_km'] -= total or 0.0
+    elif kind == 'completed':
+        day['visit_seconds'] += total or 0.0
+
+def fold(events):
+    # Sum a batch of events into per-(agent, day) and per-client deltas
+    agents, clients = {}, {}
+    for _, agent_id, client_id, kind, at, value in events:
+        day = agents.setdefault((agent_id, timezone.localdate(at)), empty_agent_day())
+        add_agent_event(day, kind, 1, value)
+        client = clients.setdefault(client_id, {
+            'assignments': 0, 'visits': 0, 'cancellations': 0, 'visit_seconds': 0.0, 'last_visit_at': None,
+        })
+        if kind == 'created':
+            client['assignments'] += 1
+        elif kind == 'completed':
+            client['visits'] += 1
+            client['visit_seconds'] += value or 0.0
+            client['last_visit_at'] = max(filter(None, (client['last_visit_at'], at)))
+        elif kind == 'cancelled':
+            client['cancellations'] += 1
+    return agents, clients
+
+def upsert(table, key_columns, rows, assign=()):
+    # INSERT ... ON CONFLICT adding the deltas to existing counters in one statement
+    if not rows:
+        return
+    columns = list(rows[0])
+    counters = [c for c in columns if c not in key_columns and c not in assign]
+    updates = [f'{c} = t.{c} + EXCLUDED.{c}' for c in counters]
+    updates += [f'{c} = GREATEST(t.{c}, EXCLUDED.{c})' for c in assign]
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_CHUNK):
+            chunk = rows[start:start + UPSERT_CHUNK]
+            cursor.execute(
+                f'INSERT INTO {table} AS t ({", ".join(columns)}) VALUES {", ".join([row_placeholder] * len(chunk))} '
+                f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {", ".join(updates)}',
+                [row[c] for row in chunk for c in columns],
+            )
+
+def apply_events(batch_size, lag_seconds):
+    # Ids are handed out before commit: a transaction holding a lower id
+    # started before any event above it was recorded. Stop at the first event
+    # recorded less than lag_seconds ago by the database clock, so only
+    # transactions open longer than that could still be in flight.
+    settled = ExpressionWrapper(
+        Q(recorded_at__lt=Now() - Value(timedelta(seconds=lag_seconds))),
+        output_field=BooleanField(),
+    )
+    ProjectionCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    with transaction.atomic():
+        # One projector at a time; a concurrent caller just skips this round
+        checkpoint = ProjectionCheckpoint.objects.select_for_update(skip_locked=True).filter(name=CHECKPOINT).first()
+        if checkpoint is None:
+            return 0
+        events = list(
+            AssignmentEvent.objects.filter(pk__gt=checkpoint.last_event_id).order_by('pk')
+            .annotate(settled=settled)
+            .values_list('pk', 'agent_id', 'client_id', 'event', 'at', 'value', 'settled')[:batch_size]
+        )
+        events = [e[:6] for e in takewhile(lambda e: e[6], events)]
+        if not events:
+            return 0
+
+        agents, clients = fold(events)
+        upsert(AGENT_TABLE, ('agent_id', 'date'), [
+            {'agent_id': agent_id, 'date': day, **deltas} for (agent_id, day), deltas in agents.items()
+        ])
+        upsert(CLIENT_TABLE, ('client_id',), [
+            {'client_id': client_id, **deltas} for client_id, deltas in clients.items()
+        ], assign=('last_visit_at',))
+        checkpoint.last_event_id = events[-1][0]
+        checkpoint.save(update_fields=['last_event_id', 'updated_at'])
+    return len(events)
+
+def update_projections(batch_size=None, lag_seconds=None):
+    config = projection_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    lag_seconds = config['LAG_SECONDS'] if lag_seconds is None else lag_seconds
+    total = 0
+    while True:
+        applied = apply_events(batch_size, lag_seconds)
+        total += applied
+        if applied < batch_size:
+            return total
+
+_scheduled = threading.Event()
+
+def schedule_projections():
+    # Catch up on the background job pool; at most one run queued per process
+    if _scheduled.is_set():
+        return
+    _scheduled.set()
+
+    def run():
+        try:
+            update_projections()
+        except Exception:
+            logger.exception('Projection update failed')
+        finally:
+            _scheduled.clear()
+    submit(run)
+
+def agent_day_stats(day):
+    # Projected rows for the day plus the events the projector has not
+    # applied yet, summed in SQL, so readers never wait for a catch-up
+    stats = {
+        row.pop('agent_id'): row
+        for row in AgentDailyStats.objects.filter(date=day).values('agent_id', *empty_agent_day())
+    }
+    last_event_id = ProjectionCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_event_id', flat=True).first()
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    tail = (
+        AssignmentEvent.objects.filter(pk__gt=last_event_id or 0, at__gte=start, at__lt=start + timedelta(days=1))
+        .values('agent_id', 'event').annotate(count=Count('pk'), total=Sum('value'))
+    )
+    for row in tail:
+        add_agent_event(stats.setdefault(row['agent_id'], empty_agent_day()), row['event'], row['count'], row['total'])
+    return stats
+
+def rebuild_projections():
+    with transaction.atomic():
+        AgentDailyStats.objects.all().delete()
+        ClientVisitStats.objects.all().delete()
+        ProjectionCheckpoint.objects.update_or_create(name=CHECKPOINT, defaults={'last_event_id': 0})
+    return update_projections(lag_seconds=0)
+
+def backfill_events(chunk_size=2000):
+    # Reconstruct history for assignments that predate the event log
+    logged = AssignmentEvent.objects.values('assignment_id')
+    assignments = Assignment.objects.exclude(pk__in=logged).order_by('assigned_at')
+    created = 0
+    batch = []
+    for assignment in assignments.iterator(chunk_size=chunk_size):
+        batch.append(assignment_event(assignment, 'created', assignment.assigned_at, assignment.distance_to_client))
+        if assignment.started_at:
+            batch.append(assignment_event(assignment, 'started', assignment.started_at))
+        if assignment.departed_at:
+            batch.append(assignment_event(assignment, 'departed', assignment.departed_at))
+        if assignment.status == 'completed' and assignment.completed_at:
+            duration = assignment.actual_duration.total_seconds() if assignment.actual_duration else None
+            batch.append(assignment_event(assignment, 'completed', assignment.completed_at, duration))
+        elif assignment.status == 'cancelled':
+            # Cancellation time was never stored; the last known timestamp is the best guess
+            batch.append(assignment_event(assignment, 'cancelled', assignment.started_at or assignment.assigned_at))
+        if len(batch) >= chunk_size:
+            created += len(record(batch))
+            batch = []
+    if batch:
+        created += len(record(batch))
+    return created
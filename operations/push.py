@@ -0,0 +1,172 @@
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'TRANSPORT': 'operations.push.FCMTransport',
+    'WORKERS': 2,
+    'BATCH_SIZE': 500,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 2.0,
+    'MAX_BACKOFF_SECONDS': 300.0,
+    'DEAD_LETTER_SIZE': 1000,
+}
+
+Push = namedtuple('Push', ['user_ids', 'title', 'body', 'data', 'attempt'])
+
+class BasePushTransport:
+    # send() delivers one payload to every device of user_ids and returns the
+    # user ids worth retrying. Raising retries the whole batch.
+    def __init__(self, **options):
+        self.options = options
+
+    def send(self, user_ids, title, body, data):
+        raise NotImplementedError
+
+class FakePushTransport(BasePushTransport):
+    # Keeps sent pushes in memory; FAIL_FIRST makes the first N sends fail
+    # transiently, for exercising retries without a push provider.
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.sent = []
+        self.failures_left = options.get('FAIL_FIRST', 0)
+        self._lock = threading.Lock()
+
+    def send(self, user_ids, title, body, data):
+        with self._lock:
+            if self.failures_left > 0:
+                self.failures_left -= 1
+                return list(user_ids)
+            self.sent.append(Push(list(user_ids), title, body, data, None))
+        return []
+
+class FCMTransport(BasePushTransport):
+    # Multicast through fcm_django; tokens FCM reports as unregistered are
+    # deactivated by fcm_django itself, only transient errors are retried.
+    def send(self, user_ids, title, body, data):
+        from fcm_django.models import FCMDevice
+        from firebase_admin import exceptions, messaging
+
+        transient = (
+            exceptions.UnavailableError, exceptions.InternalError,
+            exceptions.DeadlineExceededError, messaging.QuotaExceededError,
+        )
+        devices = FCMDevice.objects.filter(user_id__in=user_ids, active=True)
+        owners = dict(devices.values_list('registration_id', 'user_id'))
+        if not owners:
+            return []
+
+        result = devices.send_message(messaging.Message(
+            notification=messaging.Notification(title=title, body=body),
+            data={k: str(v) for k, v in (data or {}).items() if v is not None},
+        ))
+        retry = set()
+        for token, response in zip(result.registration_ids_sent, result.response.responses):
+            if not response.success and isinstance(response.exception, transient):
+                retry.add(owners[token])
+        return list(retry)
+
+class PushQueue:
+    # Pushes are queued in memory and sent by a small pool of worker
+    # threads, so dispatch never waits on the provider. A worker drains
+    # what is waiting and merges identical payloads into multicast batches.
+    # Failed user ids are re-queued with exponential backoff and jitter;
+    # after max_attempts they move to a bounded dead-letter list.
+
+    def __init__(self, transport, workers, batch_size, max_attempts, backoff, max_backoff, dead_letter_size):
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_ids, title, body, data=None):
+        user_ids = [str(u) for u in user_ids]
+        if user_ids:
+            self._queue.put(Push(user_ids, title, body, data or {}, 1))
+            self.start()
+
+    def start(self):
+        if len(self._threads) < self.workers:
+            with self._lock:
+                while len(self._threads) < self.workers:
+                    thread = threading.Thread(target=self._run, name=f'push-{len(self._threads)}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            pushes = [self._queue.get()]
+            while len(pushes) < self.batch_size:
+                try:
+                    pushes.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            close_old_connections()
+            try:
+                for batch in self.batches(pushes):
+                    self.deliver(batch)
+            finally:
+                close_old_connections()
+
+    def batches(self, pushes):
+        grouped = {}
+        for push in pushes:
+            key = (push.title, push.body, json.dumps(push.data, sort_keys=True, default=str), push.attempt)
+            if key not in grouped:
+                grouped[key] = push._replace(user_ids=[])
+            grouped[key].user_ids.extend(push.user_ids)
+        for push in grouped.values():
+            user_ids = list(dict.fromkeys(push.user_ids))
+            for start in range(0, len(user_ids), self.batch_size):
+                yield push._replace(user_ids=user_ids[start:start + self.batch_size])
+
+    def deliver(self, push):
+        try:
+            failed = self.transport.send(push.user_ids, push.title, push.body, push.data)
+        except Exception as e:
+            failed, error = push.user_ids, repr(e)
+        else:
+            error = 'transient delivery failure'
+        if failed:
+            self.retry(push._replace(user_ids=list(failed)), error)
+
+    def retry(self, push, error):
+        if push.attempt >= self.max_attempts:
+            self.dead_letters.append({'push': push._asdict(), 'error': error, 'failed_at': time.time()})
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (push.attempt - 1))
+        timer = threading.Timer(delay * random.uniform(0.5, 1.0), self._queue.put, [push._replace(attempt=push.attempt + 1)])
+        timer.daemon = True
+        timer.start()
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_push_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            config = {**DEFAULTS, **getattr(settings, 'PUSH', {})}
+            transport = import_string(config['TRANSPORT'])(**config.get('TRANSPORT_OPTIONS', {}))
+            _queue = PushQueue(
+                transport,
+                workers=config['WORKERS'],
+                batch_size=config['BATCH_SIZE'],
+                max_attempts=config['MAX_ATTEMPTS'],
+                backoff=config['BACKOFF_SECONDS'],
+                max_backoff=config['MAX_BACKOFF_SECONDS'],
+                dead_letter_size=config['DEAD_LETTER_SIZE'],
+            )
+    return _queue
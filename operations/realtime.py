@@ -0,0 +1,11 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+def send_to_group(group, handler, data):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(group, {'type': handler, 'data': data})
+
+def send_to_managers(handler, data):
+    send_to_group('managers', handler, data)
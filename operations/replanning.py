@@ -0,0 +1,138 @@
+import time
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.measure import D
+from django.db import transaction
+from .distance_matrix import distance_matrix
+from .events import event, record
+from .matching import priority_weights
+from .models import User, Assignment
+from .planning import vrp_config
+from .realtime import send_to_group
+from .state import nearby_agents, sync_agents_on_commit
+from .vrp import RouteProblem, improve
+
+DEFAULTS = {
+    'NEIGHBOURS': 3,
+    'RADIUS_KM': 10.0,
+    'TIME_BUDGET_SECONDS': 0.5,
+}
+
+def replan_config():
+    return {**DEFAULTS, **getattr(settings, 'REPLANNING', {})}
+
+def route_start(agent, in_progress):
+    # An agent on a visit leaves from that client; otherwise from where it is
+    if in_progress is not None:
+        return in_progress.client.location
+    return agent.current_location
+
+def publish_plan(agent_id, stops):
+    send_to_group(f'agent_{agent_id}', 'send_notification', {
+        'type': 'route_plan',
+        'assignments': [{
+            'assignment_id': str(a.id),
+            'client_id': str(a.client_id),
+            'client_name': a.client.name,
+            'sequence': a.sequence,
+            'lat': a.client.latitude,
+            'lng': a.client.longitude,
+        } for a in stops],
+    })
+
+def replan_after_change(assignment_id):
+    # Repair the route of the agent whose assignment just finished, letting
+    # planned stops move between it and its nearest planned neighbours.
+    config = replan_config()
+    changed = Assignment.objects.select_related('agent').get(pk=assignment_id)
+    agent = changed.agent
+    if agent.current_location is None:
+        return []
+
+    planned = User.objects.filter(
+        role='agent',
+        is_online=True,
+        assignments__status='assigned',
+        assignments__sequence__isnull=False,
+    ).exclude(pk=agent.pk).distinct()
+    ranked = nearby_agents(agent.current_location.y, agent.current_location.x, config['RADIUS_KM'])
+    if ranked is not None:
+        order = {agent_id: rank for rank, (agent_id, _) in enumerate(ranked)}
+        nearby = sorted(planned.filter(pk__in=list(order)), key=lambda a: order[str(a.pk)])
+    else:
+        nearby = list(planned.filter(
+            current_location__distance_lte=(agent.current_location, D(km=config['RADIUS_KM'])),
+        ))
+        nearby.sort(key=lambda a: a.current_location.distance(agent.current_location))
+    agents = [agent] + nearby[:config['NEIGHBOURS']]
+
+    with transaction.atomic():
+        # Only planned stops nobody has started can move; lock them for the
+        # rewrite and skip any a concurrent transition holds
+        planned = list(
+            Assignment.objects.select_for_update(skip_locked=True, of=('self',)).select_related('client')
+            .filter(agent__in=agents, status='assigned', sequence__isnull=False)
+            .order_by('sequence', 'assigned_at')
+        )
+        in_progress = {
+            a.agent_id: a for a in Assignment.objects.select_related('client')
+            .filter(agent__in=agents, status='in_progress')
+        }
+        agents = [a for a in agents if route_start(a, in_progress.get(a.pk)) is not None]
+        if not planned or not agents:
+            return []
+
+        index = {a.pk: i for i, a in enumerate(agents)}
+        planned = [a for a in planned if a.agent_id in index]
+        starts = [route_start(a, in_progress.get(a.pk)) for a in agents]
+        points = np.array(
+            [(p.y, p.x) for p in starts] + [(a.client.latitude, a.client.longitude) for a in planned]
+        )
+        vrp = vrp_config()
+        km, seconds, _ = distance_matrix(points, points, metric=vrp['METRIC'])
+        service = np.array([
+            a.estimated_duration.total_seconds() if a.estimated_duration else vrp['DEFAULT_SERVICE_MINUTES'] * 60.0
+            for a in planned
+        ])
+        weights = priority_weights()
+        problem = RouteProblem(
+            seconds, service,
+            [weights.get(a.client.priority, 1.0) for a in planned],
+            vrp['SHIFT_HOURS'] * 3600.0, vrp['MAX_STOPS'], vrp['LATENESS_WEIGHT'],
+        )
+        routes = [[] for _ in agents]
+        for stop, assignment in enumerate(planned):
+            routes[index[assignment.agent_id]].append(stop)
+        routes = improve(problem, routes, time.monotonic() + config['TIME_BUDGET_SECONDS'])
+
+        updated, touched, moved = [], set(), []
+        for position, route in enumerate(routes):
+            previous = position
+            for sequence, stop in enumerate(route, start=1):
+                assignment = planned[stop]
+                new_agent = agents[position]
+                distance = round(float(km[previous, len(agents) + stop]), 3)
+                if (assignment.agent_id, assignment.sequence) != (new_agent.pk, sequence):
+                    touched.update({assignment.agent_id, new_agent.pk})
+                if assignment.agent_id != new_agent.pk:
+                    # Dated at assignment time so the move nets out on the day it was counted
+                    moved += [
+                        event('released', assignment.pk, assignment.agent_id, assignment.client_id,
+                              assignment.assigned_at, assignment.distance_to_client),
+                        event('reassigned', assignment.pk, new_agent.pk, assignment.client_id,
+                              assignment.assigned_at, distance),
+                    ]
+                assignment.agent = new_agent
+                assignment.sequence = sequence
+                assignment.distance_to_client = distance
+                updated.append(assignment)
+                previous = len(agents) + stop
+        Assignment.objects.bulk_update(updated, ['agent', 'sequence', 'distance_to_client'])
+        record(moved)
+        sync_agents_on_commit(touched)
+
+    touched.add(agent.pk)
+    for position, route in enumerate(routes):
+        if agents[position].pk in touched:
+            publish_plan(agents[position].pk, [planned[stop] for stop in route])
+    return sorted(str(pk) for pk in touched)
@@ -0,0 +1,64 @@
+from rest_framework import serializers
+from .models import User, Client, Assignment, NotificationLog
+
+class DynamicFieldsMixin:
+    # ?fields=id,name limits the serialized fields
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            allowed = set(f.strip() for f in requested.split(',') if f.strip())
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
+
+class PointCoordinatesMixin:
+    point_field = 'location'
+
+    def get_lat(self, obj):
+        point = self.get_point(obj)
+        return round(point.y, 6) if point else None
+
+    def get_lng(self, obj):
+        point = self.get_point(obj)
+        return round(point.x, 6) if point else None
+
+    def get_point(self, obj):
+        return getattr(obj, self.point_field)
+
+class AgentSerializer(DynamicFieldsMixin, PointCoordinatesMixin, serializers.ModelSerializer):
+    point_field = 'current_location'
+    lat = serializers.SerializerMethodField()
+    lng = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'phone', 'is_active_agent', 'is_online', 'last_seen_at', 'lat', 'lng', 'updated_at']
+
+class ClientSerializer(DynamicFieldsMixin, PointCoordinatesMixin, serializers.ModelSerializer):
+    lat = serializers.SerializerMethodField()
+    lng = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Client
+        fields = ['id', 'name', 'phone', 'email', 'address', 'priority', 'is_active', 'lat', 'lng', 'created_at']
+
+class AssignmentSerializer(DynamicFieldsMixin, PointCoordinatesMixin, serializers.ModelSerializer):
+    client_name = serializers.CharField(source='client.name', read_only=True)
+    lat = serializers.SerializerMethodField()
+    lng = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Assignment
+        fields = [
+            'id', 'agent', 'client', 'client_name', 'status', 'assigned_at', 'started_at',
+            'completed_at', 'departed_at', 'estimated_duration', 'distance_to_client', 'lat', 'lng',
+        ]
+
+    def get_point(self, obj):
+        return obj.client.location
+
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = NotificationLog
+        fields = ['id', 'notification_type', 'title', 'message', 'assignment', 'is_read', 'created_at', 'read_at']
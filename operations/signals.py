@@ -0,0 +1,49 @@
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .dashboard import invalidate_dashboard
+from .geofence import get_geofence
+from .importer import recover_import_jobs
+from .jobs import submit
+from .models import User, Assignment, NotificationLog
+from .notifications import adjust_unread
+from .state import sync_agents_on_commit, write_safely
+from .transitions import assignment_transitioned
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def assignment_changed(sender, instance, **kwargs):
+    invalidate_dashboard()
+    get_geofence().invalidate()
+    sync_agents_on_commit([instance.agent_id])
+
+@receiver(assignment_transitioned, sender=Assignment)
+def assignment_status_changed(sender, assignment, **kwargs):
+    assignment_changed(sender, assignment)
+
+@receiver(post_save, sender=User)
+def agent_changed(sender, instance, update_fields=None, **kwargs):
+    if instance.role == 'agent':
+        invalidate_dashboard()
+        if update_fields is None or 'is_active_agent' in update_fields:
+            sync_agents_on_commit([instance.pk])
+
+@receiver(post_delete, sender=User)
+def agent_deleted(sender, instance, **kwargs):
+    if instance.role == 'agent':
+        invalidate_dashboard()
+        write_safely('remove', instance.pk)
+
+@receiver(post_save, sender=NotificationLog)
+def notification_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Bulk writes adjust the counter themselves; this covers single saves
+    if created:
+        adjust_unread({str(instance.recipient_id): 0 if instance.is_read else 1})
+    elif update_fields is not None and 'is_read' in update_fields:
+        adjust_unread({str(instance.recipient_id): -1 if instance.is_read else 1})
+
+@receiver(request_started)
+def recover_background_jobs(sender, **kwargs):
+    # Once per process; disconnect() only succeeds for the first request
+    if request_started.disconnect(recover_background_jobs):
+        submit(recover_import_jobs)
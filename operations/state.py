@@ -0,0 +1,202 @@
+import threading
+from datetime import datetime
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .jobs import submit
+from .models import CURRENT_ASSIGNMENT_ORDERING, User, Assignment
+
+KEY_PREFIX = 'field_ops:agents'
+GEO_KEY = f'{KEY_PREFIX}:geo'
+READY_KEY = f'{KEY_PREFIX}:ready'
+
+def agent_key(agent_id):
+    return f'{KEY_PREFIX}:{agent_id}'
+
+class AgentStateStore:
+    # Hot copy of each agent's position, last ping, status and active
+    # assignment: one hash per agent plus a GEO set of positions. Postgres
+    # stays the system of record and is written behind by the ingestor.
+    # Readers treat None as "unknown" and fall back to the database.
+
+    def __init__(self, client):
+        self.client = client
+
+    def write_positions(self, pings):
+        pipe = self.client.pipeline(transaction=False)
+        for ping in pings:
+            pipe.geoadd(GEO_KEY, [ping.longitude, ping.latitude, str(ping.agent_id)])
+            pipe.hset(agent_key(ping.agent_id), mapping={
+                'lat': ping.latitude,
+                'lng': ping.longitude,
+                'accuracy': '' if ping.accuracy is None else ping.accuracy,
+                'last_seen': ping.timestamp.isoformat(),
+            })
+        pipe.execute()
+
+    def write_agents(self, agents):
+        # agents: iterable of (agent_id, is_active_agent, is_online, status, assignment_id)
+        pipe = self.client.pipeline(transaction=False)
+        for agent_id, is_active_agent, is_online, status, assignment_id in agents:
+            pipe.hset(agent_key(agent_id), mapping={
+                'active': int(bool(is_active_agent)),
+                'online': int(bool(is_online)),
+                'status': status or 'idle',
+                'assignment_id': '' if assignment_id is None else str(assignment_id),
+            })
+        pipe.execute()
+
+    def write_presence(self, changes):
+        # changes: iterable of (agent_id, is_online)
+        pipe = self.client.pipeline(transaction=False)
+        for agent_id, is_online in changes:
+            pipe.hset(agent_key(agent_id), 'online', int(bool(is_online)))
+        pipe.execute()
+
+    def remove(self, agent_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(agent_key(agent_id))
+        pipe.zrem(GEO_KEY, str(agent_id))
+        pipe.execute()
+
+    def get_many(self, agent_ids):
+        if not self.client.exists(READY_KEY):
+            return None
+        pipe = self.client.pipeline(transaction=False)
+        for agent_id in agent_ids:
+            pipe.hgetall(agent_key(agent_id))
+        return {
+            str(agent_id): self.parse(values)
+            for agent_id, values in zip(agent_ids, pipe.execute())
+            if values
+        }
+
+    def get(self, agent_id):
+        states = self.get_many([agent_id])
+        return None if states is None else states.get(str(agent_id))
+
+    def parse(self, values):
+        state = {
+            'active': values.get('active') == '1',
+            'online': values.get('online') == '1',
+            'status': values.get('status', 'idle'),
+            'assignment_id': values.get('assignment_id') or None,
+            'latitude': None,
+            'longitude': None,
+            'accuracy': None,
+            'last_seen': None,
+        }
+        if values.get('lat'):
+            state['latitude'] = float(values['lat'])
+            state['longitude'] = float(values['lng'])
+        if values.get('accuracy'):
+            state['accuracy'] = float(values['accuracy'])
+        if values.get('last_seen'):
+            state['last_seen'] = datetime.fromisoformat(values['last_seen'])
+        return state
+
+    def search(self, latitude, longitude, radius_km, count=None):
+        # Agents within radius_km, nearest first, as [(agent_id, distance_km)]
+        if not self.client.exists(READY_KEY):
+            return None
+        results = self.client.geosearch(
+            GEO_KEY, longitude=longitude, latitude=latitude,
+            radius=radius_km, unit='km', sort='ASC', count=count, withdist=True,
+        )
+        return [(agent_id, distance) for agent_id, distance in results]
+
+    def warm(self):
+        # Load every agent from Postgres; readers ignore the store until done
+        agents = list(User.objects.filter(role='agent'))
+        pipe = self.client.pipeline(transaction=False)
+        for agent in agents:
+            if agent.current_location is not None:
+                pipe.geoadd(GEO_KEY, [agent.current_location.x, agent.current_location.y, str(agent.pk)])
+                pipe.hset(agent_key(agent.pk), mapping={
+                    'lat': agent.current_location.y,
+                    'lng': agent.current_location.x,
+                })
+        pipe.execute()
+        self.write_agents(agent_rows(agents))
+        self.client.set(READY_KEY, timezone.now().isoformat())
+        return len(agents)
+
+def agent_rows(agents):
+    current = {}
+    for assignment in Assignment.objects.filter(
+        agent__in=agents, status__in=Assignment.ACTIVE_STATUSES,
+    ).order_by('agent_id', *CURRENT_ASSIGNMENT_ORDERING):
+        current.setdefault(assignment.agent_id, assignment)
+    for agent in agents:
+        assignment = current.get(agent.pk)
+        yield (
+            agent.pk,
+            agent.is_active_agent,
+            agent.is_online,
+            assignment.status if assignment else None,
+            assignment.pk if assignment else None,
+        )
+
+_store = None
+_store_lock = threading.Lock()
+_warming = threading.Event()
+
+def get_state_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            url = getattr(settings, 'AGENT_STATE_REDIS_URL', f'{settings.REDIS_URL}/2')
+            _store = AgentStateStore(redis.Redis.from_url(url, decode_responses=True))
+    return _store
+
+def warm_in_background():
+    # First reader after a Redis restart schedules one reload from Postgres
+    if _warming.is_set():
+        return
+    _warming.set()
+
+    def run():
+        try:
+            get_state_store().warm()
+        finally:
+            _warming.clear()
+    submit(run)
+
+def read_agents(agent_ids):
+    try:
+        states = get_state_store().get_many([str(a) for a in agent_ids])
+    except redis.RedisError:
+        return None
+    if states is None:
+        warm_in_background()
+    return states
+
+def read_agent(agent_id):
+    states = read_agents([agent_id])
+    return None if states is None else states.get(str(agent_id))
+
+def nearby_agents(latitude, longitude, radius_km, count=None):
+    try:
+        results = get_state_store().search(latitude, longitude, radius_km, count)
+    except redis.RedisError:
+        return None
+    if results is None:
+        warm_in_background()
+    return results
+
+def write_safely(method, *args):
+    # The store is a cache of Postgres; a Redis outage must not fail the write path
+    try:
+        getattr(get_state_store(), method)(*args)
+    except redis.RedisError:
+        pass
+
+def sync_agents(agent_ids):
+    agents = list(User.objects.filter(pk__in=agent_ids, role='agent'))
+    write_safely('write_agents', list(agent_rows(agents)))
+
+def sync_agents_on_commit(agent_ids):
+    agent_ids = set(agent_ids)
+    if agent_ids:
+        transaction.on_commit(lambda: sync_agents(agent_ids))
@@ -0,0 +1,35 @@
+import threading
+from django.db import connection, transaction
+from django.test import override_settings
+
+# The default cache is Redis; signal handlers touch it on every assignment save
+local_cache = override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+})
+
+class RowLock:
+    # Holds FOR UPDATE locks on a queryset from another connection, the way
+    # a concurrent dispatcher would, until the block exits
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.locked = threading.Event()
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=self.hold)
+
+    def hold(self):
+        try:
+            with transaction.atomic():
+                list(self.queryset.select_for_update())
+                self.locked.set()
+                self.release.wait(10)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        assert self.locked.wait(10), 'lock was not taken'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release.set()
+        self.thread.join()
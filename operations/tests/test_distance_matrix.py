@@ -0,0 +1,42 @@
+import json
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from operations.models import User
+
+class DistanceMatrixViewTests(SimpleTestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(User(username='manager', role='manager'))
+
+    def post(self, **data):
+        return self.api.post(reverse('distance_matrix'), data, format='json')
+
+    @override_settings(DISTANCE_MATRIX={'MAX_CELLS': 4})
+    def test_too_many_cells_is_400(self):
+        response = self.post(origins=[[12.9, 77.5]] * 3, destinations=[[13.0, 77.6]] * 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 4', response.data['error'])
+
+    def test_large_haversine_matrix_is_streamed(self):
+        rng = np.random.default_rng(0)
+        origins = rng.uniform((12.8, 77.4), (13.1, 77.8), size=(500, 2)).round(5).tolist()
+        destinations = rng.uniform((12.8, 77.4), (13.1, 77.8), size=(20_000, 2)).round(5).tolist()
+        response = self.post(origins=origins, destinations=destinations, fields=['distances'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        chunks = iter(response.streaming_content)
+        header = json.loads(next(chunks).decode()[:-len(', "rows": [')] + '}')
+        self.assertEqual(header['shape'], [500, 20_000])
+        self.assertEqual(header['metric'], 'haversine')
+        first_row = json.loads(next(chunks))
+        self.assertEqual(len(first_row['distances']), 20_000)
+
+    def test_malformed_ids_are_400(self):
+        response = self.post(agent_ids=['not-a-uuid'], destinations=[[13.0, 77.6]])
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_points_are_400(self):
+        self.assertEqual(self.post(origins=[[12.9, 77.5]]).status_code, 400)
@@ -0,0 +1,37 @@
+from unittest import mock
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from operations.fleet import load_fleet, publish_agent_statuses
+from operations.models import User, Client, Assignment
+from .helpers import local_cache
+
+@local_cache
+@mock.patch('operations.fleet.send_to_managers')
+class AgentStatusTests(TestCase):
+    def setUp(self):
+        self.busy = User.objects.create_user('busy', password='secret', role='agent')
+        self.idle = User.objects.create_user('idle', password='secret', role='agent')
+        self.away = User.objects.create_user('away', password='secret', role='agent', is_active_agent=False)
+        clients = [
+            Client.objects.create(name=name, phone=name, address='x', location=Point(77.59, 12.97, srid=4326))
+            for name in ('first', 'second', 'third')
+        ]
+        Assignment.objects.create(agent=self.busy, client=clients[0], sequence=1)
+        Assignment.objects.create(agent=self.busy, client=clients[1], sequence=2, status='in_progress')
+        Assignment.objects.create(agent=self.away, client=clients[2])
+
+    def test_publish_reports_what_load_fleet_does(self, send):
+        agents = [self.busy.pk, self.idle.pk, self.away.pk]
+        publish_agent_statuses(agents)
+        published = dict(send.call_args[0][1]['agents'])
+        self.assertEqual(published, {
+            str(self.busy.pk): 'in_progress',
+            str(self.idle.pk): 'idle',
+            str(self.away.pk): 'off_duty',
+        })
+        fleet = load_fleet()
+        self.assertEqual({agent_id: status for agent_id, (lat, lng, status) in fleet.items()}, published)
+
+    def test_nothing_to_publish(self, send):
+        publish_agent_statuses([])
+        send.assert_not_called()
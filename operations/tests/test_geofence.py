@@ -0,0 +1,60 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from django.utils import timezone
+from operations.geofence import GeofenceIndex
+from operations.ingestion import Ping
+from operations.models import User, Client, Assignment, AssignmentEvent
+from .helpers import local_cache
+
+# Client at (12.97, 77.59); 0.001 degrees of latitude is about 111 m
+LAT, LNG = 12.97, 77.59
+
+@local_cache
+@mock.patch('operations.geofence.notify_status_change')
+@mock.patch('operations.geofence.publish_agent_statuses')
+class GeofenceTests(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user('agent', password='secret', role='agent')
+        client = Client.objects.create(name='Acme', phone='1', address='x', location=Point(LNG, LAT, srid=4326))
+        self.assignment = Assignment.objects.create(agent=self.agent, client=client)
+        self.index = GeofenceIndex(enter_radius_m=75, exit_radius_m=150, max_accuracy_m=100, refresh_seconds=60)
+        self.now = timezone.now()
+
+    def ping(self, lat_offset, seconds, accuracy=10.0):
+        return Ping(self.agent.pk, LAT + lat_offset, LNG, accuracy, self.now + timedelta(seconds=seconds))
+
+    def reload(self):
+        return Assignment.objects.get(pk=self.assignment.pk)
+
+    def test_arriving_starts_the_visit(self, publish, notify):
+        self.assertFalse(self.index.check([self.ping(0.002, 0)]))
+        self.assertTrue(self.index.check([self.ping(0.0003, 60)]))
+        assignment = self.reload()
+        self.assertEqual(assignment.status, 'in_progress')
+        self.assertEqual(assignment.started_at, self.now + timedelta(seconds=60))
+        publish.assert_called_once_with([self.agent.pk])
+
+    def test_inaccurate_pings_are_ignored(self, publish, notify):
+        self.assertFalse(self.index.check([self.ping(0, 0, accuracy=500.0)]))
+        self.assertEqual(self.reload().status, 'assigned')
+
+    def test_leaving_flags_departure_once(self, publish, notify):
+        self.index.check([self.ping(0, 0)])
+        # Between the enter and exit radii is still inside
+        self.assertFalse(self.index.check([self.ping(0.001, 60)]))
+        self.assertIsNone(self.reload().departed_at)
+
+        self.assertTrue(self.index.check([self.ping(0.005, 120)]))
+        self.assertEqual(self.reload().departed_at, self.now + timedelta(seconds=120))
+        self.assertFalse(self.index.check([self.ping(0.006, 180)]))
+        self.assertEqual(
+            list(AssignmentEvent.objects.filter(assignment=self.assignment).values_list('event', flat=True)),
+            ['started', 'departed'],
+        )
+
+    def test_other_agents_pings_do_not_match(self, publish, notify):
+        other = User.objects.create_user('other', password='secret', role='agent')
+        self.assertFalse(self.index.check([Ping(other.pk, LAT, LNG, 10.0, self.now)]))
+        self.assertEqual(self.reload().status, 'assigned')
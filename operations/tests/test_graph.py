@@ -0,0 +1,25 @@
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from operations.directions.graph import RoadGraph
+from operations.directions.osm import MIN_SPEED_KMH, _speed
+
+class RoadGraphStorageTests(SimpleTestCase):
+    def test_saved_graph_loads_memory_mapped(self):
+        graph = RoadGraph.from_edges([12.97, 12.98, 12.99], [77.59, 77.59, 77.59], np.array([0, 1]), np.array([1, 2]),
+                                     [1.1, 1.1], [60.0, 60.0])
+        with tempfile.TemporaryDirectory() as path:
+            graph.save(path)
+            loaded = RoadGraph.load(path)
+            self.assertIsInstance(loaded.indices.base, np.memmap)
+            self.assertEqual(loaded.indptr.tolist(), graph.indptr.tolist())
+            self.assertEqual(loaded.astar(0, 2)[0], [0, 1, 2])
+
+class SpeedTests(SimpleTestCase):
+    def test_maxspeed_tags(self):
+        self.assertEqual(_speed({'highway': 'primary', 'maxspeed': '60'}), 60.0)
+        self.assertAlmostEqual(_speed({'highway': 'primary', 'maxspeed': '30 mph'}), 48.27)
+        self.assertEqual(_speed({'highway': 'primary', 'maxspeed': 'signals'}), 50)
+
+    def test_zero_maxspeed_is_clamped(self):
+        self.assertEqual(_speed({'highway': 'residential', 'maxspeed': '0'}), MIN_SPEED_KMH)
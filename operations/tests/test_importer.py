@@ -0,0 +1,139 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from operations.importer import (
+    ImportFileError, import_clients, iter_chunks, recover_import_jobs, run_import_job, validate_chunk,
+)
+from operations.models import Client, ImportJob
+from .helpers import local_cache
+
+HEADER = 'name,phone,address,latitude,longitude,priority\n'
+
+def csv_file(*rows):
+    return io.BytesIO((HEADER + ''.join(row + '\n' for row in rows)).encode())
+
+class ChunkTests(SimpleTestCase):
+    def test_chunks_carry_file_row_numbers(self):
+        rows = [f'Client {i},555{i:04d},Street {i},12.9,77.5,2' for i in range(5)]
+        chunks = list(iter_chunks(csv_file(*rows), 'clients.csv', chunk_size=2))
+        self.assertEqual([len(df) for df in chunks], [2, 2, 1])
+        self.assertEqual(chunks[-1]['row_number'].tolist(), [6])
+        self.assertEqual(chunks[0]['phone'].tolist(), ['5550000', '5550001'])
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ImportFileError, 'Missing columns: latitude, longitude'):
+            list(iter_chunks(io.BytesIO(b'name,phone,address\nA,1,x\n'), 'clients.csv'))
+
+    def test_unsupported_extension(self):
+        with self.assertRaises(ImportFileError):
+            list(iter_chunks(io.BytesIO(b''), 'clients.txt'))
+
+    def test_validation_reports_the_first_error_per_row(self):
+        df = next(iter_chunks(csv_file(
+            'Good,5550100,1 Main St,12.9,77.5,',
+            ',5550101,2 Main St,95,77.5,2',
+            'Far,5550102,3 Main St,12.9,181,2',
+            'Odd,5550103,4 Main St,12.9,77.5,7',
+        ), 'clients.csv'))
+        valid, errors = validate_chunk(df)
+        self.assertEqual(valid['name'].tolist(), ['Good'])
+        self.assertEqual(valid['priority'].tolist(), [2])
+        self.assertEqual(errors, [
+            (3, 'Name is required'),
+            (4, 'Longitude must be a number between -180 and 180'),
+            (5, 'Priority must be one of 1, 2, 3, 4'),
+        ])
+
+@local_cache
+class ImportClientsTests(TestCase):
+    def test_creates_and_flags_duplicates_across_chunks(self):
+        progress = []
+        result = import_clients(csv_file(
+            'A,5550100,1 Main St,12.9,77.5,1',
+            'B,5550101,2 Main St,12.9,77.5,3',
+            'C,5550100,3 Main St,12.9,77.5,2',
+        ), 'clients.csv', chunk_size=2, progress=lambda r: progress.append(r.total_rows))
+        self.assertEqual((result.total_rows, result.created), (3, 2))
+        self.assertEqual(result.errors, [(4, 'Duplicate phone in file')])
+        self.assertEqual(progress, [2, 3])
+        client = Client.objects.get(phone='5550101')
+        self.assertEqual((client.name, client.priority), ('B', 3))
+        self.assertEqual((client.location.x, client.location.y), (77.5, 12.9))
+
+    def test_existing_clients_are_updated_only_when_asked(self):
+        import_clients(csv_file('A,5550100,1 Main St,12.9,77.5,1'), 'clients.csv')
+
+        result = import_clients(csv_file('Renamed,5550100,1 Main St,12.9,77.5,1'), 'clients.csv')
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 0, 1))
+        self.assertEqual(Client.objects.get(phone='5550100').name, 'A')
+
+        result = import_clients(csv_file('Renamed,5550100,1 Main St,12.9,77.5,4'), 'clients.csv', update_existing=True)
+        self.assertEqual(result.updated, 1)
+        client = Client.objects.get(phone='5550100')
+        self.assertEqual((client.name, client.priority), ('Renamed', 4))
+        self.assertEqual(Client.objects.count(), 1)
+
+@local_cache
+@mock.patch('operations.importer.submit')
+@mock.patch('operations.importer.send_to_managers')
+class ImportJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overridden = override_settings(MEDIA_ROOT=media, CLIENT_IMPORT_STALE_MINUTES=15)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def job(self, status='pending', **fields):
+        upload = SimpleUploadedFile('clients.csv', csv_file('A,5550100,1 Main St,12.9,77.5,1').getvalue())
+        job = ImportJob.objects.create(file=upload, original_name='clients.csv', status=status)
+        ImportJob.objects.filter(pk=job.pk).update(**fields)
+        return ImportJob.objects.get(pk=job.pk)
+
+    def ago(self, minutes):
+        return timezone.now() - timedelta(minutes=minutes)
+
+    def test_run_imports_and_removes_the_file(self, send, submit):
+        job = self.job()
+        run_import_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created_count), ('completed', 1))
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertFalse(os.path.exists(job.file.path))
+        self.assertEqual(send.call_args[0][1]['status'], 'completed')
+
+    def test_only_pending_jobs_are_claimed(self, send, submit):
+        job = self.job(status='running')
+        run_import_job(job.pk)
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, 'running')
+        self.assertFalse(Client.objects.exists())
+        send.assert_not_called()
+
+    def test_long_runs_that_still_report_are_kept(self, send, submit):
+        alive = self.job(status='running', started_at=self.ago(120), heartbeat_at=self.ago(1))
+        silent = self.job(status='running', started_at=self.ago(120), heartbeat_at=self.ago(30))
+        recover_import_jobs()
+
+        self.assertEqual(ImportJob.objects.get(pk=alive.pk).status, 'running')
+        self.assertTrue(os.path.exists(alive.file.path))
+        silent_job = ImportJob.objects.get(pk=silent.pk)
+        self.assertEqual(silent_job.status, 'failed')
+        self.assertFalse(os.path.exists(silent.file.path))
+        send.assert_called_once()
+
+    def test_runs_from_before_heartbeats_fall_back_to_the_start_time(self, send, submit):
+        job = self.job(status='running', started_at=self.ago(30))
+        recover_import_jobs()
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, 'failed')
+
+    def test_old_pending_jobs_are_queued_again(self, send, submit):
+        waiting = self.job(created_at=self.ago(10))
+        self.job()
+        recover_import_jobs()
+        submit.assert_called_once_with(run_import_job, waiting.pk)
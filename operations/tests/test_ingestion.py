@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import SimpleTestCase
+from django.utils import timezone
+from operations.ingestion import LocationIngestor
+
+# 0.0001 degrees of latitude is about 11 m
+@mock.patch('operations.ingestion.get_geofence')
+@mock.patch('operations.ingestion.write_safely')
+@mock.patch('operations.ingestion.get_position_feed')
+class LocationIngestorTests(SimpleTestCase):
+    def setUp(self):
+        # Long enough that no timer fires during a test
+        self.ingestor = LocationIngestor(
+            max_batch=100, max_delay=3600, min_distance_m=10, max_interval=60, max_pending=3,
+        )
+        self.addCleanup(self.ingestor._writer.shutdown)
+        self.addCleanup(self.ingestor._take)
+        self.now = timezone.now()
+
+    def record(self, agent_id, lat_offset, seconds, accuracy=None):
+        return self.ingestor.record(agent_id, 12.97 + lat_offset, 77.59, accuracy, self.now + timedelta(seconds=seconds))
+
+    def test_jitter_is_dropped_until_the_interval_passes(self, feed, write_safely, geofence):
+        self.assertTrue(self.record('a', 0, 0))
+        self.assertFalse(self.record('a', 0.00005, 10))
+        self.assertTrue(self.record('a', 0.0005, 20))
+        # A 33 m move reported with 50 m accuracy is noise
+        self.assertFalse(self.record('a', 0.0008, 30, accuracy=50.0))
+        self.assertTrue(self.record('a', 0.0005, 80))
+        self.assertTrue(self.record('b', 0, 0))
+        self.assertEqual(len(self.ingestor._pending), 4)
+        self.assertEqual(feed.return_value.record.call_count, 4)
+
+    def test_out_of_range_coordinates(self, feed, write_safely, geofence):
+        with self.assertRaises(ValueError):
+            self.ingestor.record('a', 91, 0)
+
+    def test_flush_writes_the_batch_and_checks_geofences(self, feed, write_safely, geofence):
+        self.record('a', 0, 0)
+        self.record('a', 0.001, 10)
+        with mock.patch.object(self.ingestor, '_write') as write:
+            self.assertEqual(self.ingestor.flush(), 2)
+        pending, latest = write.call_args[0]
+        self.assertEqual(len(pending), 2)
+        self.assertEqual(latest['a'].timestamp, self.now + timedelta(seconds=10))
+        geofence.return_value.check.assert_called_once_with(pending)
+        self.assertEqual(self.ingestor.flush(), 0)
+
+    def test_failed_flush_requeues_and_caps_the_backlog(self, feed, write_safely, geofence):
+        self.record('a', 0, 0)
+        self.record('b', 0, 0)
+        with mock.patch.object(self.ingestor, '_write', side_effect=Exception('database down')):
+            with self.assertLogs('operations.ingestion'):
+                self.assertEqual(self.ingestor.flush(), 0)
+        geofence.return_value.check.assert_not_called()
+
+        self.record('c', 0, 0)
+        self.record('d', 0, 0)
+        # Failed pings go back ahead of new ones, and the oldest are dropped past max_pending
+        with mock.patch.object(self.ingestor, '_write', side_effect=Exception('database down')):
+            with self.assertLogs('operations.ingestion', 'WARNING') as logs:
+                self.ingestor.flush()
+        self.assertIn('Dropping 1 location pings', logs.output[-1])
+        self.assertEqual([p.agent_id for p in self.ingestor._pending], ['b', 'c', 'd'])
+
+        with mock.patch.object(self.ingestor, '_write') as write:
+            self.assertEqual(self.ingestor.flush(), 3)
+        pending, latest = write.call_args[0]
+        self.assertEqual([p.agent_id for p in pending], ['b', 'c', 'd'])
+        # The current location of a dropped agent is still written
+        self.assertEqual(sorted(latest), ['a', 'b', 'c', 'd'])
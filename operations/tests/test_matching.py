@@ -0,0 +1,122 @@
+from unittest import mock
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from operations.matching import assignment_cost, batch_assign, find_best_client, shortlist_clients
+from operations.models import User, Client, Assignment
+from .helpers import RowLock, local_cache
+
+def make_client(name, lng, lat, priority=2):
+    return Client.objects.create(name=name, phone=name[:15], address='x', location=Point(lng, lat, srid=4326), priority=priority)
+
+@local_cache
+@override_settings(ASSIGNMENT_PRIORITY_WEIGHTS={1: 1.0, 2: 1.5, 3: 2.5, 4: 4.0})
+class FindBestClientTests(TransactionTestCase):
+    def setUp(self):
+        self.location = Point(77.59, 12.97, srid=4326)
+
+    def test_priority_outweighs_a_short_detour(self):
+        make_client('near-low', 77.60, 12.97, priority=1)
+        urgent = make_client('far-urgent', 77.62, 12.97, priority=4)
+        match = find_best_client(self.location)
+        self.assertEqual(match.client, urgent)
+        self.assertAlmostEqual(match.cost, assignment_cost(match.distance_km, 4))
+
+    def test_clients_with_active_assignments_are_skipped(self):
+        agent = User.objects.create_user('agent', password='secret', role='agent')
+        taken = make_client('taken', 77.591, 12.97)
+        free = make_client('free', 77.65, 12.97)
+        Assignment.objects.create(agent=agent, client=taken)
+        self.assertEqual(find_best_client(self.location).client, free)
+
+    def test_locked_clients_are_skipped_when_claiming(self):
+        locked = make_client('locked', 77.591, 12.97)
+        free = make_client('free', 77.65, 12.97)
+        with RowLock(Client.objects.filter(pk=locked.pk)):
+            self.assertEqual(find_best_client(self.location, for_update=True).client, free)
+
+    def test_no_clients(self):
+        self.assertIsNone(find_best_client(self.location))
+
+@local_cache
+@mock.patch('operations.views.notify_assigned')
+@mock.patch('operations.views.publish_agent_statuses')
+@mock.patch('operations.views.read_agent', return_value=None)
+class AutoAssignTests(TransactionTestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='secret', role='manager')
+        self.agent = User.objects.create_user(
+            'agent', password='secret', role='agent', is_online=True,
+            current_location=Point(77.59, 12.97, srid=4326),
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.manager)
+
+    def post(self):
+        return self.api.post(reverse('auto_assign_client'), {'agent_id': str(self.agent.pk)}, format='json')
+
+    def test_assigns_the_nearest_client(self, read_agent, publish, notify):
+        make_client('far', 77.70, 12.97)
+        near = make_client('near', 77.60, 12.97)
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['client_name'], 'near')
+        self.assertEqual(Assignment.objects.get().client, near)
+        notify.assert_called_once()
+
+    def test_agent_locked_by_another_dispatch_is_409(self, read_agent, publish, notify):
+        make_client('near', 77.60, 12.97)
+        with RowLock(User.objects.filter(pk=self.agent.pk)):
+            response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Assignment.objects.exists())
+
+    def test_offline_agent_is_400(self, read_agent, publish, notify):
+        User.objects.filter(pk=self.agent.pk).update(is_online=False)
+        self.assertEqual(self.post().status_code, 400)
+
+    def test_busy_agent_is_400(self, read_agent, publish, notify):
+        Assignment.objects.create(agent=self.agent, client=make_client('busy', 77.6, 12.97))
+        self.assertEqual(self.post().status_code, 400)
+
+    def test_no_clients_is_404(self, read_agent, publish, notify):
+        self.assertEqual(self.post().status_code, 404)
+
+class ShortlistTests(SimpleTestCase):
+    def test_keeps_each_agents_cheapest_clients(self):
+        # (lng, lat): two agents far apart, clients clustered around each
+        agents = np.array([[77.0, 12.0], [78.0, 13.0]])
+        clients = np.array([[77.001, 12.0], [77.002, 12.0], [78.001, 13.0], [78.002, 13.0], [77.5, 12.5]])
+        columns = shortlist_clients(agents, clients, [2] * 5, per_agent=2, chunk_size=1)
+        self.assertEqual(columns.tolist(), [0, 1, 2, 3])
+
+@local_cache
+@mock.patch('operations.matching.notify_assigned')
+class BatchAssignTests(TransactionTestCase):
+    def make_agent(self, name, lng, lat):
+        return User.objects.create_user(
+            name, password='secret', role='agent', is_online=True, current_location=Point(lng, lat, srid=4326),
+        )
+
+    def test_minimises_total_distance(self, notify):
+        # Greedy nearest-first would pair second with between and leave first
+        # the long trip to beyond
+        first = self.make_agent('first', 77.000, 12.97)
+        second = self.make_agent('second', 77.020, 12.97)
+        between = make_client('between', 77.011, 12.97)
+        beyond = make_client('beyond', 77.035, 12.97)
+        created = batch_assign()
+        self.assertEqual({(a.agent_id, a.client_id) for a in created}, {(first.pk, between.pk), (second.pk, beyond.pk)})
+        notify.assert_called_once()
+
+    def test_busy_and_locked_agents_are_left_out(self, notify):
+        busy = self.make_agent('busy', 77.00, 12.97)
+        locked = self.make_agent('locked', 77.01, 12.97)
+        free = self.make_agent('free', 77.02, 12.97)
+        Assignment.objects.create(agent=busy, client=make_client('current', 77.0, 12.96))
+        make_client('open', 77.015, 12.97)
+        with RowLock(User.objects.filter(pk=locked.pk)):
+            created = batch_assign()
+        self.assertEqual([a.agent_id for a in created], [free.pk])
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from operations.models import User, NotificationLog
+from operations.notifications import MANAGERS, NotificationDispatcher, mark_read, mark_unread, unread_count
+from .helpers import local_cache
+
+@local_cache
+@mock.patch('operations.notifications.send_to_group')
+class NotificationDispatcherTests(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user('agent', password='secret', role='agent')
+        self.manager = User.objects.create_user('manager', password='secret', role='manager')
+        # Long enough that no timer fires during a test
+        self.dispatcher = NotificationDispatcher(max_batch=100, max_delay=3600, digest_threshold=3, digest_preview=2)
+        self.addCleanup(self.dispatcher._writer.shutdown)
+        self.addCleanup(self.dispatcher._take)
+
+    def test_each_notice_is_stored_and_sent(self, send):
+        self.dispatcher.notify([self.agent.pk], 'assignment', 'New assignment', 'Go', data={'sequence': 1})
+        self.dispatcher.notify(MANAGERS, 'update', 'Visit started', 'Started')
+        self.assertEqual(self.dispatcher.flush(), 2)
+
+        self.assertEqual(NotificationLog.objects.get(recipient=self.agent).title, 'New assignment')
+        self.assertEqual(NotificationLog.objects.get(recipient=self.manager).title, 'Visit started')
+        groups = sorted(call[0][0] for call in send.call_args_list)
+        self.assertEqual(groups, [f'agent_{self.agent.pk}', f'manager_{self.manager.pk}'])
+        agent_message = next(c[0][2] for c in send.call_args_list if c[0][0] == f'agent_{self.agent.pk}')
+        self.assertEqual((agent_message['type'], agent_message['sequence']), ('notification', 1))
+        self.assertEqual(self.dispatcher.flush(), 0)
+
+    def test_a_burst_becomes_one_digest(self, send):
+        for i in range(5):
+            self.dispatcher.notify([self.agent.pk], 'assignment', f'Assignment {i}', 'Go')
+        self.assertEqual(self.dispatcher.flush(), 5)
+
+        send.assert_called_once()
+        message = send.call_args[0][2]
+        self.assertEqual((message['type'], message['count']), ('notification_digest', 5))
+        self.assertEqual([n['title'] for n in message['notifications']], ['Assignment 3', 'Assignment 4'])
+
+    def test_unknown_recipients_are_skipped(self, send):
+        self.dispatcher.notify(['00000000-0000-0000-0000-000000000000'], 'system', 'Hello', 'Hi')
+        self.assertEqual(self.dispatcher.flush(), 0)
+        send.assert_not_called()
+
+    def test_cached_unread_count_follows_flushes(self, send):
+        self.assertEqual(unread_count(self.agent.pk), 0)
+        self.dispatcher.notify([self.agent.pk, self.agent.pk], 'system', 'Hello', 'Hi')
+        self.dispatcher.flush()
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.agent.pk), 2)
+
+@local_cache
+class ReadStateTests(TestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user('agent', password='secret', role='agent')
+        self.logs = [
+            NotificationLog.objects.create(recipient=self.agent, notification_type='system', title=str(i), message='Hi')
+            for i in range(3)
+        ]
+
+    def test_bulk_read_and_unread_keep_the_count(self):
+        self.assertEqual(unread_count(self.agent.pk), 3)
+        self.assertEqual(mark_read(self.agent.pk, ids=[self.logs[0].pk]), 1)
+        self.assertEqual(mark_read(self.agent.pk, ids=[self.logs[0].pk]), 0)
+        self.assertEqual(unread_count(self.agent.pk), 2)
+
+        self.assertEqual(mark_read(self.agent.pk), 2)
+        self.assertEqual(unread_count(self.agent.pk), 0)
+        self.assertFalse(NotificationLog.objects.filter(is_read=False).exists())
+
+        self.assertEqual(mark_unread(self.agent.pk, ids=[self.logs[1].pk]), 1)
+        self.assertEqual(unread_count(self.agent.pk), 1)
+        self.assertIsNone(NotificationLog.objects.get(pk=self.logs[1].pk).read_at)
+
+    def test_before_limits_to_older_notifications(self):
+        NotificationLog.objects.filter(pk=self.logs[2].pk).update(created_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(mark_read(self.agent.pk, before=timezone.now()), 2)
+        self.assertFalse(NotificationLog.objects.get(pk=self.logs[2].pk).is_read)
+
+    def test_other_users_are_untouched(self):
+        other = User.objects.create_user('other', password='secret', role='agent')
+        self.assertEqual(mark_read(other.pk, ids=[log.pk for log in self.logs]), 0)
+        self.assertEqual(unread_count(self.agent.pk), 3)
+
+    def test_mark_as_read_is_a_no_op_when_already_read(self):
+        log = self.logs[0]
+        log.mark_as_read()
+        read_at = NotificationLog.objects.get(pk=log.pk).read_at
+        self.assertIsNotNone(read_at)
+        with self.assertNumQueries(0):
+            log.mark_as_read()
@@ -0,0 +1,31 @@
+from itertools import permutations
+import numpy as np
+from django.test import SimpleTestCase
+from operations.optimize import linear_sum_assignment
+
+def brute_force(cost):
+    n, m = cost.shape
+    if n <= m:
+        return min(cost[range(n), list(cols)].sum() for cols in permutations(range(m), n))
+    return min(cost[list(rows), range(m)].sum() for rows in permutations(range(n), m))
+
+class LinearSumAssignmentTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        for shape in [(1, 1), (3, 3), (5, 5), (3, 6), (6, 3)]:
+            cost = rng.uniform(0, 100, size=shape)
+            rows, cols = linear_sum_assignment(cost)
+            self.assertEqual(len(rows), min(shape))
+            self.assertEqual(len(set(rows.tolist())), len(rows))
+            self.assertEqual(len(set(cols.tolist())), len(cols))
+            self.assertAlmostEqual(cost[rows, cols].sum(), brute_force(cost))
+
+    def test_picks_the_cheap_diagonal(self):
+        cost = np.array([[1, 9, 9], [9, 1, 9], [9, 9, 1]])
+        rows, cols = linear_sum_assignment(cost)
+        self.assertEqual(sorted(zip(rows.tolist(), cols.tolist())), [(0, 0), (1, 1), (2, 2)])
+
+    def test_empty(self):
+        rows, cols = linear_sum_assignment(np.empty((0, 4)))
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(cols), 0)
@@ -0,0 +1,47 @@
+from unittest import mock
+from django.contrib.gis.geos import Point
+from django.test import TransactionTestCase, override_settings
+from operations.models import User, Client, Assignment
+from operations.planning import plan_routes
+from .helpers import RowLock, local_cache
+
+@local_cache
+@override_settings(VRP={'WORKERS': 1, 'TIME_BUDGET_SECONDS': 0.2})
+@mock.patch('operations.planning.notify_assigned')
+class PlanRoutesTests(TransactionTestCase):
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            'agent', password='secret', role='agent', is_online=True,
+            current_location=Point(77.59, 12.97, srid=4326),
+        )
+        self.clients = [
+            Client.objects.create(name=f'Client {i}', phone=str(i), address='x', location=Point(77.59 + i / 100, 12.97, srid=4326))
+            for i in range(1, 4)
+        ]
+
+    def test_plans_a_route_in_order(self, notify):
+        created, unassigned = plan_routes()
+        self.assertEqual(unassigned, 0)
+        self.assertEqual(
+            [(a.client_id, a.sequence) for a in sorted(created, key=lambda a: a.sequence)],
+            [(c.pk, i) for i, c in enumerate(self.clients, start=1)],
+        )
+        self.assertEqual(Assignment.objects.filter(agent=self.agent, status='assigned').count(), 3)
+        notify.assert_called_once()
+
+    def test_skips_clients_locked_by_another_dispatch(self, notify):
+        with RowLock(Client.objects.filter(pk=self.clients[0].pk)):
+            created, unassigned = plan_routes()
+        self.assertEqual(unassigned, 1)
+        self.assertEqual(sorted(a.sequence for a in created), [1, 2])
+        self.assertNotIn(self.clients[0].pk, {a.client_id for a in created})
+
+    def test_skips_agents_locked_by_another_dispatch(self, notify):
+        with RowLock(User.objects.filter(pk=self.agent.pk)):
+            created, unassigned = plan_routes()
+        self.assertEqual(created, [])
+        self.assertEqual(unassigned, 3)
+
+    def test_nothing_to_plan(self, notify):
+        Client.objects.update(is_active=False)
+        self.assertEqual(plan_routes(), ([], 0))
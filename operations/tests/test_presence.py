@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from operations.models import User
+from operations.presence import PresenceTracker, TimerWheel
+from .helpers import local_cache
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+class ClockMixin:
+    def setUp(self):
+        super().setUp()
+        self.clock = Clock()
+        patcher = mock.patch('operations.presence.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class TimerWheelTests(ClockMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wheel = TimerWheel(slots=4, tick_seconds=1)
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        return self.wheel.advance()
+
+    def test_expires_after_the_delay(self):
+        self.wheel.schedule('a', 2)
+        self.assertEqual(self.advance(2), [])
+        self.assertEqual(self.advance(1), ['a'])
+        self.assertEqual(self.advance(10), [])
+
+    def test_rescheduling_supersedes_the_old_deadline(self):
+        self.wheel.schedule('a', 2)
+        self.advance(1)
+        self.wheel.schedule('a', 2)
+        self.assertEqual(self.advance(2), [])
+        self.assertEqual(self.advance(1), ['a'])
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 1)
+        self.wheel.cancel('a')
+        self.assertEqual(self.advance(5), [])
+
+    def test_deadlines_past_one_rotation_wait_for_their_lap(self):
+        self.wheel.schedule('a', 9)
+        self.assertEqual(self.advance(9), [])
+        self.assertEqual(self.advance(1), ['a'])
+
+@local_cache
+@mock.patch('operations.presence.send_to_managers')
+@mock.patch('operations.presence.write_safely')
+class PresenceTrackerTests(ClockMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.agent = User.objects.create_user('agent', password='secret', role='agent')
+        self.tracker = PresenceTracker(timeout=30, tick_seconds=5, slots=8, sweep_seconds=300)
+        # Ticks are driven by the tests rather than the background thread
+        self.tracker.start = lambda: None
+        self.tracker._swept_at = self.clock.now
+
+    def tick(self, seconds):
+        self.clock.now += seconds
+        return self.tracker.tick()
+
+    def test_heartbeat_then_silence(self, write_safely, send):
+        self.tracker.heartbeat(self.agent.pk)
+        self.assertEqual(self.tick(5), [(self.agent.pk, True)])
+        self.assertTrue(User.objects.get(pk=self.agent.pk).is_online)
+        send.assert_called_once_with('agent_presence', {
+            'type': 'agent_presence', 'agents': [[str(self.agent.pk), 'online']],
+        })
+
+        User.objects.filter(pk=self.agent.pk).update(last_seen_at=timezone.now() - timedelta(seconds=60))
+        self.assertEqual(self.tick(40), [(self.agent.pk, False)])
+        self.assertFalse(User.objects.get(pk=self.agent.pk).is_online)
+        write_safely.assert_called_with('write_presence', [(self.agent.pk, False)])
+
+    def test_repeat_heartbeats_are_not_reported_again(self, write_safely, send):
+        self.tracker.heartbeat(self.agent.pk)
+        self.tick(5)
+        self.tracker.heartbeat(self.agent.pk)
+        self.assertEqual(self.tick(5), [])
+        self.assertEqual(send.call_count, 1)
+
+    def test_expiry_waits_for_other_workers(self, write_safely, send):
+        self.tracker.heartbeat(self.agent.pk)
+        self.tick(5)
+        # Another process heard from the agent recently
+        User.objects.filter(pk=self.agent.pk).update(last_seen_at=timezone.now())
+        self.assertEqual(self.tick(40), [])
+        self.assertTrue(User.objects.get(pk=self.agent.pk).is_online)
+
+    def test_sweep_catches_agents_no_worker_is_tracking(self, write_safely, send):
+        User.objects.filter(pk=self.agent.pk).update(is_online=True, last_seen_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.tick(5), [])
+        self.assertEqual(self.tick(300), [(self.agent.pk, False)])
@@ -0,0 +1,89 @@
+import uuid
+from datetime import timedelta
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from operations.events import event, record
+from operations.models import User, AgentDailyStats, ClientVisitStats
+from operations.projections import agent_day_stats, apply_events, fold
+from .helpers import local_cache
+
+def settled(*events):
+    # Recorded well before the projector's lag window
+    for e in events:
+        e.recorded_at = timezone.now() - timedelta(minutes=5)
+    return list(events)
+
+class FoldTests(SimpleTestCase):
+    def test_release_and_reassign_move_the_counts(self):
+        at = timezone.now()
+        old, new, client = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        agents, clients = fold([
+            (1, old, client, 'released', at, 2.5),
+            (2, new, client, 'reassigned', at, 1.0),
+        ])
+        day = timezone.localdate(at)
+        self.assertEqual(agents[(old, day)]['assigned'], -1)
+        self.assertEqual(agents[(old, day)]['assigned_km'], -2.5)
+        self.assertEqual(agents[(new, day)]['assigned'], 1)
+        self.assertEqual(agents[(new, day)]['assigned_km'], 1.0)
+        self.assertEqual(clients[client]['assignments'], 0)
+
+    def test_completed_visits(self):
+        at = timezone.now()
+        agent, client = uuid.uuid4(), uuid.uuid4()
+        agents, clients = fold([(1, agent, client, 'completed', at, 600.0)])
+        self.assertEqual(agents[(agent, timezone.localdate(at))]['completed'], 1)
+        self.assertEqual(clients[client]['visits'], 1)
+        self.assertEqual(clients[client]['visit_seconds'], 600.0)
+        self.assertEqual(clients[client]['last_visit_at'], at)
+
+@local_cache
+class ProjectionTests(TestCase):
+    def setUp(self):
+        self.old = User.objects.create_user('old', password='secret', role='agent')
+        self.new = User.objects.create_user('new', password='secret', role='agent')
+        self.assignment_id, self.client_id = uuid.uuid4(), uuid.uuid4()
+        self.at = timezone.now()
+        self.day = timezone.localdate(self.at)
+
+    def created(self):
+        return settled(event('created', self.assignment_id, self.old.pk, self.client_id, self.at, 2.5))
+
+    def moved(self):
+        return settled(
+            event('released', self.assignment_id, self.old.pk, self.client_id, self.at, 2.5),
+            event('reassigned', self.assignment_id, self.new.pk, self.client_id, self.at, 1.0),
+        )
+
+    def stats(self, agent):
+        return AgentDailyStats.objects.get(agent=agent, date=self.day)
+
+    def test_reassignment_in_a_later_batch_nets_out(self):
+        record(self.created())
+        self.assertEqual(apply_events(100, 0), 1)
+        record(self.moved())
+        self.assertEqual(apply_events(100, 0), 2)
+
+        self.assertEqual((self.stats(self.old).assigned, self.stats(self.old).assigned_km), (0, 0.0))
+        self.assertEqual((self.stats(self.new).assigned, self.stats(self.new).assigned_km), (1, 1.0))
+        self.assertEqual(ClientVisitStats.objects.get(client_id=self.client_id).assignments, 1)
+        self.assertEqual(apply_events(100, 0), 0)
+
+    def test_reassignment_alone_in_a_batch_goes_negative(self):
+        record(self.moved())
+        apply_events(100, 0)
+        self.assertEqual(self.stats(self.old).assigned, -1)
+
+    def test_day_stats_include_the_unapplied_tail(self):
+        record(self.created())
+        apply_events(100, 0)
+        record(self.moved())
+
+        stats = agent_day_stats(self.day)
+        self.assertEqual(stats[self.old.pk]['assigned'], 0)
+        self.assertEqual(stats[self.new.pk]['assigned'], 1)
+        self.assertEqual(stats[self.new.pk]['assigned_km'], 1.0)
+
+    def test_recent_events_wait_for_the_lag(self):
+        record([event('created', self.assignment_id, self.old.pk, self.client_id, self.at, 2.5)])
+        self.assertEqual(apply_events(100, 30), 0)
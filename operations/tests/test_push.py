@@ -0,0 +1,64 @@
+import time
+from django.test import SimpleTestCase
+from operations.push import FakePushTransport, Push, PushQueue
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the push workers')
+        time.sleep(0.01)
+
+def push_queue(transport, max_attempts=5, batch_size=500):
+    return PushQueue(
+        transport, workers=1, batch_size=batch_size, max_attempts=max_attempts,
+        backoff=0.0, max_backoff=0.0, dead_letter_size=10,
+    )
+
+class BrokenTransport(FakePushTransport):
+    def send(self, user_ids, title, body, data):
+        raise ConnectionError('provider unreachable')
+
+class PushQueueTests(SimpleTestCase):
+    def test_delivers_after_transient_failures(self):
+        transport = FakePushTransport(FAIL_FIRST=2)
+        queue = push_queue(transport)
+        queue.enqueue(['a', 'b'], 'New assignment', 'Visit Acme', {'assignment_id': '1'})
+        wait_for(lambda: transport.sent)
+        self.assertEqual(transport.sent[0].user_ids, ['a', 'b'])
+        self.assertEqual(transport.failures_left, 0)
+        self.assertEqual(list(queue.dead_letters), [])
+
+    def test_dead_letters_after_max_attempts(self):
+        transport = FakePushTransport(FAIL_FIRST=10)
+        queue = push_queue(transport, max_attempts=3)
+        queue.enqueue(['a'], 'New assignment', 'Visit Acme')
+        wait_for(lambda: queue.dead_letters)
+        letter = queue.dead_letters[0]
+        self.assertEqual(letter['push']['attempt'], 3)
+        self.assertEqual(letter['push']['user_ids'], ['a'])
+        self.assertEqual(letter['error'], 'transient delivery failure')
+        self.assertEqual(transport.failures_left, 7)
+        self.assertEqual(transport.sent, [])
+
+    def test_transport_errors_are_retried_then_dead_lettered(self):
+        queue = push_queue(BrokenTransport(), max_attempts=2)
+        queue.enqueue(['a'], 'New assignment', 'Visit Acme')
+        wait_for(lambda: queue.dead_letters)
+        self.assertIn('provider unreachable', queue.dead_letters[0]['error'])
+
+    def test_identical_payloads_merge_into_batches(self):
+        queue = push_queue(FakePushTransport(), batch_size=2)
+        pushes = [
+            Push(['a'], 'T', 'B', {'x': 1}, 1),
+            Push(['b', 'a'], 'T', 'B', {'x': 1}, 1),
+            Push(['c'], 'T', 'B', {'x': 1}, 1),
+            Push(['d'], 'T', 'other', {}, 1),
+        ]
+        batches = [(p.body, p.user_ids) for p in queue.batches(pushes)]
+        self.assertEqual(batches, [('B', ['a', 'b']), ('B', ['c']), ('other', ['d'])])
+
+    def test_empty_recipients_are_not_queued(self):
+        queue = push_queue(FakePushTransport())
+        queue.enqueue([], 'T', 'B')
+        self.assertEqual(queue._threads, [])
@@ -0,0 +1,74 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from operations.tracks import agent_track, encode_binary, encode_polyline, simplify, zoom_tolerance
+from .helpers import local_cache
+
+class SimplifyTests(SimpleTestCase):
+    def test_drops_collinear_points(self):
+        lats = np.linspace(12.0, 12.01, 11)
+        lngs = np.full(11, 77.0)
+        keep = simplify(lats, lngs, 1e-6)
+        self.assertEqual(np.flatnonzero(keep).tolist(), [0, 10])
+
+    def test_keeps_a_spike_above_the_tolerance(self):
+        lats = np.array([12.0, 12.001, 12.002, 12.003, 12.004])
+        lngs = np.array([77.0, 77.0, 77.01, 77.0, 77.0])
+        self.assertTrue(simplify(lats, lngs, 1e-4)[2])
+        self.assertEqual(np.flatnonzero(simplify(lats, lngs, 1.0)).tolist(), [0, 4])
+
+    def test_short_tracks_and_zero_tolerance_keep_everything(self):
+        self.assertTrue(simplify(np.array([1.0, 2.0]), np.array([1.0, 2.0]), 0.1).all())
+        self.assertTrue(simplify(np.array([1.0, 1.5, 2.0]), np.array([1.0, 1.5, 2.0]), 0).all())
+
+    def test_zoom_tolerance_halves_per_level(self):
+        self.assertAlmostEqual(zoom_tolerance(10), 2 * zoom_tolerance(11))
+
+class EncodingTests(SimpleTestCase):
+    def test_polyline_matches_the_reference_example(self):
+        # The worked example from Google's encoded polyline documentation
+        lats = np.array([38.5, 40.7, 43.252])
+        lngs = np.array([-120.2, -120.95, -126.453])
+        self.assertEqual(encode_polyline(lats, lngs), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+
+    def test_polyline_of_nothing_is_empty(self):
+        self.assertEqual(encode_polyline(np.array([]), np.array([])), '')
+
+    def test_binary_layout(self):
+        data = encode_binary([12.5, 12.50001], [77.5, 77.5], [1000, 1005])
+        self.assertEqual(np.frombuffer(data[:4], dtype='<u4')[0], 2)
+        self.assertEqual(data[4], 5)
+        self.assertEqual(np.frombuffer(data[5:13], dtype='<i8')[0], 1000)
+        lat, lng, secs = np.frombuffer(data[13:], dtype='<i4').reshape(3, 2)
+        self.assertEqual(lat.tolist(), [1250000, 1])
+        self.assertEqual(lng.tolist(), [7750000, 0])
+        self.assertEqual(secs.tolist(), [0, 5])
+
+def empty_track(agent_id, start, end):
+    return np.array([12.9, 12.91]), np.array([77.5, 77.5]), np.array([0, 60])
+
+@local_cache
+@override_settings(TRACK_OPEN_BUCKET_SECONDS=15)
+@mock.patch('operations.tracks.load_track', side_effect=empty_track)
+class AgentTrackCacheTests(SimpleTestCase):
+    def setUp(self):
+        now = datetime.now(dt_timezone.utc).timestamp()
+        # Two ends inside the same future bucket
+        self.bucket_end = datetime.fromtimestamp(math.ceil(now / 15) * 15 + 30, tz=dt_timezone.utc)
+        self.start = self.bucket_end - timedelta(hours=2)
+
+    def test_open_windows_in_one_bucket_share_a_load(self, load):
+        agent_track('a1', self.start, self.bucket_end - timedelta(seconds=3), 0.0001)
+        agent_track('a1', self.start, self.bucket_end - timedelta(seconds=9), 0.0001)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(load.call_args[0][2], self.bucket_end)
+
+    def test_closed_windows_are_cached_as_requested(self, load):
+        end = self.start + timedelta(minutes=30)
+        agent_track('a2', self.start, end, 0.0001)
+        agent_track('a2', self.start, end, 0.0001)
+        agent_track('a2', self.start, end - timedelta(seconds=1), 0.0001)
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(load.call_args[0][2], end - timedelta(seconds=1))
@@ -0,0 +1,112 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+from django.contrib.gis.geos import Point
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from operations.models import User, Client, Assignment, AssignmentEvent
+from operations.transitions import InvalidTransition, TransitionConflict, assignment_transitioned, transition
+from .helpers import local_cache
+
+class AssignmentFixtureMixin:
+    def setUp(self):
+        self.agent = User.objects.create_user('agent', password='secret', role='agent')
+        self.client_record = Client.objects.create(
+            name='Acme', phone='5550100', address='1 Main St', location=Point(77.59, 12.97, srid=4326),
+        )
+        self.assignment = Assignment.objects.create(agent=self.agent, client=self.client_record)
+
+    def events(self):
+        return list(AssignmentEvent.objects.filter(assignment=self.assignment).values_list('event', 'value'))
+
+@local_cache
+class TransitionTests(AssignmentFixtureMixin, TestCase):
+    def test_start_and_complete(self):
+        started = timezone.now()
+        assignment = transition(self.assignment.pk, 'in_progress', at=started)
+        self.assertEqual(assignment.status, 'in_progress')
+        self.assertEqual(assignment.started_at, started)
+
+        assignment = transition(self.assignment.pk, 'completed', notes='Done', at=started + timedelta(minutes=20))
+        self.assertEqual(assignment.status, 'completed')
+        self.assertEqual(assignment.actual_duration, timedelta(minutes=20))
+        self.assertEqual(assignment.notes, 'Done')
+        self.assertEqual(self.events(), [('started', None), ('completed', 1200.0)])
+
+    def test_duration_ends_at_departure(self):
+        started = timezone.now()
+        transition(self.assignment.pk, 'in_progress', at=started)
+        Assignment.objects.filter(pk=self.assignment.pk).update(departed_at=started + timedelta(minutes=5))
+        assignment = transition(self.assignment.pk, 'completed', at=started + timedelta(minutes=30))
+        self.assertEqual(assignment.actual_duration, timedelta(minutes=5))
+
+    def test_final_statuses_conflict(self):
+        transition(self.assignment.pk, 'cancelled')
+        with self.assertRaises(TransitionConflict) as raised:
+            transition(self.assignment.pk, 'in_progress')
+        self.assertEqual(raised.exception.current, 'cancelled')
+        self.assertEqual(self.events(), [('cancelled', None)])
+
+    def test_stale_expected_status_conflicts(self):
+        transition(self.assignment.pk, 'in_progress')
+        with self.assertRaises(TransitionConflict) as raised:
+            transition(self.assignment.pk, 'cancelled', expected='assigned')
+        self.assertEqual(raised.exception.current, 'in_progress')
+        self.assertEqual(Assignment.objects.get(pk=self.assignment.pk).status, 'in_progress')
+
+    def test_invalid_transitions(self):
+        with self.assertRaises(InvalidTransition):
+            transition(self.assignment.pk, 'done')
+        with self.assertRaises(InvalidTransition):
+            transition(self.assignment.pk, 'completed', expected='assigned')
+        self.assertEqual(self.events(), [])
+
+    def test_missing_assignment(self):
+        with self.assertRaises(Assignment.DoesNotExist):
+            transition(uuid.uuid4(), 'in_progress')
+
+    def test_signal_sent_after_update(self):
+        received = []
+        handler = lambda sender, assignment, **kwargs: received.append(assignment.status)
+        assignment_transitioned.connect(handler)
+        self.addCleanup(assignment_transitioned.disconnect, handler)
+        transition(self.assignment.pk, 'in_progress')
+        self.assertEqual(received, ['in_progress'])
+
+@local_cache
+@mock.patch('operations.views.notify_status_change')
+@mock.patch('operations.views.publish_agent_statuses')
+class UpdateAssignmentStatusViewTests(AssignmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.agent)
+
+    def post(self, assignment_id, **data):
+        return self.api.post(reverse('update_assignment_status', args=[assignment_id]), data, format='json')
+
+    def test_updates_status(self, publish, notify):
+        response = self.post(self.assignment.pk, status='in_progress')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'In Progress')
+        publish.assert_called_once()
+        notify.assert_called_once_with(self.assignment.pk, self.agent.pk, 'in_progress')
+
+    def test_unknown_status_is_400(self, publish, notify):
+        self.assertEqual(self.post(self.assignment.pk, status='done').status_code, 400)
+
+    def test_impossible_expected_status_is_400(self, publish, notify):
+        response = self.post(self.assignment.pk, status='completed', expected_status='assigned')
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_assignment_is_404(self, publish, notify):
+        self.assertEqual(self.post(uuid.uuid4(), status='in_progress').status_code, 404)
+
+    def test_conflict_is_409_with_current_status(self, publish, notify):
+        transition(self.assignment.pk, 'cancelled')
+        response = self.post(self.assignment.pk, status='in_progress')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'cancelled')
+        notify.assert_not_called()
@@ -0,0 +1,78 @@
+import time
+import numpy as np
+from django.test import SimpleTestCase
+from operations.vrp import RouteProblem, construct, improve, or_opt, solve, two_opt
+
+def line_problem(agents, stops, shift_seconds=1e9, max_stops=10):
+    # Agents and stops on a line, one second of travel per unit of distance
+    xs = np.array(agents + stops, dtype=float)
+    travel = np.abs(xs[:, None] - xs[None, :])
+    return RouteProblem(travel, np.zeros(len(stops)), np.ones(len(stops)), shift_seconds, max_stops, 0.0)
+
+def deadline(seconds=5.0):
+    return time.monotonic() + seconds
+
+class RouteProblemTests(SimpleTestCase):
+    def test_evaluate_sums_legs_and_service(self):
+        problem = RouteProblem(
+            np.abs(np.subtract.outer([0, 2, 5], [0, 2, 5])).astype(float),
+            [10.0, 20.0], [1.0, 1.0], 1000, 5, 0.0,
+        )
+        cost, duration = problem.evaluate(0, [0, 1])
+        self.assertEqual(cost, 5.0)
+        self.assertEqual(duration, 5.0 + 30.0)
+        self.assertEqual(problem.evaluate(0, []), (0.0, 0.0))
+
+    def test_construct_drops_stops_past_the_shift(self):
+        problem = line_problem([0], [1, 100], shift_seconds=10)
+        routes, unassigned = construct(problem, [0, 1])
+        self.assertEqual(routes, [[0]])
+        self.assertEqual(unassigned, [1])
+
+    def test_construct_respects_max_stops(self):
+        problem = line_problem([0], [1, 2, 3], max_stops=2)
+        routes, unassigned = construct(problem, [0, 1, 2])
+        self.assertEqual(len(routes[0]), 2)
+        self.assertEqual(len(unassigned), 1)
+
+class ImproveTests(SimpleTestCase):
+    def test_two_opt_uncrosses_a_route(self):
+        problem = line_problem([0], [1, 2, 3])
+        route, improved = two_opt(problem, 0, [2, 1, 0])
+        self.assertTrue(improved)
+        self.assertEqual(route, [0, 1, 2])
+
+    def test_two_opt_leaves_an_optimal_route(self):
+        problem = line_problem([0], [1, 2, 3])
+        route, improved = two_opt(problem, 0, [0, 1, 2])
+        self.assertFalse(improved)
+        self.assertEqual(route, [0, 1, 2])
+
+    def test_or_opt_moves_a_stop_to_the_closer_agent(self):
+        problem = line_problem([0, 10], [1, 9])
+        routes, improved = or_opt(problem, [[0, 1], []], deadline())
+        self.assertTrue(improved)
+        self.assertEqual(routes, [[0], [1]])
+
+    def test_improve_never_worsens_and_keeps_every_stop(self):
+        rng = np.random.default_rng(3)
+        points = rng.uniform(0, 100, size=(4 + 30, 2))
+        travel = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+        problem = RouteProblem(travel, np.full(30, 60.0), rng.uniform(1, 3, 30), 3600.0, 10, 0.1)
+        routes, unassigned = construct(problem, range(30))
+        before = sum(problem.evaluate(a, r)[0] for a, r in enumerate(routes))
+
+        routes = improve(problem, [list(r) for r in routes], deadline())
+        after = sum(problem.evaluate(a, r)[0] for a, r in enumerate(routes))
+        self.assertLessEqual(after, before + 1e-9)
+        self.assertEqual(sorted(s for r in routes for s in r), sorted(set(range(30)) - set(unassigned)))
+        for agent, route in enumerate(routes):
+            self.assertTrue(problem.feasible(route, problem.evaluate(agent, route)[1]))
+
+    def test_solve_visits_higher_priority_first_when_lateness_counts(self):
+        # Both stops are the same distance away; the urgent one should come first
+        travel = np.array([[0, 5, 5], [5, 0, 10], [5, 10, 0]], dtype=float)
+        problem = RouteProblem(travel, [0.0, 0.0], [1.0, 4.0], 1000, 5, 1.0)
+        routes, unassigned = solve(problem, 1.0)
+        self.assertEqual(routes, [[1, 0]])
+        self.assertEqual(unassigned, [])
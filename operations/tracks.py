@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .matching import X, Y
+from .models import LocationHistory
+
+def zoom_tolerance(zoom, pixels=1.0):
+    # Degrees covered by `pixels` screen pixels at a web-mercator zoom level
+    return pixels * 360.0 / (256 * 2 ** zoom)
+
+def simplify(lats, lngs, tolerance):
+    # Douglas-Peucker with the per-segment distance scan vectorised. Longitudes
+    # are scaled by cos(latitude) so the tolerance is roughly isotropic.
+    n = len(lats)
+    keep = np.ones(n, dtype=bool)
+    if n < 3 or tolerance <= 0:
+        return keep
+    points = np.column_stack([np.asarray(lngs) * np.cos(np.radians(np.mean(lats))), lats])
+    keep[:] = False
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+def encode_polyline(lats, lngs, precision=5):
+    coords = np.round(np.column_stack([lats, lngs]) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks = []
+    for value in ((deltas << 1) ^ (deltas >> 63)).tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+def encode_binary(lats, lngs, seconds, precision=5):
+    # Layout (little endian): uint32 count, uint8 precision, int64 first
+    # timestamp, then int32 delta arrays for lat, lng and seconds.
+    lat = np.round(np.asarray(lats) * 10 ** precision).astype(np.int64)
+    lng = np.round(np.asarray(lngs) * 10 ** precision).astype(np.int64)
+    secs = np.asarray(seconds, dtype=np.int64)
+    header = np.array([len(lat)], dtype='<u4').tobytes() + np.array([precision], dtype='u1').tobytes()
+    header += np.array([secs[0] if len(secs) else 0], dtype='<i8').tobytes()
+    deltas = (
+        np.diff(lat, prepend=0),
+        np.diff(lng, prepend=0),
+        np.diff(secs, prepend=secs[:1]),
+    )
+    return header + b''.join(d.astype('<i4').tobytes() for d in deltas)
+
+def load_track(agent_id, start, end):
+    rows = list(
+        LocationHistory.objects.filter(agent_id=agent_id, timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp')
+        .annotate(lng=X('location'), lat=Y('location'))
+        .values_list('lat', 'lng', 'timestamp')
+    )
+    lats = np.fromiter((row[0] for row in rows), dtype=float, count=len(rows))
+    lngs = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    seconds = np.fromiter((int(row[2].timestamp()) for row in rows), dtype=np.int64, count=len(rows))
+    return lats, lngs, seconds
+
+def agent_track(agent_id, start, end, tolerance):
+    # Windows reaching into the last bucket are still filling up: snap their
+    # end to the bucket so repeated polls share a key, and cache them briefly
+    bucket = getattr(settings, 'TRACK_OPEN_BUCKET_SECONDS', 15)
+    is_open = end >= timezone.now() - timedelta(seconds=bucket)
+    if is_open:
+        end = datetime.fromtimestamp(-(-end.timestamp() // bucket) * bucket, tz=end.tzinfo)
+    key = f'operations:track:{agent_id}:{int(start.timestamp())}:{int(end.timestamp())}:{tolerance:.8f}'
+    track = cache.get(key)
+    if track is None:
+        lats, lngs, seconds = load_track(agent_id, start, end)
+        keep = simplify(lats, lngs, tolerance)
+        track = {
+            'original_points': len(lats),
+            'lats': lats[keep],
+            'lngs': lngs[keep],
+            'seconds': seconds[keep],
+        }
+        cache.set(key, track, bucket if is_open else getattr(settings, 'TRACK_CACHE_TTL', 300))
+    return track
@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+from .events import STATUS_EVENTS, assignment_event, record
+from .models import Assignment
+
+# Allowed status changes; completed and cancelled are final
+TRANSITIONS = {
+    'assigned': ('in_progress', 'cancelled'),
+    'in_progress': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
+# Sent after a transition commits to the row; update() bypasses post_save
+assignment_transitioned = Signal()
+
+class InvalidTransition(Exception):
+    pass
+
+class TransitionConflict(Exception):
+    def __init__(self, current):
+        super().__init__(f'Assignment is already {current}')
+        self.current = current
+
+def transition(assignment_id, new_status, notes=None, at=None, expected=None):
+    # One conditional UPDATE: it only matches while the row is still in a
+    # status that may move to new_status, so concurrent writers cannot both
+    # win. Returns the updated assignment.
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown status: {new_status}')
+    sources = [status for status, targets in TRANSITIONS.items() if new_status in targets]
+    if expected is not None:
+        if expected not in sources:
+            raise InvalidTransition(f'Cannot move from {expected} to {new_status}')
+        sources = [expected]
+
+    at = at or timezone.now()
+    fields = {'status': new_status}
+    if new_status == 'in_progress':
+        fields['started_at'] = at
+    elif new_status == 'completed':
+        fields['completed_at'] = at
+        # The visit ended when the agent walked away, if the geofence saw it
+        fields['actual_duration'] = ExpressionWrapper(
+            Coalesce(F('departed_at'), Value(at)) - F('started_at'),
+            output_field=DurationField(),
+        )
+    if notes:
+        fields['notes'] = notes
+
+    with transaction.atomic():
+        updated = Assignment.objects.filter(pk=assignment_id, status__in=sources).update(**fields)
+        assignment = Assignment.objects.get(pk=assignment_id)
+        if not updated:
+            raise TransitionConflict(assignment.status)
+        duration = assignment.actual_duration.total_seconds() if assignment.actual_duration else None
+        record([assignment_event(
+            assignment, STATUS_EVENTS[new_status], at,
+            duration if new_status == 'completed' else None,
+        )])
+    assignment_transitioned.send(sender=Assignment, assignment=assignment)
+    return assignment
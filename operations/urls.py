@@ -1,8 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import api, views
 
 router = DefaultRouter()
+router.register('agents', api.AgentViewSet, basename='agent')
+router.register('clients', api.ClientViewSet, basename='client')
+router.register('assignments', api.AssignmentViewSet, basename='assignment')
+router.register('notifications', api.NotificationViewSet, basename='notification')
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -10,8 +14,13 @@ urlpatterns = [
     path('agent/', views.agent_dashboard, name='agent_dashboard'),
     path('upload-clients/', views.upload_clients, name='upload_clients'),
     path('api/', include(router.urls)),
+    path('api/import-jobs/<uuid:job_id>/', views.import_job_status, name='import_job_status'),
     path('api/auto-assign/', views.auto_assign_client, name='auto_assign_client'),
+    path('api/auto-assign/batch/', views.batch_assign_clients, name='batch_assign_clients'),
+    path('api/plan-routes/', views.plan_agent_routes, name='plan_agent_routes'),
     path('api/assignment/<uuid:assignment_id>/status/', views.update_assignment_status, name='update_assignment_status'),
     path('api/location/update/', views.update_agent_location, name='update_agent_location'),
     path('api/route/', views.get_route, name='get_route'),
+    path('api/distance-matrix/', views.distance_matrix, name='distance_matrix'),
+    path('api/route/cache-stats/', views.route_cache_stats, name='route_cache_stats'),
 ]
@@ -1,16 +1,31 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.gis.geos import Point
-from django.utils import timezone
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-import pandas as pd
-from .models import User, Client, Assignment, LocationHistory
+from .models import User, Client, Assignment, ImportJob, NotificationLog
+from .directions import get_router
+from .distance_matrix import config as matrix_config, stream_json
+from .dashboard import invalidate_dashboard, manager_context
+from .events import created_events, record
+from .fleet import publish_agent_statuses
 from .forms import ClientUploadForm
+from .importer import start_import_job
+from .jobs import submit
+from .ingestion import get_ingestor
+from .matching import X, Y, batch_assign, find_best_client
+from .notifications import notify_assigned, notify_status_change, unread_count
+from .planning import plan_routes
+from .presence import get_presence
+from .replanning import replan_after_change
+from .state import read_agent
+from .transitions import TRANSITIONS, InvalidTransition, TransitionConflict, transition
 
 def home(request):
     if not request.user.is_authenticated:
@@ -25,22 +40,7 @@ def manager_dashboard(request):
     if request.user.role != 'manager':
         return redirect('agent_dashboard')
 
-    context = {
-        'total_agents': User.objects.filter(role='agent').count(),
-        'active_agents': User.objects.filter(role='agent', is_active_agent=True).count(),
-        'total_clients': Client.objects.filter(is_active=True).count(),
-        'active_assignments': Assignment.objects.filter(status__in=['assigned', 'in_progress']).count(),
-        'completed_today': Assignment.objects.filter(
-            status='completed',
-            completed_at__date=timezone.now().date()
-        ).count(),
-        'recent_assignments': Assignment.objects.select_related('agent', 'client').all()[:10],
-        'agents_data': [{
-            'agent': agent,
-            'current_assignment': agent.current_assignment,
-            'location': agent.current_location,
-        } for agent in User.objects.filter(role='agent')],
-    }
+    context = manager_context()
     return render(request, 'operations/manager_dashboard.html', context)
 
 @login_required
@@ -51,7 +51,8 @@ def agent_dashboard(request):
     context = {
         'current_assignment': request.user.current_assignment,
         'assignment_history': Assignment.objects.filter(agent=request.user)[:10],
-        'unread_notifications': [],
+        'unread_notifications': NotificationLog.objects.filter(recipient=request.user, is_read=False)[:10],
+        'unread_count': unread_count(request.user.pk),
         'agent_location': request.user.current_location,
     }
     return render(request, 'operations/agent_dashboard.html', context)
@@ -61,81 +62,155 @@ def upload_clients(request):
     if request.method == 'POST':
         form = ClientUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            excel_file = request.FILES['file']
-            try:
-                df = pd.read_excel(excel_file)
-                required_columns = ['name', 'phone', 'address', 'latitude', 'longitude']
-                missing_columns = [col for col in required_columns if col not in df.columns]
-
-                if missing_columns:
-                    messages.error(request, f"Missing columns: {', '.join(missing_columns)}")
-                    return render(request, 'operations/upload_clients.html', {'form': form})
-
-                created_count = 0
-                for index, row in df.iterrows():
-                    try:
-                        location = Point(float(row['longitude']), float(row['latitude']))
-                        client, created = Client.objects.get_or_create(
-                            phone=str(row['phone']),
-                            defaults={
-                                'name': str(row['name']),
-                                'address': str(row['address']),
-                                'location': location,
-                                'email': str(row.get('email', '')),
-                                'priority': int(row.get('priority', 2)),
-                                'notes': str(row.get('notes', '')),
-                            }
-                        )
-                        if created:
-                            created_count += 1
-                    except Exception as e:
-                        messages.warning(request, f"Error processing row {index + 1}: {str(e)}")
-
-                messages.success(request, f"Successfully created {created_count} new clients.")
-                return redirect('manager_dashboard')
-
-            except Exception as e:
-                messages.error(request, f"Error processing file: {str(e)}")
+            job = start_import_job(request.FILES['file'], created_by=request.user)
+            messages.info(request, f"Import of {job.original_name} started in the background (job {job.id}).")
+            return redirect('manager_dashboard')
     else:
         form = ClientUploadForm()
 
     return render(request, 'operations/upload_clients.html', {'form': form})
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def import_job_status(request, job_id):
+    try:
+        job = ImportJob.objects.get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return Response({'error': 'Import job not found'}, status=404)
+
+    data = job.as_progress()
+    data['error_rows'] = job.errors
+    return Response(data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def auto_assign_client(request):
     try:
         agent_id = request.data.get('agent_id')
-        agent = User.objects.get(id=agent_id, role='agent')
+        state = read_agent(agent_id)
+        if state is not None:
+            location = None
+            if state['latitude'] is not None:
+                location = Point(state['longitude'], state['latitude'], srid=4326)
+            busy = state['assignment_id'] is not None
+            online = state['online']
+        else:
+            agent = User.objects.get(id=agent_id, role='agent')
+            location = agent.current_location
+            busy = agent.current_assignment is not None
+            online = agent.is_online
+
+        if not online:
+            return Response({'error': 'Agent is offline'}, status=400)
 
-        if not agent.current_location:
+        if not location:
             return Response({'error': 'Agent location not available'}, status=400)
 
-        if agent.current_assignment:
+        if busy:
             return Response({'error': 'Agent already has an active assignment'}, status=400)
 
-        # Get available clients
-        assigned_client_ids = Assignment.objects.filter(
-            status__in=['assigned', 'in_progress']
-        ).values_list('client_id', flat=True)
-
-        available_clients = Client.objects.filter(is_active=True).exclude(id__in=assigned_client_ids)
-
-        if not available_clients.exists():
-            return Response({'error': 'No available clients'}, status=404)
-
-        selected_client = available_clients.first()
-
-        assignment = Assignment.objects.create(
-            agent=agent,
-            client=selected_client,
-            created_by=request.user
+        try:
+            with transaction.atomic():
+                # A second dispatch for the same agent finds its row locked and
+                # backs off; the chosen client stays locked until the insert commits
+                locked = User.objects.select_for_update(skip_locked=True).filter(id=agent_id, role='agent')
+                if not list(locked.values_list('pk', flat=True)):
+                    return Response({'error': 'Agent is being dispatched by another request'}, status=409)
+                if Assignment.objects.filter(agent_id=agent_id, status__in=Assignment.ACTIVE_STATUSES).exists():
+                    return Response({'error': 'Agent already has an active assignment'}, status=400)
+
+                match = find_best_client(location, for_update=True)
+
+                if match is None:
+                    return Response({'error': 'No available clients'}, status=404)
+
+                selected_client = match.client
+
+                assignment = Assignment.objects.create(
+                    agent_id=agent_id,
+                    client=selected_client,
+                    distance_to_client=round(match.distance_km, 3),
+                    created_by=request.user
+                )
+                record(created_events([assignment]))
+        except IntegrityError:
+            return Response({'error': 'Client was assigned by another request'}, status=409)
+
+        publish_agent_statuses([assignment.agent_id])
+        notify_assigned([assignment])
+        route = get_router().route(
+            (location.y, location.x),
+            (selected_client.latitude, selected_client.longitude),
         )
 
         return Response({
             'message': 'Assignment created successfully',
             'assignment_id': str(assignment.id),
             'client_name': selected_client.name,
+            'distance_km': assignment.distance_to_client,
+            'eta_seconds': round(route.duration_s),
+        })
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_assign_clients(request):
+    if request.user.role != 'manager':
+        return Response({'error': 'Only managers can run batch dispatch'}, status=403)
+
+    try:
+        try:
+            assignments = batch_assign(created_by=request.user)
+        except IntegrityError:
+            return Response({'error': 'A client was assigned by a concurrent dispatch, retry'}, status=409)
+        invalidate_dashboard()
+        publish_agent_statuses(a.agent_id for a in assignments)
+
+        return Response({
+            'message': f'Created {len(assignments)} assignments',
+            'assignments': [{
+                'assignment_id': str(assignment.id),
+                'agent_id': str(assignment.agent_id),
+                'client_id': str(assignment.client_id),
+                'distance_km': assignment.distance_to_client,
+            } for assignment in assignments],
+        })
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def plan_agent_routes(request):
+    if request.user.role != 'manager':
+        return Response({'error': 'Only managers can plan routes'}, status=403)
+
+    try:
+        time_budget = request.data.get('time_budget')
+        try:
+            assignments, unassigned = plan_routes(
+                created_by=request.user,
+                time_budget=float(time_budget) if time_budget else None,
+            )
+        except IntegrityError:
+            return Response({'error': 'A client was assigned by a concurrent dispatch, retry'}, status=409)
+        invalidate_dashboard()
+        publish_agent_statuses(a.agent_id for a in assignments)
+
+        routes = {}
+        for assignment in assignments:
+            routes.setdefault(str(assignment.agent_id), []).append({
+                'assignment_id': str(assignment.id),
+                'client_id': str(assignment.client_id),
+                'sequence': assignment.sequence,
+                'distance_km': assignment.distance_to_client,
+            })
+        return Response({
+            'message': f'Planned {len(assignments)} visits for {len(routes)} agents',
+            'unassigned_candidates': unassigned,
+            'routes': routes,
         })
 
     except Exception as e:
@@ -144,25 +219,35 @@ def auto_assign_client(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_assignment_status(request, assignment_id):
+    new_status = request.data.get('status')
+    if new_status not in TRANSITIONS:
+        return Response({'error': f'Invalid status: {new_status}'}, status=400)
+
     try:
-        assignment = Assignment.objects.get(id=assignment_id)
-        new_status = request.data.get('status')
-        notes = request.data.get('notes', '')
-
-        if new_status == 'in_progress':
-            assignment.start_assignment()
-        elif new_status == 'completed':
-            assignment.complete_assignment(notes)
-        else:
-            assignment.status = new_status
-            assignment.notes = notes
-            assignment.save()
+        assignment = transition(
+            assignment_id,
+            new_status,
+            notes=request.data.get('notes', ''),
+            expected=request.data.get('expected_status'),
+        )
+        publish_agent_statuses([assignment.agent_id])
+        notify_status_change(assignment.pk, assignment.agent_id, assignment.status)
+
+        if assignment.status in ('completed', 'cancelled'):
+            transaction.on_commit(lambda: submit(replan_after_change, assignment.id))
 
         return Response({
             'message': 'Assignment status updated successfully',
             'status': assignment.get_status_display()
         })
 
+    except Assignment.DoesNotExist:
+        return Response({'error': 'Assignment not found'}, status=404)
+    except InvalidTransition as e:
+        return Response({'error': str(e)}, status=400)
+    except TransitionConflict as e:
+        # The row moved on since the client last saw it; report where it is now
+        return Response({'error': str(e), 'status': e.current}, status=409)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -174,18 +259,15 @@ def update_agent_location(request):
         longitude = float(request.data.get('longitude'))
         accuracy = request.data.get('accuracy')
 
-        location = Point(longitude, latitude)
-        request.user.current_location = location
-        request.user.save()
-
-        LocationHistory.objects.create(
-            agent=request.user,
-            location=location,
-            accuracy=accuracy,
-            assignment=request.user.current_assignment
+        get_presence().heartbeat(request.user.pk)
+        accepted = get_ingestor().record(
+            request.user.pk,
+            latitude,
+            longitude,
+            accuracy=float(accuracy) if accuracy not in (None, '') else None,
         )
 
-        return Response({'message': 'Location updated successfully'})
+        return Response({'message': 'Location updated successfully', 'accepted': accepted})
 
     except Exception as e:
         return Response({'error': str(e)}, status=400)
@@ -199,13 +281,77 @@ def get_route(request):
         end_lat = float(request.GET.get('end_lat'))
         end_lng = float(request.GET.get('end_lng'))
 
-        # Simple fallback route
-        return Response({
-            'coordinates': [[start_lng, start_lat], [end_lng, end_lat]],
-            'distance': 0,
-            'duration': 0,
-            'instructions': ['Follow the route to destination']
-        })
+        mode = request.GET.get('mode', 'driving')
+
+        route = get_router().route((start_lat, start_lng), (end_lat, end_lng), mode=mode)
+        data = route.as_dict()
+        data['instructions'] = ['Follow the route to destination']
+        return Response(data)
 
     except Exception as e:
         return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def route_cache_stats(request):
+    router = get_router()
+    if not hasattr(router, 'stats'):
+        return Response({'enabled': False})
+    return Response({'enabled': True, **router.stats()})
+
+def _matrix_points(data, points_key, ids_key, queryset, field):
+    if data.get(ids_key):
+        ids = [str(i) for i in data[ids_key]]
+        rows = {
+            str(pk): (lat, lng)
+            for pk, lat, lng in queryset.filter(pk__in=ids, **{f'{field}__isnull': False})
+            .annotate(lat=Y(field), lng=X(field)).values_list('pk', 'lat', 'lng')
+        }
+        missing = [i for i in ids if i not in rows]
+        if missing:
+            raise ValueError(f"Unknown or unlocated {ids_key}: {', '.join(missing[:10])}")
+        return [rows[i] for i in ids], ids
+    return [(float(lat), float(lng)) for lat, lng in data.get(points_key) or []], None
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def distance_matrix(request):
+    try:
+        # Size is checked before the id lookups
+        rows, columns = [
+            len(request.data.get(ids_key) or request.data.get(points_key) or [])
+            for points_key, ids_key in (('origins', 'agent_ids'), ('destinations', 'client_ids'))
+        ]
+        max_cells = matrix_config()['MAX_CELLS']
+        if rows * columns > max_cells:
+            return Response({'error': f'At most {max_cells} origin/destination pairs per request'}, status=400)
+
+        origins, origin_ids = _matrix_points(
+            request.data, 'origins', 'agent_ids', User.objects.filter(role='agent'), 'current_location')
+        destinations, destination_ids = _matrix_points(
+            request.data, 'destinations', 'client_ids', Client.objects.all(), 'location')
+    except ValidationError:
+        return Response({'error': 'agent_ids and client_ids must be UUIDs'}, status=400)
+    except (TypeError, ValueError) as e:
+        return Response({'error': str(e)}, status=400)
+
+    if not origins or not destinations:
+        return Response({'error': 'origins/agent_ids and destinations/client_ids are required'}, status=400)
+
+    fields = [f for f in request.data.get('fields', ['distances', 'durations']) if f in ('distances', 'durations')]
+    ids = {}
+    if origin_ids:
+        ids['origin_ids'] = origin_ids
+    if destination_ids:
+        ids['destination_ids'] = destination_ids
+
+    return StreamingHttpResponse(
+        stream_json(
+            origins, destinations,
+            metric=request.data.get('metric', 'haversine'),
+            mode=request.data.get('mode', 'driving'),
+            fields=fields or ['distances', 'durations'],
+            ids=ids,
+        ),
+        content_type='application/json',
+    )
@@ -0,0 +1,163 @@
+import time
+import numpy as np
+
+# Pure NumPy/Python multi-stop route solver. Nothing here touches Django so
+# regions can be solved in worker processes; see operations.planning for the
+# database side.
+
+def kmeans(points, k, iterations=20, seed=0):
+    points = np.asarray(points, dtype=float)
+    k = max(1, min(k, len(points)))
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=False)]
+    labels = np.zeros(len(points), dtype=int)
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        for c in range(k):
+            members = points[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return labels, centroids
+
+class RouteProblem:
+    # Nodes 0..A-1 are agent start positions, A..A+S-1 are stops.
+    # travel[i, j] is the travel time in seconds between nodes.
+
+    def __init__(self, travel, service, weights, shift_seconds, max_stops, lateness_weight):
+        self.travel = np.asarray(travel, dtype=float)
+        self.service = np.asarray(service, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.shift_seconds = shift_seconds
+        self.max_stops = max_stops
+        self.lateness_weight = lateness_weight
+        self.agents = self.travel.shape[0] - len(self.service)
+
+    def stop_node(self, stop):
+        return self.agents + stop
+
+    def evaluate(self, agent, stops):
+        # (objective, duration) for an open route starting at the agent
+        if not stops:
+            return 0.0, 0.0
+        nodes = np.array([agent] + [self.agents + s for s in stops])
+        legs = self.travel[nodes[:-1], nodes[1:]]
+        service = self.service[stops]
+        arrivals = np.cumsum(legs) + np.concatenate([[0.0], np.cumsum(service)[:-1]])
+        duration = arrivals[-1] + service[-1]
+        # Higher priority stops cost more the later they are reached
+        lateness = self.lateness_weight * float(np.dot(self.weights[stops] - 1.0, arrivals))
+        return float(legs.sum()) + lateness, float(duration)
+
+    def feasible(self, stops, duration):
+        return len(stops) <= self.max_stops and duration <= self.shift_seconds
+
+def construct(problem, order):
+    # Priority-ordered cheapest insertion on travel time, vectorised over the
+    # insertion positions of each route
+    routes = [[] for _ in range(problem.agents)]
+    durations = np.zeros(problem.agents)
+    unassigned = []
+    for stop in order:
+        node = problem.stop_node(stop)
+        best = None
+        for agent, route in enumerate(routes):
+            if len(route) >= problem.max_stops:
+                continue
+            path = np.array([agent] + [problem.stop_node(s) for s in route])
+            deltas = problem.travel[path, node].copy()
+            deltas[:-1] += problem.travel[node, path[1:]] - problem.travel[path[:-1], path[1:]]
+            position = int(np.argmin(deltas))
+            delta = deltas[position]
+            if durations[agent] + delta + problem.service[stop] > problem.shift_seconds:
+                continue
+            if best is None or delta < best[0]:
+                best = (delta, agent, position)
+        if best is None:
+            unassigned.append(stop)
+            continue
+        delta, agent, position = best
+        routes[agent].insert(position, stop)
+        durations[agent] += delta + problem.service[stop]
+    return routes, unassigned
+
+def two_opt(problem, agent, route):
+    best_cost, _ = problem.evaluate(agent, route)
+    improved = False
+    for i in range(len(route) - 1):
+        for j in range(i + 1, len(route)):
+            candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+            cost, duration = problem.evaluate(agent, candidate)
+            if cost < best_cost - 1e-9 and duration <= problem.shift_seconds:
+                route, best_cost, improved = candidate, cost, True
+    return route, improved
+
+def or_opt(problem, routes, deadline, neighbours=5):
+    # Move segments of 1-3 consecutive stops to the best position in the same
+    # route or in one of the routes whose agent starts closest to the segment.
+    improved = False
+    nearest_agents = np.argsort(problem.travel[:problem.agents, problem.agents:], axis=0)[:neighbours].T
+    costs = [problem.evaluate(a, r)[0] for a, r in enumerate(routes)]
+    for source in range(len(routes)):
+        for length in (1, 2, 3):
+            position = 0
+            while position + length <= len(routes[source]):
+                if time.monotonic() > deadline:
+                    return routes, improved
+                segment = routes[source][position:position + length]
+                remainder = routes[source][:position] + routes[source][position + length:]
+                remainder_cost, _ = problem.evaluate(source, remainder)
+                best = None
+                targets = [source] + [a for a in nearest_agents[segment[0]].tolist() if a != source]
+                for target in targets:
+                    base = remainder if target == source else routes[target]
+                    base_cost = remainder_cost if target == source else costs[target]
+                    for insert_at in range(len(base) + 1):
+                        if target == source and insert_at == position:
+                            continue
+                        candidate = base[:insert_at] + segment + base[insert_at:]
+                        cost, duration = problem.evaluate(target, candidate)
+                        if not problem.feasible(candidate, duration):
+                            continue
+                        if target == source:
+                            gain = costs[source] - cost
+                        else:
+                            gain = costs[source] + costs[target] - remainder_cost - cost
+                        if gain > 1e-9 and (best is None or gain > best[0]):
+                            best = (gain, target, candidate)
+                if best is None:
+                    position += 1
+                    continue
+                _, target, candidate = best
+                if target == source:
+                    routes[source] = candidate
+                else:
+                    routes[source] = remainder
+                    routes[target] = candidate
+                    costs[target] = problem.evaluate(target, candidate)[0]
+                costs[source] = problem.evaluate(source, routes[source])[0]
+                improved = True
+    return routes, improved
+
+def improve(problem, routes, deadline):
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for agent in range(len(routes)):
+            routes[agent], changed = two_opt(problem, agent, routes[agent])
+            improved |= changed
+        routes, changed = or_opt(problem, routes, deadline)
+        improved |= changed
+    return routes
+
+def solve(problem, time_budget):
+    deadline = time.monotonic() + time_budget
+    order = sorted(range(len(problem.service)), key=lambda s: -problem.weights[s])
+    routes, unassigned = construct(problem, order)
+    return improve(problem, routes, deadline), unassigned
+
+def solve_region(args):
+    # Process-pool entry point; args is a plain tuple so it pickles cheaply
+    travel, service, weights, shift_seconds, max_stops, lateness_weight, time_budget = args
+    problem = RouteProblem(travel, service, weights, shift_seconds, max_stops, lateness_weight)
+    return solve(problem, time_budget)